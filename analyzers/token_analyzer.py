@@ -5,6 +5,7 @@ Calculates manipulation risk scores for tokens using advanced detection algorith
 Populates the token_stats table with aggregated metrics and risk assessments
 """
 
+import os
 import sys
 import math
 import time
@@ -12,20 +13,78 @@ from datetime import datetime
 from typing import Optional
 import clickhouse_connect
 
+from whitelist_cache import WhitelistCache
+
+# Collectors live next to analyzers/ in the project root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "collectors"))
+from token_registry import decode_token
+
 # Configuration
 CLICKHOUSE_HOST = "localhost"
 CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DB = "xrp_watchdog"
 
+# Dual-window scoring (same windows as queries/v2_risk_scoring.sql)
+PATTERN_WINDOW_HOURS = 24   # Behavioral patterns: burst, precision, concentration
+IMPACT_WINDOW_DAYS = 7      # Volume for impact assessment
+MIN_WINDOW_TRADES = 5       # Minimum 24h trades for a window score
+WINDOW_PARAMETERS = {'pattern_hours': PATTERN_WINDOW_HOURS, 'impact_days': IMPACT_WINDOW_DAYS}
+
+# Burst detection (token_trade_seconds, migration 016)
+PEAK_WINDOW_SECONDS = 60    # Sliding window for peak_trades_per_minute
+GAP_QUANTILES = (0.1, 0.5, 0.9)
+
+# Sketch mode (token_sketch_buckets, migration 009)
+# uniqCombined(17): exact for small sets, ~0.3% relative std error (1.04 / sqrt(2^17))
+# once a set is large enough to switch to HyperLogLog
+SKETCH_PRECISION = 17
+
+# Streaming refresh: rows per result block, scored and inserted one block at a time
+STREAM_BLOCK_ROWS = 10000
+
+# Each run fills the staging table and swaps it in with EXCHANGE TABLES (migration 015)
+STAGING_TABLE = "token_stats_staging"
+
+TOKEN_STATS_COLUMNS = [
+    "token_code", "token_issuer", "total_trades", "unique_takers",
+    "unique_entities", "unique_counterparties", "total_xrp_volume", "total_token_volume",
+    "ledger_span", "days_active", "first_seen", "last_seen",
+    "avg_price", "price_stddev", "avg_trade_xrp", "trade_size_stddev",
+    "is_whitelisted", "whitelist_category", "avg_time_gap_seconds",
+    "trade_density", "price_variance_percent", "size_variance_percent",
+    "trades_per_account", "xrp_volume_per_account", "risk_score",
+    "burst_score", "classification", "classification_confidence",
+    "trades_24h", "unique_takers_24h", "volume_xrp_24h", "volume_xrp_7d",
+    "price_variance_24h", "trades_per_hour_24h", "duration_minutes_24h",
+    "risk_score_24h", "burst_score_24h", "impact_factor", "final_priority",
+    "gap_p10_seconds", "gap_p50_seconds", "gap_p90_seconds", "peak_trades_per_minute",
+    "window_end", "last_updated"
+]
+
 class TokenAnalyzer:
-    def __init__(self):
-        """Initialize analyzer"""
-        self.client = clickhouse_connect.get_client(
+    def __init__(self, client=None, writer=None):
+        """
+        Initialize analyzer
+
+        Args:
+            client: ClickHouse client to use (default: new client)
+            writer: Client for token_stats inserts while a result stream is open on
+                client (one HTTP session cannot run both; default: new client)
+        """
+        self.client = client or clickhouse_connect.get_client(
             host=CLICKHOUSE_HOST,
             port=CLICKHOUSE_PORT,
             database=CLICKHOUSE_DB
         )
+        self.writer = writer or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.whitelist = WhitelistCache(self.client)
         self.start_time = None
+        self.stage_start = None
+        self.timings = {}                 # Seconds per refresh stage (last run)
 
     # Legacy v1.0 algorithm - DEPRECATED November 2025
     # Removed in favor of v2.0 algorithm with logarithmic scaling and burst detection
@@ -54,15 +113,30 @@ class TokenAnalyzer:
         volume_score = min(50, math.log10(volume_xrp + 1) * 12.5)
         score += volume_score
 
+        score += self.calculate_pattern_score(stats)
+
+        return min(100.0, round(score, 2))
+
+    def calculate_pattern_score(self, stats: dict) -> float:
+        """
+        Behavioral components shared by the all-time and windowed scores (max 85)
+
+        Uses: unique_entities (or unique_takers), price_variance_percent, trade_density,
+        size_variance_percent
+        """
+        score = 0.0
+
         # Token focus component (max 30 points) - Account concentration
-        unique_takers = stats['unique_takers']
-        if unique_takers <= 2:
+        # Counts entities (account_clusters) where available, so spreading trades
+        # over freshly funded accounts does not dilute the score
+        entities = stats.get('unique_entities', stats['unique_takers'])
+        if entities <= 2:
             score += 30
-        elif unique_takers <= 5:
+        elif entities <= 5:
             score += 22
-        elif unique_takers <= 10:
+        elif entities <= 10:
             score += 15
-        elif unique_takers <= 20:
+        elif entities <= 20:
             score += 8
         else:
             score += 3
@@ -83,7 +157,8 @@ class TokenAnalyzer:
             score += 1
 
         # NEW: Burst detection component (max 15 points) - Temporal clustering
-        trade_density = stats['trade_density']  # trades per hour
+        # trades per hour: at the median gap's pace (all-time score), or over the 24h window
+        trade_density = stats['trade_density']
         if trade_density >= 100:
             score += 15
         elif trade_density >= 50:
@@ -106,20 +181,209 @@ class TokenAnalyzer:
         else:
             score += 1
 
-        return min(100.0, round(score, 2))
+        return score
+
+    def calculate_window_scores(self, window: dict, is_whitelisted: bool) -> dict:
+        """
+        Calculate dual-window scores (mirrors queries/v2_risk_scoring.sql)
+
+        Risk score uses the 24h pattern window with the v2.0 volume component
+        (max 60 points, log10(volume / 100K + 1) * 15). Impact factor uses the
+        7d window; final priority = risk score x impact factor.
+
+        Returns:
+            Dict with risk_score_24h, burst_score_24h, impact_factor, final_priority
+        """
+        if is_whitelisted or window['trades_24h'] < MIN_WINDOW_TRADES:
+            return {'risk_score_24h': 0.0, 'burst_score_24h': 0.0,
+                    'impact_factor': 0.0, 'final_priority': 0.0}
+
+        volume_score = min(60, math.log10(window['volume_xrp_24h'] / 100000 + 1) * 15)
+        risk = min(100.0, round(volume_score + self.calculate_pattern_score({
+            'unique_takers': window['unique_takers_24h'],
+            'price_variance_percent': window['price_variance_24h'],
+            'trade_density': window['trades_per_hour_24h'],
+            'size_variance_percent': window['size_variance_24h'],
+        }), 1))
+
+        density = window['trades_per_hour_24h']
+        if density >= 100:
+            burst = 100.0
+        elif density >= 50:
+            burst = 80.0
+        elif density >= 20:
+            burst = 53.0
+        elif density >= 10:
+            burst = 33.0
+        else:
+            burst = 13.0
+
+        volume_7d = window['volume_xrp_7d'] or window['volume_xrp_24h']
+        impact = min(1.0, math.log10(volume_7d / 10 + 1))
+
+        return {
+            'risk_score_24h': risk,
+            'burst_score_24h': burst,
+            'impact_factor': round(impact, 2),
+            'final_priority': round(risk * impact, 1)
+        }
+
+    def window_stats_query(self) -> str:
+        """
+        Merge 15-minute buckets into 24h pattern and 7d impact window statistics
+
+        Reads token_window_buckets (maintained at ingest by a materialized view)
+        instead of rescanning executed_trades. Each run slides both windows
+        forward to the current bucket. Takes the pattern_hours and impact_days
+        query parameters (WINDOW_PARAMETERS).
+
+        Returns:
+            SELECT statement with one row per (token_code, token_issuer)
+        """
+        return """
+            SELECT
+              token_code,
+              token_issuer,
+              sumIf(trades, in_24h) as trades_24h,
+              uniqMergeIf(takers, in_24h) as unique_takers_24h,
+              sumIf(volume_xrp, in_24h) as volume_xrp_24h,
+              sum(volume_xrp) as volume_xrp_7d,
+              avgMergeIf(price_avg, in_24h) as avg_price,
+              sqrt(varPopMergeIf(price_var, in_24h)) as price_stddev,
+              avgMergeIf(size_avg, in_24h) as avg_size,
+              sqrt(varPopMergeIf(size_var, in_24h)) as size_stddev,
+              minIf(first_trade, in_24h) as first_trade,
+              maxIf(last_trade, in_24h) as last_trade
+            FROM (
+              SELECT
+                *,
+                bucket >= toStartOfFifteenMinutes(now() - INTERVAL {pattern_hours:UInt32} HOUR) as in_24h
+              FROM token_window_buckets
+              WHERE bucket >= toStartOfFifteenMinutes(now() - INTERVAL {impact_days:UInt32} DAY)
+            )
+            GROUP BY token_code, token_issuer
+        """
+
+    @staticmethod
+    def window_metrics(values) -> dict:
+        """
+        Derive the windowed metrics from one window_stats_query row
+
+        Args:
+            values: (trades_24h, unique_takers_24h, volume_xrp_24h, volume_xrp_7d,
+                avg_price, price_stddev, avg_size, size_stddev, first_trade, last_trade);
+                all zero for tokens not traded in the window
+
+        Returns:
+            Dict of windowed metrics (token_stats *_24h / *_7d columns)
+        """
+        (trades_24h, takers_24h, volume_24h, volume_7d,
+         avg_price, price_stddev, avg_size, size_stddev, first_trade, last_trade) = values
+
+        if trades_24h:
+            duration_seconds = (last_trade - first_trade).total_seconds()
+            price_var = price_stddev / max(avg_price, 0.0001) * 100
+            size_var = size_stddev / max(avg_size, 0.0001) * 100
+            trades_per_hour = trades_24h / max(duration_seconds / 3600.0, 0.01)
+        else:
+            duration_seconds = price_var = size_var = trades_per_hour = 0.0
+
+        return {
+            'trades_24h': trades_24h,
+            'unique_takers_24h': takers_24h,
+            'volume_xrp_24h': volume_24h,
+            'volume_xrp_7d': volume_7d,
+            'price_variance_24h': round(price_var, 1),
+            'size_variance_24h': round(size_var, 1),
+            'trades_per_hour_24h': round(trades_per_hour, 1),
+            'duration_minutes_24h': round(duration_seconds / 60, 0)
+        }
+
+    def query_window_stats(self) -> dict:
+        """
+        Windowed metrics for every token traded in the impact window
+
+        Returns:
+            Dict keyed by (token_code, token_issuer) with windowed metrics
+        """
+        result = self.client.query(self.window_stats_query(), parameters=WINDOW_PARAMETERS)
+        return {(row[0], row[1]): self.window_metrics(row[2:]) for row in result.result_rows}
+
+    def burst_stats_query(self) -> str:
+        """
+        Exact inter-trade gap quantiles and peak sliding-window trade rate per token
+
+        One ordered pass over the impact window of token_trade_seconds (sorted
+        by token, then second; the WHERE prunes partitions and granules instead
+        of sorting the full 90-day retention every run): lagInFrame gives the
+        gap to the previous active second, a RANGE frame counts the trades in
+        the PEAK_WINDOW_SECONDS ending at each second. Trades sharing a second
+        contribute (trades - 1) zero gaps. Takes the impact_days query parameter
+        (WINDOW_PARAMETERS); tokens not traded in the window join as zeros.
+        Also returns the gap count and mean gap (avg_time_gap_seconds).
+
+        Returns:
+            SELECT statement with one row per (token_code, token_issuer)
+        """
+        quantiles = ", ".join(str(q) for q in GAP_QUANTILES)
+        return f"""
+            SELECT
+              token_code,
+              token_issuer,
+              quantilesExactWeighted({quantiles})(gap, weight) as gap_quantiles,
+              max(trades_in_window) as peak_trades_per_minute,
+              sum(weight) as gaps,
+              sum(gap * weight) / gaps as avg_gap_seconds
+            FROM (
+              SELECT
+                token_code,
+                token_issuer,
+                trades,
+                ts - lagInFrame(ts, 1, ts) OVER ordered as previous_gap,
+                row_number() OVER ordered as n,
+                sum(trades) OVER (
+                  PARTITION BY token_code, token_issuer
+                  ORDER BY ts
+                  RANGE BETWEEN {PEAK_WINDOW_SECONDS - 1} PRECEDING AND CURRENT ROW
+                ) as trades_in_window
+              FROM (
+                -- Collapse rows SummingMergeTree has not merged yet
+                SELECT token_code, token_issuer, toUInt32(second) as ts, sum(trades) as trades
+                FROM token_trade_seconds
+                WHERE second >= now() - INTERVAL {{impact_days:UInt32}} DAY
+                GROUP BY token_code, token_issuer, ts
+              )
+              WINDOW ordered AS (
+                PARTITION BY token_code, token_issuer
+                ORDER BY ts
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+              )
+            )
+            ARRAY JOIN
+              [previous_gap, 0] as gap,
+              [if(n > 1, 1, 0), trades - 1] as weight
+            WHERE weight > 0
+            GROUP BY token_code, token_issuer
+        """
+
+    def calculate_burst_score(self, peak_trades_per_minute: float, is_whitelisted: bool) -> float:
+        """
+        Calculate burst score (0-100) from the peak sliding-window trade rate
 
-    def calculate_burst_score(self, trade_density: float, is_whitelisted: bool) -> float:
-        """Calculate burst score (0-100) based on trade density"""
+        Uses the busiest PEAK_WINDOW_SECONDS of the impact window rather than
+        trades averaged over the token's whole active span, so a short burst
+        followed by idle days still scores.
+        """
         if is_whitelisted:
             return 0.0
 
-        if trade_density >= 100:
+        if peak_trades_per_minute >= 60:
             return 95.0
-        elif trade_density >= 50:
+        elif peak_trades_per_minute >= 30:
             return 75.0
-        elif trade_density >= 20:
+        elif peak_trades_per_minute >= 15:
             return 50.0
-        elif trade_density >= 10:
+        elif peak_trades_per_minute >= 5:
             return 25.0
         else:
             return 5.0
@@ -187,25 +451,55 @@ class TokenAnalyzer:
             # Unclear pattern
             return ('unknown', 0.3)
 
-    def refresh_token_stats(self):
-        """Refresh token_stats table with latest data"""
-        self.start_time = time.time()
+    def token_base_query(self, use_sketches: bool = False, days: Optional[int] = None) -> str:
+        """
+        Build the per-token base statistics query (token_base)
 
-        print("=== Token Risk Analyzer ===")
-        print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        Args:
+            use_sketches: Merge hourly sketches from token_sketch_buckets instead of
+                computing exact distinct counts over executed_trades
+            days: Only include the last N days (hour-aligned), None for all data
 
-        # Step 1: Query base token statistics
-        print("Step 1: Querying token statistics from executed_trades...")
-        query = """
-        WITH
-        -- Base token statistics
-        token_base AS (
+        Returns:
+            SELECT statement with one row per (token_code, token_issuer)
+        """
+        if use_sketches:
+            window = f"WHERE hour >= toStartOfHour(now() - INTERVAL {int(days)} DAY)" if days else ""
+            return f"""
+          SELECT
+            token_code,
+            token_issuer,
+            uniqCombinedMerge({SKETCH_PRECISION})(tx_hashes) as total_trades,
+            uniqCombinedMerge({SKETCH_PRECISION})(takers) as unique_takers,
+            uniqCombinedArrayMerge({SKETCH_PRECISION})(counterparties) as unique_counterparties,
+            uniqCombinedMerge({SKETCH_PRECISION})(ledgers) as ledger_span,
+            SUM(volume_xrp) as total_xrp_volume,
+            SUM(volume_token) as total_token_volume,
+            avgMerge(price_avg) as avg_price,
+            stddevPopMerge(price_stddev) as price_stddev,
+            MIN(first_trade) as first_seen,
+            MAX(last_trade) as last_seen,
+            dateDiff('second', first_seen, last_seen) as seconds_active,
+            dateDiff('day', first_seen, last_seen) as days_active,
+            avgMerge(size_avg) as avg_trade_xrp,
+            stddevPopMerge(size_stddev) as trade_size_stddev,
+            -- Sketches hold raw takers, entities are not available here
+            unique_takers as unique_entities
+          FROM token_sketch_buckets
+          {window}
+          GROUP BY token_code, token_issuer
+        """
+
+        window = f"AND time >= toStartOfHour(now() - INTERVAL {int(days)} DAY)" if days else ""
+        return f"""
           SELECT
             exec_iou_code as token_code,
             exec_iou_issuer as token_issuer,
             COUNT(DISTINCT tx_hash) as total_trades,
-            COUNT(DISTINCT taker) as unique_takers,
-            COUNT(DISTINCT arrayJoin(counterparties)) as unique_counterparties,
+            -- Interned account IDs (migration 017); the -Array combinator counts
+            -- counterparties without arrayJoin multiplying the rows the sums see
+            COUNT(DISTINCT taker_id) as unique_takers,
+            uniqExactArray(counterparty_ids) as unique_counterparties,
             COUNT(DISTINCT ledger_index) as ledger_span,
             SUM(abs(exec_xrp)) as total_xrp_volume,
             SUM(exec_iou) as total_token_volume,
@@ -216,13 +510,238 @@ class TokenAnalyzer:
             dateDiff('second', MIN(time), MAX(time)) as seconds_active,
             dateDiff('day', MIN(time), MAX(time)) as days_active,
             AVG(abs(exec_xrp)) as avg_trade_xrp,
-            stddevPop(abs(exec_xrp)) as trade_size_stddev
+            stddevPop(abs(exec_xrp)) as trade_size_stddev,
+            -- Takers merged into entities (account_clusters, migration 014)
+            COUNT(DISTINCT dictGetOrDefault('xrp_watchdog.account_clusters_dict', 'entity_id',
+                                            tuple(taker), taker)) as unique_entities
           FROM executed_trades
           WHERE exec_iou_code != ''
             AND exec_xrp != 0
+            {window}
           GROUP BY exec_iou_code, exec_iou_issuer
+        """
+
+    def compare_sketches(self, days: Optional[int] = None, limit: int = 20):
+        """
+        Compare sketch-based distinct counts against exact counts
+
+        Runs token_base both ways over the same (hour-aligned) window and prints
+        per-token relative errors for the top tokens by volume, plus the mean and
+        max error and query time for each mode.
+
+        Args:
+            days: Only compare the last N days, None for all data
+            limit: Number of tokens to list
+        """
+        metrics = ['total_trades', 'unique_takers', 'unique_counterparties', 'ledger_span']
+        results = {}
+        timings = {}
+
+        for mode, use_sketches in (('exact', False), ('sketch', True)):
+            start = time.time()
+            result = self.client.query(f"""
+                SELECT token_code, token_issuer, total_xrp_volume, {', '.join(metrics)}
+                FROM ({self.token_base_query(use_sketches, days)})
+            """)
+            timings[mode] = time.time() - start
+            results[mode] = {(row[0], row[1]): row[2:] for row in result.result_rows}
+
+        window = f"last {days} days" if days else "all data"
+        print(f"=== Sketch vs Exact Distinct Counts ({window}) ===")
+        print(f"Exact query:  {timings['exact']:.2f}s ({len(results['exact'])} tokens)")
+        print(f"Sketch query: {timings['sketch']:.2f}s ({len(results['sketch'])} tokens)\n")
+
+        errors = {metric: [] for metric in metrics}
+        rows = []
+        for key, exact_row in results['exact'].items():
+            sketch_row = results['sketch'].get(key)
+            if sketch_row is None:
+                continue
+            row_errors = []
+            for i, metric in enumerate(metrics):
+                exact, approx = exact_row[i + 1], sketch_row[i + 1]
+                error = abs(approx - exact) / exact * 100 if exact else 0.0
+                errors[metric].append(error)
+                row_errors.append((exact, approx, error))
+            rows.append((exact_row[0], key, row_errors))
+
+        missing = len(results['exact']) - len(rows)
+        if missing:
+            print(f"⚠️  {missing} tokens missing from token_sketch_buckets (backfill not run?)\n")
+
+        print(f"{'Token':<12} {'Trades':>16} {'Takers':>16} {'Counterparties':>16} {'Ledgers':>16}")
+        print("-"*80)
+        for volume, (code, issuer), row_errors in sorted(rows, key=lambda r: r[0], reverse=True)[:limit]:
+            token = decode_token(code)
+            cells = [f"{exact}/{approx} {error:.1f}%" for exact, approx, error in row_errors]
+            print(f"{token[:12]:<12} " + " ".join(f"{c:>16}" for c in cells))
+
+        print()
+        print(f"{'Metric':<24} {'Mean error':>12} {'Max error':>12} {'Exact tokens':>14}")
+        print("-"*66)
+        for metric in metrics:
+            values = errors[metric]
+            if not values:
+                continue
+            exact_count = sum(1 for v in values if v == 0)
+            print(f"{metric:<24} {sum(values) / len(values):>11.3f}% {max(values):>11.3f}% "
+                  f"{exact_count:>7}/{len(values):<6}")
+        print()
+
+    def score_row(self, row: tuple, window_end: datetime) -> tuple:
+        """
+        Score one token row of the refresh query
+
+        Args:
+            row: Base statistics (row[0..22]), window columns (row[23..32]), gap
+                quantiles and peak trades per minute (row[33..34])
+            window_end: When the 24h / 7d windows were evaluated
+
+        Returns:
+            token_stats row in TOKEN_STATS_COLUMNS order
+        """
+        # Parse row data
+        stats = {
+            'token_code': row[0],
+            'token_issuer': row[1],
+            'total_trades': row[2],
+            'unique_takers': row[3],
+            'unique_counterparties': row[4],
+            'total_xrp_volume': row[5],
+            'total_token_volume': row[6],
+            'ledger_span': row[7],
+            'days_active': row[8],
+            'first_seen': row[9],
+            'last_seen': row[10],
+            'avg_price': row[11],
+            'price_stddev': row[12],
+            'avg_trade_xrp': row[13],
+            'trade_size_stddev': row[14],
+            'seconds_active': row[15],
+            # No refresh here: score_row runs while the stream holds self.client's
+            # session (analyze() refreshes the cache before opening it)
+            'whitelist_category': self.whitelist.tokens.get((row[0], row[1]), ''),
+            'price_variance_percent': row[16] if row[16] is not None else 0,
+            'size_variance_percent': row[17] if row[17] is not None else 0,
+            'trades_per_account': row[18] if row[18] is not None else 0,
+            'xrp_volume_per_account': row[19] if row[19] is not None else 0,
+            'avg_time_gap_seconds': row[20] if row[20] is not None else 0,
+            'trade_density': row[21] if row[21] is not None else 0,
+            'unique_entities': row[22],
+            'gap_quantiles': list(row[33]) or [0.0] * len(GAP_QUANTILES),
+            'peak_trades_per_minute': row[34]
+        }
+        stats['is_whitelisted'] = 1 if stats['whitelist_category'] else 0
+
+        is_whitelisted = bool(stats['is_whitelisted'])
+
+        # Handle empty whitelist category
+        whitelist_cat = stats['whitelist_category'] if stats['whitelist_category'] else 'none'
+
+        # Detect bridge patterns BEFORE calculating risk score
+        classification, confidence = self.detect_bridge_pattern(stats)
+
+        # Calculate risk scores
+        risk_score = self.calculate_risk_score(stats, is_whitelisted)
+        burst = self.calculate_burst_score(stats['peak_trades_per_minute'], is_whitelisted)
+
+        # Reduce risk score for detected bridges (they're not manipulation)
+        if classification == 'bridge' and confidence >= 0.6:
+            risk_score = risk_score * 0.3  # Reduce to 30% of original
+            burst = burst * 0.3
+
+        # Windowed scores (dashboard leaderboard)
+        window = self.window_metrics(row[23:33])
+        window_scores = self.calculate_window_scores(window, is_whitelisted)
+
+        return (
+            stats['token_code'],
+            stats['token_issuer'],
+            stats['total_trades'],
+            stats['unique_takers'],
+            stats['unique_entities'],
+            stats['unique_counterparties'],
+            stats['total_xrp_volume'],
+            stats['total_token_volume'],
+            stats['ledger_span'],
+            stats['days_active'],
+            stats['first_seen'],
+            stats['last_seen'],
+            stats['avg_price'],
+            stats['price_stddev'],
+            stats['avg_trade_xrp'],
+            stats['trade_size_stddev'],
+            stats['is_whitelisted'],
+            whitelist_cat,
+            stats['avg_time_gap_seconds'],
+            stats['trade_density'],
+            stats['price_variance_percent'],
+            stats['size_variance_percent'],
+            stats['trades_per_account'],
+            stats['xrp_volume_per_account'],
+            risk_score,
+            burst,
+            classification,
+            round(confidence, 3),
+            window['trades_24h'],
+            window['unique_takers_24h'],
+            window['volume_xrp_24h'],
+            window['volume_xrp_7d'],
+            window['price_variance_24h'],
+            window['trades_per_hour_24h'],
+            window['duration_minutes_24h'],
+            window_scores['risk_score_24h'],
+            window_scores['burst_score_24h'],
+            window_scores['impact_factor'],
+            window_scores['final_priority'],
+            *stats['gap_quantiles'],
+            stats['peak_trades_per_minute'],
+            window_end,
+            datetime.now()
         )
 
+    def refresh_token_stats(self, use_sketches: bool = False):
+        """
+        Refresh token_stats table with latest data
+
+        Scores are written to token_stats_staging and swapped in with EXCHANGE
+        TABLES, so readers never see an empty or partially written token_stats
+        and a failed run leaves the previous scores in place.
+
+        Args:
+            use_sketches: Take distinct counts from token_sketch_buckets
+                (approximate, see SKETCH_PRECISION) instead of exact COUNT(DISTINCT)
+        """
+        self.start_time = self.stage_start = time.time()
+        self.timings = {}
+
+        print("=== Token Risk Analyzer ===")
+        print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+        # Whitelist from the in-process cache (reloaded only when whitelist_version changes);
+        # checked once per run, scoring reads the loaded copy
+        if self.whitelist.refresh():
+            print(f"  Whitelist loaded: {len(self.whitelist.tokens)} tokens "
+                  f"(version {self.whitelist.version})\n")
+        self.mark("whitelist")
+
+        # Step 1: Stream base token statistics joined with the 24h / 7d windows
+        if use_sketches:
+            print("Step 1: Merging token statistics from token_sketch_buckets (approximate distincts)...")
+        else:
+            print("Step 1: Querying token statistics from executed_trades...")
+        print(f"  Windows: {PATTERN_WINDOW_HOURS}h / {IMPACT_WINDOW_DAYS}d from token_window_buckets")
+        query = f"""
+        WITH
+        -- Base token statistics
+        token_base AS ({self.token_base_query(use_sketches)}),
+
+        -- Sliding 24h / 7d windows (tokens not traded in the window join as zeros)
+        token_window AS ({self.window_stats_query()}),
+
+        -- Gap quantiles and peak trades per minute (token_trade_seconds)
+        token_burst AS ({self.burst_stats_query()})
+
         SELECT
           tb.token_code,
           tb.token_issuer,
@@ -241,158 +760,94 @@ class TokenAnalyzer:
           tb.trade_size_stddev,
           tb.seconds_active,
 
-          -- Check whitelist status (must check for empty string, not just NULL)
-          IF(tw.token_code != '' AND tw.token_code IS NOT NULL, 1, 0) as is_whitelisted,
-          toString(tw.category) as whitelist_category,
-
           -- Calculate metrics
           ROUND(tb.price_stddev / nullIf(tb.avg_price, 0) * 100, 2) as price_variance_percent,
           ROUND(tb.trade_size_stddev / nullIf(tb.avg_trade_xrp, 0) * 100, 2) as size_variance_percent,
           ROUND(tb.total_trades / nullIf(tb.unique_takers, 0), 2) as trades_per_account,
           ROUND(tb.total_xrp_volume / nullIf(tb.unique_takers, 0), 2) as xrp_volume_per_account,
 
-          -- Calculate time-based metrics (optimized - no array loading)
-          -- Average time gap = total active seconds / (number of trades - 1)
-          CASE
-            WHEN tb.total_trades > 1 AND tb.seconds_active > 0
-            THEN tb.seconds_active / (tb.total_trades - 1)
-            ELSE 0
-          END as avg_time_gap_seconds,
-
-          -- Trade density (trades per hour)
-          CASE
-            WHEN tb.seconds_active > 0
-            THEN tb.total_trades / (tb.seconds_active / 3600.0)
-            ELSE 0
-          END as trade_density
+          -- Time-based metrics over the impact window (token_trade_seconds), not the
+          -- whole active span: mean gap between consecutive trades, and trades per
+          -- hour at the pace of the median gap (at least 1s, close time resolution)
+          if(tbu.gaps > 0, tbu.avg_gap_seconds, 0) as avg_time_gap_seconds,
+          if(tbu.gaps > 0, 3600 / greatest(tbu.gap_quantiles[{GAP_QUANTILES.index(0.5) + 1}], 1), 0)
+            as trade_density,
+
+          tb.unique_entities,
+
+          -- Window columns, see window_metrics()
+          tw.trades_24h,
+          tw.unique_takers_24h,
+          tw.volume_xrp_24h,
+          tw.volume_xrp_7d,
+          tw.avg_price as avg_price_24h,
+          tw.price_stddev as price_stddev_24h,
+          tw.avg_size,
+          tw.size_stddev,
+          tw.first_trade,
+          tw.last_trade,
+
+          -- Burst columns (empty quantiles / zero peak before migration 016 backfill)
+          tbu.gap_quantiles,
+          tbu.peak_trades_per_minute
 
         FROM token_base tb
-        LEFT JOIN token_whitelist tw
-          ON tb.token_code = tw.token_code
-          AND tb.token_issuer = tw.token_issuer
+        LEFT JOIN token_window tw
+          ON tb.token_code = tw.token_code AND tb.token_issuer = tw.token_issuer
+        LEFT JOIN token_burst tbu
+          ON tb.token_code = tbu.token_code AND tb.token_issuer = tbu.token_issuer
         WHERE tb.total_trades >= 3
         ORDER BY tb.total_xrp_volume DESC
         """
 
-        result = self.client.query(query)
-        tokens = result.result_rows
-        print(f"  Found {len(tokens)} tokens with >= 3 trades\n")
+        # Step 2: Score and insert block by block, so only one block of rows is
+        # held in memory however many tokens are tracked. Inserts go through the
+        # writer client while the stream keeps self.client's session busy, into a
+        # fresh staging table; dashboards keep reading the previous token_stats.
+        print(f"Step 2: Scoring and inserting in blocks of up to {STREAM_BLOCK_ROWS:,} tokens...")
+        self.writer.command(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        self.writer.command(f"CREATE TABLE {STAGING_TABLE} AS token_stats")
+        window_end = datetime.now()
+        tokens = blocks = 0
+        settings = {'max_block_size': STREAM_BLOCK_ROWS}
+        with self.client.query_row_block_stream(query, parameters=WINDOW_PARAMETERS,
+                                                settings=settings) as stream:
+            for block in stream:
+                self.mark("base_stats")
+                rows = [self.score_row(row, window_end) for row in block]
+                self.mark("scoring")
+
+                self.writer.insert(STAGING_TABLE, rows, column_names=TOKEN_STATS_COLUMNS)
+                tokens += len(rows)
+                blocks += 1
+                print(f"  Block {blocks}: {len(rows)} tokens ({tokens} total)")
+                self.mark("insert")
 
         if not tokens:
             print("No tokens to analyze. Exiting.")
             return
+        print(f"  ✓ Inserted {tokens} token statistics with >= 3 trades\n")
 
-        # Step 2: Calculate risk scores and prepare data
-        print("Step 2: Calculating risk scores...")
-        token_stats_data = []
-
-        for row in tokens:
-            # Parse row data
-            stats = {
-                'token_code': row[0],
-                'token_issuer': row[1],
-                'total_trades': row[2],
-                'unique_takers': row[3],
-                'unique_counterparties': row[4],
-                'total_xrp_volume': row[5],
-                'total_token_volume': row[6],
-                'ledger_span': row[7],
-                'days_active': row[8],
-                'first_seen': row[9],
-                'last_seen': row[10],
-                'avg_price': row[11],
-                'price_stddev': row[12],
-                'avg_trade_xrp': row[13],
-                'trade_size_stddev': row[14],
-                'seconds_active': row[15],
-                'is_whitelisted': row[16],
-                'whitelist_category': row[17],
-                'price_variance_percent': row[18] if row[18] is not None else 0,
-                'size_variance_percent': row[19] if row[19] is not None else 0,
-                'trades_per_account': row[20] if row[20] is not None else 0,
-                'xrp_volume_per_account': row[21] if row[21] is not None else 0,
-                'avg_time_gap_seconds': row[22] if row[22] is not None else 0,
-                'trade_density': row[23] if row[23] is not None else 0
-            }
-
-            is_whitelisted = bool(stats['is_whitelisted'])
-
-            # Handle empty whitelist category
-            whitelist_cat = stats['whitelist_category'] if stats['whitelist_category'] else 'none'
-
-            # Detect bridge patterns BEFORE calculating risk score
-            classification, confidence = self.detect_bridge_pattern(stats)
-
-            # Calculate risk scores
-            risk_score = self.calculate_risk_score(stats, is_whitelisted)
-            burst = self.calculate_burst_score(stats['trade_density'], is_whitelisted)
-
-            # Reduce risk score for detected bridges (they're not manipulation)
-            if classification == 'bridge' and confidence >= 0.6:
-                risk_score = risk_score * 0.3  # Reduce to 30% of original
-                burst = burst * 0.3
-
-            # Prepare row for insertion
-            token_stats_data.append((
-                stats['token_code'],
-                stats['token_issuer'],
-                stats['total_trades'],
-                stats['unique_takers'],
-                stats['unique_counterparties'],
-                stats['total_xrp_volume'],
-                stats['total_token_volume'],
-                stats['ledger_span'],
-                stats['days_active'],
-                stats['first_seen'],
-                stats['last_seen'],
-                stats['avg_price'],
-                stats['price_stddev'],
-                stats['avg_trade_xrp'],
-                stats['trade_size_stddev'],
-                stats['is_whitelisted'],
-                whitelist_cat,
-                stats['avg_time_gap_seconds'],
-                stats['trade_density'],
-                stats['price_variance_percent'],
-                stats['size_variance_percent'],
-                stats['trades_per_account'],
-                stats['xrp_volume_per_account'],
-                risk_score,
-                burst,
-                classification,
-                round(confidence, 3),
-                datetime.now()
-            ))
-
-        print(f"  Calculated scores for {len(token_stats_data)} tokens\n")
-
-        # Step 3: Truncate and insert
-        print("Step 3: Updating token_stats table...")
-        self.client.command("TRUNCATE TABLE token_stats")
-        self.client.insert(
-            "token_stats",
-            token_stats_data,
-            column_names=[
-                "token_code", "token_issuer", "total_trades", "unique_takers",
-                "unique_counterparties", "total_xrp_volume", "total_token_volume",
-                "ledger_span", "days_active", "first_seen", "last_seen",
-                "avg_price", "price_stddev", "avg_trade_xrp", "trade_size_stddev",
-                "is_whitelisted", "whitelist_category", "avg_time_gap_seconds",
-                "trade_density", "price_variance_percent", "size_variance_percent",
-                "trades_per_account", "xrp_volume_per_account", "risk_score",
-                "burst_score", "classification", "classification_confidence", "last_updated"
-            ]
-        )
-        print(f"  ✓ Inserted {len(token_stats_data)} token statistics\n")
+        # Step 3: Publish atomically (the previous snapshot stays in staging until next run)
+        self.writer.command(f"EXCHANGE TABLES token_stats AND {STAGING_TABLE}")
+        print("Step 3: Published token_stats (EXCHANGE TABLES)\n")
+        self.mark("publish")
 
         # Step 4: Print summary
         self.print_summary()
+        self.mark("summary")
 
         duration = time.time() - self.start_time
         print(f"\n=== Analysis Complete ===")
         print(f"Duration: {duration:.2f}s")
         print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+    def mark(self, stage: str):
+        """Add the time since the previous mark to a refresh stage (stages repeat per block)"""
+        now = time.time()
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + now - self.stage_start, 3)
+        self.stage_start = now
+
     def print_summary(self):
         """Print summary of risk scores"""
         print("="*80)
@@ -401,12 +856,10 @@ class TokenAnalyzer:
 
         result = self.client.query("""
             SELECT
-                CASE
-                  WHEN length(token_code) = 40 THEN
-                    upper(replaceRegexpAll(unhex(token_code), '\0', ''))
-                  ELSE upper(token_code)
-                END as token_code,
-                SUBSTRING(token_issuer, 1, 10) || '...' as issuer_short,
+                dictGetOrDefault('xrp_watchdog.token_registry_dict', 'display_name',
+                                 (token_code, token_issuer), upper(token_code)) as token_name,
+                dictGetOrDefault('xrp_watchdog.token_registry_dict', 'issuer_short',
+                                 (token_code, token_issuer), SUBSTRING(token_issuer, 1, 10) || '...') as issuer_short,
                 total_trades,
                 unique_takers,
                 ROUND(total_xrp_volume, 0) as volume_xrp,
@@ -457,8 +910,22 @@ class TokenAnalyzer:
 
 def main():
     """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Token Risk Analyzer")
+    parser.add_argument("--sketch", action="store_true",
+                        help="Use mergeable distinct-count sketches (token_sketch_buckets, ~0.3%% error)")
+    parser.add_argument("--compare-sketches", action="store_true",
+                        help="Report sketch vs exact distinct counts instead of refreshing token_stats")
+    parser.add_argument("--days", type=int, default=None,
+                        help="Window for --compare-sketches in days (default: all data)")
+    args = parser.parse_args()
+
     analyzer = TokenAnalyzer()
-    analyzer.refresh_token_stats()
+    if args.compare_sketches:
+        analyzer.compare_sketches(args.days)
+    else:
+        analyzer.refresh_token_stats(use_sketches=args.sketch)
 
 
 if __name__ == "__main__":
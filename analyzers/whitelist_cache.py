@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Whitelist Cache
+In-process copy of token_whitelist, reloaded only when whitelist_version
+(bumped by scripts/manage_whitelist.py, migration 012) changes
+"""
+
+import time
+from typing import Dict, Tuple
+
+# Configuration
+CHECK_INTERVAL_SECONDS = 30       # Version is re-read at most this often
+
+
+class WhitelistCache:
+    def __init__(self, client, check_interval: float = CHECK_INTERVAL_SECONDS):
+        """
+        Initialize cache (loaded on first use)
+
+        Args:
+            client: ClickHouse client
+            check_interval: Minimum seconds between version checks
+        """
+        self.client = client
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0.0
+        self.tokens: Dict[Tuple[str, str], str] = {}   # (code, issuer) -> category
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the whitelist if its version changed
+
+        Returns:
+            True if the whitelist was (re)loaded
+        """
+        now = time.time()
+        if not force and self.version is not None and now - self.checked_at < self.check_interval:
+            return False
+        self.checked_at = now
+
+        version = self.client.query("SELECT max(version) FROM whitelist_version").result_rows[0][0]
+        if not force and version == self.version:
+            return False
+
+        result = self.client.query("""
+            SELECT token_code, token_issuer, toString(category)
+            FROM token_whitelist
+        """)
+        self.tokens = {(code, issuer): category for code, issuer, category in result.result_rows}
+        self.version = version
+        return True
+
+    def category(self, token_code: str, token_issuer: str) -> str:
+        """Whitelist category, '' when the token is not whitelisted"""
+        self.refresh()
+        return self.tokens.get((token_code, token_issuer), '')
+
+    def is_whitelisted(self, token_code: str, token_issuer: str) -> bool:
+        self.refresh()
+        return (token_code, token_issuer) in self.tokens
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Account Clustering
+Merges accounts into entities with an incremental union-find so the analyzer
+can count distinct entities instead of distinct takers. Merge signals:
+  - funding: activating Payment from the same funder (account_funding)
+  - counterparty: every trade of an account against the same counterparty
+    (not market makers / AMMs that are the only partner of many takers)
+  - trade_size: repeated identical (non-round) trade sizes on the same token
+Each run reads only executed_trades rows inserted since the previous run
+(inserted_at, migration 016: ledgers are not stored in ledger order) and
+writes the accounts whose entity changed to account_clusters (migration 014)
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+import clickhouse_connect
+
+from rippled_pool import RippledPool, RippledError
+
+# Configuration
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+CHECKPOINT_PATH = "/home/grapedrop/monitoring/xrp-watchdog/logs/account_clusters.json"
+CHECKPOINT_VERSION = 2
+REBUILD_DAYS = 90                 # Trades read by the first run and by --rebuild (executed_trades TTL)
+SETTLE_SECONDS = 60               # Rows inserted more recently are left to the next run (inserts in flight)
+STAGING_TABLE = "account_clusters_staging"   # --rebuild writes here, then EXCHANGE TABLES
+
+# Merge signals
+SAME_PARTNER_MIN_TRADES = 5       # Trades, all against one counterparty, before merging
+SAME_SIZE_MIN_TRADES = 3          # Trades per account at one exact size before it counts
+MAX_SIZE_ACCOUNTS = 10            # Sizes used by more accounts are common, not a signal
+MAX_FUNDED_ACCOUNTS = 25          # Funders of more accounts are hubs (exchanges), ignored
+MAX_PARTNER_ACCOUNTS = 25         # Sole partners of more takers are hubs (market makers, AMMs), ignored
+SIGNAL_WINDOW_LEDGERS = 25_000    # ~1 day: trade-size counters older than this are dropped
+PARTNER_WINDOW_LEDGERS = 175_000  # ~7 days: counterparty counters idle longer are dropped
+
+# Funding lookups (one account_tx call per account, cached in account_funding)
+FUNDING_LOOKUPS_PER_RUN = 200
+
+
+class UnionFind:
+    """Disjoint sets over account strings (union by size, path compression)"""
+
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.members: Dict[str, List[str]] = {}   # Root -> accounts (multi-account sets only)
+
+    def find(self, account: str) -> str:
+        root = account
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while account != root:
+            self.parent[account], account = root, self.parent[account]
+        return root
+
+    def union(self, a: str, b: str) -> List[str]:
+        """
+        Merge the sets of a and b
+
+        Returns:
+            Accounts whose root changed (empty if already in one set)
+        """
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return []
+        members_a = self.members.get(root_a, [root_a])
+        members_b = self.members.get(root_b, [root_b])
+        if (len(members_a), root_b) < (len(members_b), root_a):
+            root_a, root_b, members_a, members_b = root_b, root_a, members_b, members_a
+        self.parent[root_b] = root_a
+        self.members.pop(root_b, None)
+        self.members[root_a] = members_a + members_b
+        return members_b
+
+    def attach(self, account: str, root: str):
+        """Add an account to root's set, keeping root (restoring stored entities)"""
+        if account == root:
+            return
+        self.parent[account] = root
+        self.members.setdefault(root, [root]).append(account)
+
+
+class AccountClusterer:
+    def __init__(self, client=None, rippled: Optional[RippledPool] = None,
+                 checkpoint_path: str = CHECKPOINT_PATH):
+        """
+        Initialize clusterer (state is loaded on first update)
+
+        Args:
+            client: ClickHouse client to use (default: new client)
+            rippled: Rippled pool for funding lookups (default: new pool)
+            checkpoint_path: JSON file holding signal counters between runs
+        """
+        self.client = client or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.rippled = rippled or RippledPool()
+        self.checkpoint_path = checkpoint_path
+        self.loaded = False
+        self.reset()
+
+    def reset(self):
+        """Forget all clusters and signal counters"""
+        self.uf = UnionFind()
+        self.last_ledger = 0                         # Highest ledger seen (signal windows)
+        self.last_inserted = 0                       # inserted_at watermark (unix time), 0 = none yet
+        self.partners: Dict[str, list] = {}          # account -> [counterparty or '' if several, trades, last ledger]
+        self.sizes: Dict[str, dict] = {}             # "code|issuer|size" -> {"ledger", "accounts": {account: n}}
+        self.funded: Set[str] = set()                # Accounts already looked up
+        self.funders: Dict[str, List[str]] = {}      # funder -> funded accounts
+        self.pending: Set[str] = set()               # Accounts awaiting a funding lookup
+        self.changed: Dict[str, str] = {}            # account -> signal, not yet written
+
+    # State -----------------------------------------------------------------
+
+    def load(self):
+        """Restore entities, funding cache and signal counters"""
+        # Stored entity ids stay the roots, so rows not rewritten remain valid
+        result = self.client.query("""
+            SELECT account, argMax(entity_id, updated_at)
+            FROM account_clusters
+            GROUP BY account
+        """)
+        for account, entity_id in result.result_rows:
+            self.uf.attach(account, entity_id)
+
+        self.load_funding()
+        self.load_checkpoint()
+        self.loaded = True
+
+    def load_funding(self):
+        """Restore funders already looked up"""
+        result = self.client.query("SELECT account, any(funder) FROM account_funding GROUP BY account")
+        for account, funder in result.result_rows:
+            self.funded.add(account)
+            if funder:
+                self.funders.setdefault(funder, []).append(account)
+
+    def save_checkpoint(self):
+        """Write signal counters to the checkpoint file (atomic replace)"""
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "last_ledger": self.last_ledger,
+            "last_inserted": self.last_inserted,
+            "partners": self.partners,
+            "sizes": self.sizes,
+            "pending": sorted(self.pending)
+        }
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        """Restore signal counters from the checkpoint file if present"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION:
+                print(f"  Warning: Ignoring account cluster checkpoint version {data.get('version')}")
+                return
+            self.last_ledger = data["last_ledger"]
+            self.last_inserted = data["last_inserted"]
+            self.partners = data["partners"]
+            self.sizes = data["sizes"]
+            self.pending = set(data["pending"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  Warning: Could not load account cluster checkpoint: {e}")
+
+    # Signals ---------------------------------------------------------------
+
+    def merge(self, a: str, b: str, signal: str):
+        for account in self.uf.union(a, b):
+            self.changed[account] = signal
+
+    def sole_partners(self) -> Dict[str, List[str]]:
+        """Counterparty -> takers with SAME_PARTNER_MIN_TRADES+ trades, all against it"""
+        takers = {}
+        for taker, (counterparty, trades, _) in self.partners.items():
+            if counterparty and trades >= SAME_PARTNER_MIN_TRADES:
+                takers.setdefault(counterparty, []).append(taker)
+        return takers
+
+    def process_trades(self, trades: List[tuple]) -> Tuple[List[str], List[str]]:
+        """
+        Apply the counterparty and trade-size signals
+
+        Counterparty merges are applied once the whole batch is counted, so an
+        account that is the sole partner of many takers in one batch is
+        recognised as a hub first.
+
+        Args:
+            trades: (ledger_index, taker, counterparties, code, issuer, exec_xrp) rows;
+                ledgers older than ones already processed may still arrive
+
+        Returns:
+            (partners that became hubs after their takers were merged,
+             takers merged on a partner they have since traded away from)
+        """
+        previous = self.sole_partners()
+        merged = {taker for counterparty, takers in previous.items()
+                  if len(takers) <= MAX_PARTNER_ACCOUNTS for taker in takers}
+        split = []
+        for ledger_index, taker, counterparties, code, issuer, exec_xrp in trades:
+            for account in (taker, *counterparties):
+                if account not in self.funded:
+                    self.pending.add(account)
+
+            # Counterparty: every trade of this taker against one account
+            partner = self.partners.get(taker)
+            counterparty = counterparties[0] if len(counterparties) == 1 else ''
+            if partner is None:
+                partner = self.partners[taker] = [counterparty, 0, ledger_index]
+            elif partner[0] != counterparty:
+                if taker in merged and partner[0]:
+                    split.append(taker)
+                partner[0] = ''
+            partner[1] += 1
+            partner[2] = max(partner[2], ledger_index)
+
+            # Trade size: identical non-round sizes (round sizes are what humans type)
+            size = abs(exec_xrp)
+            if not code or round(size, 2) == size:
+                continue
+            key = f"{code}|{issuer}|{size:.6f}"
+            entry = self.sizes.get(key)
+            if entry is None:
+                entry = self.sizes[key] = {"ledger": ledger_index, "accounts": {}}
+            entry["ledger"] = max(entry["ledger"], ledger_index)
+            counts = entry["accounts"]
+            counts[taker] = counts.get(taker, 0) + 1
+            if counts[taker] != SAME_SIZE_MIN_TRADES or len(counts) > MAX_SIZE_ACCOUNTS:
+                continue
+            for other, n in counts.items():
+                if other != taker and n >= SAME_SIZE_MIN_TRADES:
+                    self.merge(taker, other, "trade_size")
+
+        new_hubs = []
+        for counterparty, takers in self.sole_partners().items():
+            if len(takers) <= MAX_PARTNER_ACCOUNTS:
+                for taker in takers:
+                    self.merge(taker, counterparty, "counterparty")
+            elif 0 < len(previous.get(counterparty, [])) <= MAX_PARTNER_ACCOUNTS:
+                new_hubs.append(counterparty)
+
+        if trades:
+            self.last_ledger = max(self.last_ledger, max(trade[0] for trade in trades))
+            cutoff = self.last_ledger - SIGNAL_WINDOW_LEDGERS
+            self.sizes = {k: v for k, v in self.sizes.items() if v["ledger"] >= cutoff}
+            cutoff = self.last_ledger - PARTNER_WINDOW_LEDGERS
+            self.partners = {k: v for k, v in self.partners.items() if v[2] >= cutoff}
+        return new_hubs, split
+
+    def find_funder(self, account: str) -> tuple:
+        """
+        Sender of the Payment that created an account
+
+        Returns:
+            (funder, ledger_index), ('', 0) when the creation is not in the node's history
+        """
+        try:
+            result = self.rippled.request("account_tx", {
+                "account": account, "ledger_index_min": -1, "ledger_index_max": -1,
+                "forward": True, "limit": 1
+            })
+        except RippledError as e:
+            if e.error == "actNotFound":
+                return '', 0
+            raise
+        for entry in result.get("transactions", []):
+            tx, meta = entry.get("tx", {}), entry.get("meta", {})
+            if tx.get("TransactionType") != "Payment" or tx.get("Destination") != account:
+                continue
+            for node in meta.get("AffectedNodes", []):
+                created = node.get("CreatedNode", {})
+                if (created.get("LedgerEntryType") == "AccountRoot"
+                        and created.get("NewFields", {}).get("Account") == account):
+                    return tx["Account"], tx.get("ledger_index", 0)
+        return '', 0
+
+    def lookup_funding(self, limit: int = FUNDING_LOOKUPS_PER_RUN) -> tuple:
+        """
+        Look up funders of new accounts and apply the funding signal
+
+        Merges are applied once all lookups of the run are in, so a funder seen
+        funding many accounts in one run is recognised as a hub first.
+
+        Returns:
+            (accounts looked up, funders that became hubs after their accounts were merged)
+        """
+        rows = []
+        for account in sorted(self.pending)[:limit]:
+            try:
+                funder, ledger_index = self.find_funder(account)
+            except RippledError as e:
+                print(f"  Warning: Funding lookups stopped: {e}")
+                break
+            rows.append((account, funder, ledger_index))
+        if rows:
+            self.client.insert("account_funding", rows,
+                               column_names=["account", "funder", "funded_ledger"])
+        previous = {}
+        for account, funder, _ in rows:
+            self.pending.discard(account)
+            self.funded.add(account)
+            if not funder:
+                continue
+            funded = self.funders.setdefault(funder, [])
+            previous.setdefault(funder, len(funded))
+            funded.append(account)
+
+        new_hubs = []
+        for funder, before in previous.items():
+            funded = self.funders[funder]
+            if len(funded) <= MAX_FUNDED_ACCOUNTS:
+                for account in funded[max(before, 1):]:
+                    self.merge(account, funded[0], "funding")
+            elif before > 1:
+                new_hubs.append(funder)
+        return len(rows), new_hubs
+
+    def apply_cached_funding(self):
+        """Funding signal from account_funding alone (rebuild)"""
+        for funded in self.funders.values():
+            if 1 < len(funded) <= MAX_FUNDED_ACCOUNTS:
+                for account in funded[1:]:
+                    self.merge(account, funded[0], "funding")
+
+    # Runs ------------------------------------------------------------------
+
+    def read_trades(self, days: Optional[int] = None) -> List[tuple]:
+        """
+        Trades inserted since the last run (or of the last N days when starting over)
+
+        Advances last_inserted to the end of the range read; rows of the last
+        SETTLE_SECONDS are left for the next run, so an insert still in flight
+        cannot commit behind the watermark.
+        """
+        until = self.client.query(
+            "SELECT toUnixTimestamp(now()) - {settle:UInt32}", parameters={"settle": SETTLE_SECONDS}
+        ).result_rows[0][0]
+        if days is not None or not self.last_inserted:
+            window, parameters = "time >= now() - INTERVAL {days:UInt32} DAY", {"days": days or REBUILD_DAYS}
+        else:
+            window, parameters = "inserted_at > toDateTime({since:UInt32})", {"since": self.last_inserted}
+        parameters["until"] = until
+        result = self.client.query(f"""
+            SELECT ledger_index, taker, counterparties, exec_iou_code, exec_iou_issuer, exec_xrp
+            FROM executed_trades
+            WHERE {window}
+              AND inserted_at <= toDateTime({{until:UInt32}})
+            ORDER BY ledger_index
+        """, parameters=parameters)
+        self.last_inserted = until
+        return result.result_rows
+
+    def write_changes(self, table: str = "account_clusters") -> int:
+        """Write accounts whose entity changed, return how many"""
+        if not self.changed:
+            return 0
+        now = datetime.now()
+        rows = [(account, self.uf.find(account), signal, now) for account, signal in self.changed.items()]
+        self.client.insert(table, rows,
+                           column_names=["account", "entity_id", "signal", "updated_at"])
+        self.changed = {}
+        return len(rows)
+
+    def update(self, funding_lookups: int = FUNDING_LOOKUPS_PER_RUN) -> Dict:
+        """
+        Process trades since the last run
+
+        Returns:
+            Summary dict (trades, merges written, lookups, entities)
+        """
+        start = time.time()
+        if not self.loaded:
+            self.load()
+
+        trades = self.read_trades()
+        partner_hubs, split = self.process_trades(trades)
+        lookups, new_hubs = self.lookup_funding(funding_lookups) if funding_lookups else (0, [])
+        if new_hubs or partner_hubs or split:
+            # Accounts already merged through these funders / partners must be split again
+            if new_hubs:
+                print(f"  Funders now over {MAX_FUNDED_ACCOUNTS} accounts (hubs): {', '.join(new_hubs)}")
+            if partner_hubs:
+                print(f"  Sole partner of over {MAX_PARTNER_ACCOUNTS} takers (hubs): {', '.join(partner_hubs)}")
+            if split:
+                print(f"  {len(split)} takers merged on a counterparty now trade with others")
+            print("  Rebuilding")
+            return self.rebuild()
+        written = self.write_changes()
+        self.save_checkpoint()
+
+        summary = {
+            "trades": len(trades),
+            "accounts_moved": written,
+            "funding_lookups": lookups,
+            "funding_pending": len(self.pending),
+            "entities": len(self.uf.members),
+            "clustered_accounts": sum(len(m) for m in self.uf.members.values()),
+            "seconds": round(time.time() - start, 2)
+        }
+        print(f"Account clustering: {summary['trades']} trades, {written} accounts moved, "
+              f"{lookups} funding lookups ({summary['funding_pending']} pending), "
+              f"{summary['clustered_accounts']} accounts in {summary['entities']} entities "
+              f"({summary['seconds']:.2f}s)")
+        return summary
+
+    def rebuild(self, days: int = REBUILD_DAYS) -> Dict:
+        """
+        Recompute all entities from the last N days of trades (drops stale merges)
+
+        The mapping is written to a staging table and swapped in with EXCHANGE
+        TABLES, so account_clusters_dict keeps serving the previous entities
+        until the new ones are complete.
+        """
+        start = time.time()
+        self.reset()
+        self.load_funding()
+        self.loaded = True
+
+        trades = self.read_trades(days)
+        self.process_trades(trades)
+        self.apply_cached_funding()
+
+        self.client.command(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        self.client.command(f"CREATE TABLE {STAGING_TABLE} AS account_clusters")
+        self.changed = {account: self.changed.get(account, "rebuild")
+                        for members in self.uf.members.values() for account in members}
+        written = self.write_changes(STAGING_TABLE)
+        self.client.command(f"EXCHANGE TABLES account_clusters AND {STAGING_TABLE}")
+        self.save_checkpoint()
+        print(f"Rebuilt account clusters from {len(trades)} trades ({days}d): "
+              f"{written} accounts in {len(self.uf.members)} entities ({time.time() - start:.2f}s)")
+        return {"trades": len(trades), "clustered_accounts": written, "entities": len(self.uf.members)}
+
+    def print_entities(self, limit: int = 20):
+        """Largest entities"""
+        entities = sorted(self.uf.members.items(), key=lambda item: len(item[1]), reverse=True)[:limit]
+        print(f"\n{'Entity':<36} {'Accounts':>9}")
+        print("-" * 46)
+        for root, members in entities:
+            print(f"{root:<36} {len(members):>9}")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Account Clustering")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Recompute all entities from recent trades instead of updating")
+    parser.add_argument("--days", type=int, default=REBUILD_DAYS,
+                        help=f"Days of trades read by --rebuild (default: {REBUILD_DAYS}, the retention)")
+    parser.add_argument("--lookups", type=int, default=FUNDING_LOOKUPS_PER_RUN,
+                        help=f"Funding lookups per run, 0 = none (default: {FUNDING_LOOKUPS_PER_RUN})")
+    parser.add_argument("--show", type=int, default=0, metavar="N",
+                        help="Print the N largest entities")
+
+    args = parser.parse_args()
+
+    clusterer = AccountClusterer()
+    if args.rebuild:
+        clusterer.rebuild(args.days)
+    else:
+        clusterer.update(args.lookups)
+    if args.show:
+        clusterer.print_entities(args.show)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Account Registry
+Records the accounts behind executed_trades.taker_id / counterparty_ids
+(cityHash64 of the address, computed by ClickHouse, migration 017): new
+accounts are written to account_ids before the trades that reference them,
+so account_names_dict can decode every ID the pair queries return
+"""
+
+import threading
+from typing import Iterable, Set
+
+
+class AccountRegistry:
+    def __init__(self, client):
+        """
+        Initialize registry (known accounts are loaded on first use)
+
+        Args:
+            client: ClickHouse client (used only by this registry)
+        """
+        self.client = client
+        self.known: Set[str] = set()
+        self.loaded = False
+        self.lock = threading.Lock()      # Shared by parallel trade collectors
+
+    def load(self):
+        """Load the accounts already registered"""
+        result = self.client.query("SELECT DISTINCT account FROM account_ids")
+        self.known = {account for account, in result.result_rows}
+        self.loaded = True
+
+    def register(self, accounts: Iterable[str]) -> int:
+        """
+        Register accounts not seen before
+
+        IDs are derived from the address, so several processes registering the
+        same account write identical rows (collapsed by ReplacingMergeTree).
+
+        Args:
+            accounts: Account addresses (duplicates and '' are fine)
+
+        Returns:
+            Number of accounts added
+        """
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            new = {account for account in accounts if account and account not in self.known}
+            if not new:
+                return 0
+            self.client.insert("account_ids", [(account,) for account in sorted(new)],
+                               column_names=["account"])
+            self.known.update(new)
+            return len(new)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Adaptive Screening Thresholds
+Per-pair volume / variance thresholds from rolling quantile sketches, with a
+controller that keeps the share of flagged ledgers near a target rate so
+Phase 2 trade collection stays within its throughput budget
+"""
+
+import os
+import json
+import math
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Configuration
+CHECKPOINT_PATH = "/home/grapedrop/monitoring/xrp-watchdog/logs/screener_thresholds.json"
+CHECKPOINT_VERSION = 1
+
+# Quantile sketch
+RELATIVE_ACCURACY = 0.02          # Quantiles within +/-2% of the true value
+MAX_BINS = 256                    # Bins of the tail not read are collapsed beyond this
+ROLLING_WINDOW = 2000             # Counts are halved every N observations per pair
+
+# Thresholds
+MIN_OBSERVATIONS = 50             # Use the fixed thresholds until a pair has this history
+MIN_VOLUME_FRACTION = 0.2         # Never flag below 1/5 of the fixed volume threshold, however quiet the pair
+MIN_VARIANCE = 0.001              # Variance threshold range (0.1% .. fixed threshold)
+VARIANCE_QUANTILE = 0.25          # Flag only the tightest quarter of the pair's ranges
+
+# Flag-rate controller: tail probability of the volume quantile
+TARGET_FLAG_RATE = 0.10           # Share of screened ledgers sent to Phase 2
+TAIL_MIN, TAIL_MAX = 0.0005, 0.10 # Volume quantile between p90 and p99.95
+TAIL_START = 0.01                 # Start at p99
+CONTROLLER_GAIN = 0.05            # Per-ledger step (multiplicative)
+RATE_EWMA_ALPHA = 0.02            # ~50-ledger memory for the observed flag rate
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch-style)
+
+    Values are counted in buckets of width gamma = (1 + a) / (1 - a), so any
+    quantile is returned within relative error a. Zeros are counted separately.
+    Beyond MAX_BINS the end opposite the quantiles that are read is collapsed
+    (keep_upper: volume reads the upper tail, variance the lower one).
+    """
+
+    def __init__(self, bins: Optional[Dict[int, float]] = None, zeros: float = 0.0,
+                 keep_upper: bool = True):
+        self.keep_upper = keep_upper
+        self.gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+        self.log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, float] = bins or {}
+        self.zeros = zeros
+        self.observations = 0
+
+    @property
+    def count(self) -> float:
+        return self.zeros + sum(self.bins.values())
+
+    def add(self, value: float):
+        """Add one observation (negative values count as zero)"""
+        if value <= 0:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0.0) + 1
+            if len(self.bins) > MAX_BINS:
+                self._collapse()
+
+        self.observations += 1
+        if self.observations % ROLLING_WINDOW == 0:
+            self.zeros *= 0.5
+            self.bins = {k: c * 0.5 for k, c in self.bins.items()}
+
+    def _collapse(self):
+        """Merge the two outermost bins of the tail that is not read"""
+        keys = sorted(self.bins)
+        outer, second = (keys[0], keys[1]) if self.keep_upper else (keys[-1], keys[-2])
+        self.bins[second] += self.bins.pop(outer)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), None when empty"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        if rank < self.zeros:
+            return 0.0
+        cumulative = self.zeros
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative >= rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {"bins": self.bins, "zeros": self.zeros, "observations": self.observations}
+
+    @classmethod
+    def from_dict(cls, data: dict, keep_upper: bool = True) -> "QuantileSketch":
+        sketch = cls({int(k): v for k, v in data["bins"].items()}, data["zeros"], keep_upper)
+        sketch.observations = data["observations"]
+        return sketch
+
+
+class AdaptiveThresholds:
+    def __init__(self, fixed_volume: float, fixed_variance: float,
+                 target_flag_rate: float = TARGET_FLAG_RATE,
+                 checkpoint_path: str = CHECKPOINT_PATH):
+        """
+        Initialize thresholds and restore the last checkpoint
+
+        Args:
+            fixed_volume: Global volume threshold (drops), used for new pairs
+            fixed_variance: Global variance threshold, also the variance upper bound
+            target_flag_rate: Share of screened ledgers that should be flagged
+            checkpoint_path: JSON file holding sketches and controller state
+        """
+        self.fixed_volume = fixed_volume
+        self.min_volume_drops = fixed_volume * MIN_VOLUME_FRACTION
+        self.fixed_variance = fixed_variance
+        self.target_flag_rate = target_flag_rate
+        self.checkpoint_path = checkpoint_path
+        self.volume: Dict[str, QuantileSketch] = {}
+        self.variance: Dict[str, QuantileSketch] = {}
+        self.tail = TAIL_START
+        self.flag_rate = target_flag_rate
+        self.ledgers = 0
+        self.load_checkpoint()
+
+    def thresholds(self, pair: str) -> tuple:
+        """
+        Current (volume, variance) thresholds for a pair
+
+        Volume threshold is the pair's (1 - tail) quantile, never below
+        min_volume_drops (MIN_VOLUME_FRACTION of the fixed threshold). Variance threshold is the pair's VARIANCE_QUANTILE,
+        clamped to [MIN_VARIANCE, fixed variance].
+        """
+        volume = self.volume.get(pair)
+        if volume is None or volume.observations < MIN_OBSERVATIONS:
+            return self.fixed_volume, self.fixed_variance
+
+        volume_threshold = max(volume.quantile(1 - self.tail), self.min_volume_drops)
+        variance_q = self.variance[pair].quantile(VARIANCE_QUANTILE)
+        variance_threshold = min(max(variance_q, MIN_VARIANCE), self.fixed_variance)
+        return volume_threshold, variance_threshold
+
+    def is_suspicious(self, pair: str, volume_xrp: float, variance: float) -> bool:
+        """
+        Evaluate one book change against the pair's thresholds, then update the
+        pair's sketches with it (evaluation never sees its own observation)
+        """
+        volume_threshold, variance_threshold = self.thresholds(pair)
+        suspicious = volume_xrp >= volume_threshold and variance < variance_threshold
+
+        if pair not in self.volume:
+            self.volume[pair] = QuantileSketch()
+            self.variance[pair] = QuantileSketch(keep_upper=False)   # VARIANCE_QUANTILE is a low quantile
+        self.volume[pair].add(volume_xrp)
+        self.variance[pair].add(variance)
+        return suspicious
+
+    def observe_ledger(self, flagged: bool):
+        """
+        Feed back whether a screened ledger was flagged
+
+        Above the target rate the volume quantile moves further into the tail
+        (fewer flags); below it, it moves back toward p90.
+        """
+        self.ledgers += 1
+        self.flag_rate += RATE_EWMA_ALPHA * ((1.0 if flagged else 0.0) - self.flag_rate)
+        error = (self.flag_rate - self.target_flag_rate) / self.target_flag_rate
+        self.tail *= math.exp(-CONTROLLER_GAIN * max(-1.0, min(1.0, error)))
+        self.tail = min(TAIL_MAX, max(TAIL_MIN, self.tail))
+
+    def summary(self) -> str:
+        """One-line controller summary"""
+        return (f"{len(self.volume)} pairs, volume quantile p{(1 - self.tail) * 100:.2f}, "
+                f"flag rate {self.flag_rate * 100:.1f}% (target {self.target_flag_rate * 100:.1f}%)")
+
+    def save_checkpoint(self):
+        """Write sketches and controller state (atomic replace)"""
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "tail": self.tail,
+            "flag_rate": self.flag_rate,
+            "ledgers": self.ledgers,
+            "pairs": {pair: [self.volume[pair].to_dict(), self.variance[pair].to_dict()]
+                      for pair in self.volume}
+        }
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        """Restore sketches and controller state if a checkpoint exists"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION:
+                print(f"  Warning: Ignoring threshold checkpoint version {data.get('version')}")
+                return
+            self.tail = data["tail"]
+            self.flag_rate = data["flag_rate"]
+            self.ledgers = data["ledgers"]
+            for pair, (volume, variance) in data["pairs"].items():
+                self.volume[pair] = QuantileSketch.from_dict(volume)
+                self.variance[pair] = QuantileSketch.from_dict(variance, keep_upper=False)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  Warning: Could not load threshold checkpoint: {e}")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Alert Manager
+Deduplication, escalation, rate limiting and coalescing stage in front of
+detection_alerts. Detectors submit candidate alerts on every run; only new,
+escalated or re-armed alerts are written.
+"""
+
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# Configuration
+DEDUP_WINDOW_SECONDS = 6 * 3600   # Same key is suppressed for 6 hours...
+ESCALATION_STEP = 15.0            # ...unless its score rose by >= 15 points
+RATE_LIMIT_PER_HOUR = 4           # Hard cap per key, escalations included
+
+SEVERITY_LEVELS = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+SEVERITY_NAMES = {level: name for name, level in SEVERITY_LEVELS.items()}
+
+
+class KeyState:
+    """Dedup index entry for one alert key"""
+    __slots__ = ("last_emit", "severity", "score", "suppressed", "first_seen", "emits")
+
+    def __init__(self, last_emit: float, severity: int, score: float, first_seen: float):
+        self.last_emit = last_emit
+        self.severity = severity
+        self.score = score
+        self.suppressed = 0
+        self.first_seen = first_seen
+        self.emits = deque(maxlen=RATE_LIMIT_PER_HOUR)  # Emit times in the last hour
+
+
+class AlertManager:
+    def __init__(self, client):
+        """
+        Initialize alert manager and rebuild the dedup index from detection_alerts
+
+        Args:
+            client: ClickHouse client
+        """
+        self.client = client
+        self.index: Dict[tuple, KeyState] = {}
+        self.counters = {"candidates": 0, "written": 0, "suppressed": 0,
+                         "escalated": 0, "rate_limited": 0, "coalesced": 0}
+        self.load_index()
+
+    @staticmethod
+    def alert_key(candidate: dict) -> tuple:
+        """Dedup key: detector, type, token and account"""
+        return (candidate['detector'], candidate['alert_type'], candidate['token_code'],
+                candidate['token_issuer'], candidate.get('account', ''))
+
+    def load_index(self):
+        """
+        Rebuild the in-memory index from alerts written within the dedup window
+
+        Coalesced rows index their related_types too (with the row's score and
+        severity), so merged types stay deduplicated and rate limited after a restart.
+        """
+        result = self.client.query("""
+            SELECT
+                detector,
+                arrayJoin(arrayPushFront(CAST(related_types AS Array(String)), toString(alert_type))) as indexed_type,
+                token_code,
+                token_issuer,
+                account,
+                toUnixTimestamp64Milli(max(alert_time)) / 1000 as last_emit,
+                argMax(toInt8(severity), alert_time) as severity,
+                argMax(score, alert_time) as score,
+                toUnixTimestamp64Milli(min(first_seen)) / 1000 as first_seen,
+                arrayMap(t -> toUnixTimestamp64Milli(t) / 1000,
+                         arraySort(groupArrayIf(alert_time, alert_time >= now() - INTERVAL 1 HOUR))) as recent
+            FROM detection_alerts
+            WHERE alert_time >= now() - INTERVAL {window:UInt32} SECOND
+            GROUP BY detector, indexed_type, token_code, token_issuer, account
+        """, parameters={"window": DEDUP_WINDOW_SECONDS})
+
+        for row in result.result_rows:
+            state = KeyState(row[5], row[6], row[7], row[8])
+            state.emits.extend(row[9])
+            self.index[tuple(row[:5])] = state
+
+    def prune(self, now: float):
+        """Drop index entries whose dedup window has expired"""
+        expired = [key for key, state in self.index.items()
+                   if state.last_emit < now - DEDUP_WINDOW_SECONDS]
+        for key in expired:
+            del self.index[key]
+
+    def decide(self, candidate: dict, now: float) -> bool:
+        """
+        Decide whether a candidate is written, updating the index
+
+        A key is written when it is new or its dedup window expired, or when its
+        score rose by ESCALATION_STEP since the last write (severity is raised one
+        level). Every key is capped at RATE_LIMIT_PER_HOUR writes.
+
+        Returns:
+            True if the candidate should be written
+        """
+        key = self.alert_key(candidate)
+        severity = SEVERITY_LEVELS[candidate['severity']]
+        score = candidate['score']
+        state = self.index.get(key)
+
+        if state is None or state.last_emit < now - DEDUP_WINDOW_SECONDS:
+            state = self.index[key] = KeyState(0.0, 0, 0.0, now)
+            escalated = False
+        elif score >= state.score + ESCALATION_STEP or severity > state.severity:
+            escalated = True
+            severity = min(max(severity, state.severity + 1), SEVERITY_LEVELS["critical"])
+        else:
+            state.suppressed += 1
+            self.counters["suppressed"] += 1
+            return False
+
+        # Per-key rate limit (sliding hour)
+        if len(state.emits) == RATE_LIMIT_PER_HOUR and state.emits[0] > now - 3600:
+            state.suppressed += 1
+            self.counters["rate_limited"] += 1
+            return False
+
+        candidate['severity'] = SEVERITY_NAMES[severity]
+        candidate['escalated'] = escalated
+        candidate['suppressed'] = state.suppressed
+        candidate['first_seen'] = state.first_seen
+        if escalated:
+            self.counters["escalated"] += 1
+
+        state.last_emit = now
+        state.severity = severity
+        state.score = score
+        state.suppressed = 0
+        state.emits.append(now)
+        return True
+
+    def coalesce(self, candidates: List[dict]) -> List[dict]:
+        """
+        Merge accepted candidates for the same detector and token into one alert
+
+        The highest-scoring candidate becomes the alert; the others are listed in
+        related_types and the severity is the highest of the group.
+        """
+        groups: Dict[tuple, List[dict]] = {}
+        for candidate in candidates:
+            group_key = (candidate['detector'], candidate['token_code'], candidate['token_issuer'])
+            groups.setdefault(group_key, []).append(candidate)
+
+        alerts = []
+        for group in groups.values():
+            group.sort(key=lambda c: c['score'], reverse=True)
+            primary = dict(group[0])
+            primary['related_types'] = [c['alert_type'] for c in group[1:]]
+            primary['severity'] = SEVERITY_NAMES[max(SEVERITY_LEVELS[c['severity']] for c in group)]
+            primary['escalated'] = any(c['escalated'] for c in group)
+            primary['suppressed'] = sum(c['suppressed'] for c in group)
+            primary['first_seen'] = min(c['first_seen'] for c in group)
+            self.counters["coalesced"] += len(group) - 1
+            alerts.append(primary)
+
+        return alerts
+
+    def submit(self, candidates: List[dict]) -> List[dict]:
+        """
+        Filter candidate alerts and write the survivors to detection_alerts
+
+        Args:
+            candidates: Dicts with detector, alert_type, severity, score (0-100),
+                token_code, token_issuer, account, value, threshold, trade_time,
+                ledger_index, details (dict)
+
+        Returns:
+            List of alerts written
+        """
+        if not candidates:
+            return []
+
+        now = time.time()
+        self.counters["candidates"] += len(candidates)
+        self.prune(now)
+
+        accepted = [c for c in candidates if self.decide(c, now)]
+        alerts = self.coalesce(accepted)
+        if alerts:
+            self.write_alerts(alerts, now)
+        return alerts
+
+    def write_alerts(self, alerts: List[dict], now: float):
+        """Insert alerts into detection_alerts"""
+        alert_time = datetime.fromtimestamp(now, timezone.utc)
+        rows = []
+        for alert in alerts:
+            rows.append((
+                alert_time,
+                alert['trade_time'],
+                alert['ledger_index'],
+                alert['detector'],
+                alert['alert_type'],
+                SEVERITY_LEVELS[alert['severity']],
+                alert['token_code'],
+                alert['token_issuer'],
+                alert.get('account', ''),
+                float(alert['value']),
+                float(alert['threshold']),
+                round(alert['score'], 1),
+                alert['related_types'],
+                1 if alert['escalated'] else 0,
+                alert['suppressed'],
+                datetime.fromtimestamp(alert['first_seen'], timezone.utc),
+                json.dumps(alert.get('details', {}))
+            ))
+
+        self.client.insert(
+            "detection_alerts",
+            rows,
+            column_names=[
+                "alert_time", "trade_time", "ledger_index", "detector", "alert_type",
+                "severity", "token_code", "token_issuer", "account",
+                "value", "threshold", "score", "related_types", "escalated",
+                "suppressed", "first_seen", "details"
+            ]
+        )
+        self.counters["written"] += len(rows)
+
+        for alert in alerts:
+            related = f" +{','.join(alert['related_types'])}" if alert['related_types'] else ""
+            escalated = " (escalated)" if alert['escalated'] else ""
+            print(f"  ALERT [{alert['severity']}] {alert['alert_type']}{related} "
+                  f"{alert['token_code'][:12]}/{alert['token_issuer'][:10]}... "
+                  f"score={alert['score']:.0f}{escalated}")
+
+    def summary(self) -> str:
+        """One-line counter summary"""
+        c = self.counters
+        return (f"{c['candidates']} candidates, {c['written']} written, "
+                f"{c['suppressed']} deduplicated, {c['rate_limited']} rate-limited, "
+                f"{c['escalated']} escalated, {c['coalesced']} coalesced")
@@ -5,15 +5,16 @@ Scans ledgers for high-volume trading activity using book_changes API
 Flags suspicious ledgers for detailed analysis
 """
 
-import subprocess
 import json
 import sys
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import clickhouse_connect
 
+from rippled_pool import RippledPool, RippledError
+from adaptive_thresholds import AdaptiveThresholds, TARGET_FLAG_RATE
+
 # Configuration
-RIPPLED_CONTAINER = "rippledvalidator"
 CLICKHOUSE_HOST = "localhost"
 CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DB = "xrp_watchdog"
@@ -23,84 +24,66 @@ VOLUME_THRESHOLD_XRP = 5_000_000  # 5M XRP in drops
 PRICE_VARIANCE_THRESHOLD = 0.01    # 1% variance
 
 class BookScreener:
-    def __init__(self):
-        """Initialize ClickHouse connection"""
-        self.client = clickhouse_connect.get_client(
+    def __init__(self, rippled: Optional[RippledPool] = None, adaptive: bool = False,
+                 target_flag_rate: float = TARGET_FLAG_RATE, client=None):
+        """
+        Initialize ClickHouse connection
+
+        Args:
+            rippled: Shared rippled pool (default: new pool over RIPPLED_ENDPOINTS)
+            adaptive: Use per-pair adaptive thresholds instead of the fixed ones
+            target_flag_rate: Share of ledgers to flag in adaptive mode
+            client: ClickHouse client to use (default: new client)
+        """
+        self.client = client or clickhouse_connect.get_client(
             host=CLICKHOUSE_HOST,
             port=CLICKHOUSE_PORT,
             database=CLICKHOUSE_DB
         )
+        self.rippled = rippled or RippledPool()
+        self.adaptive = None
+        if adaptive:
+            self.adaptive = AdaptiveThresholds(VOLUME_THRESHOLD_XRP, PRICE_VARIANCE_THRESHOLD,
+                                               target_flag_rate)
     
     def get_ledger_hash(self, ledger_spec: Optional[str] = None) -> Dict:
         """
-        Get ledger hash (latest closed or specific)
+        Get ledger hash (latest validated or specific)
         
         Args:
-            ledger_spec: Optional ledger index or hash
+            ledger_spec: Optional ledger index
         
         Returns:
             Dict with ledger_hash, ledger_index, close_time
         """
-        if ledger_spec:
-            # Specific ledger requested
-            cmd = [
-                "docker", "exec", RIPPLED_CONTAINER,
-                "rippled", "-q", "json", "ledger",
-                f'{{"ledger_index":{ledger_spec}}}'
-            ]
-        else:
-            # Get latest closed ledger
-            cmd = [
-                "docker", "exec", RIPPLED_CONTAINER,
-                "rippled", "-q", "ledger", "closed"
-            ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
-        
-        if ledger_spec:
-            return {
-                "ledger_hash": data["result"]["ledger_hash"],
-                "ledger_index": data["result"]["ledger_index"],
-                "close_time": data["result"]["ledger"]["close_time_human"]
-            }
-        else:
-            return {
-                "ledger_hash": data["result"]["ledger_hash"],
-                "ledger_index": data["result"]["ledger_index"]
-            }
+        result = self.rippled.request("ledger", {"ledger_index": int(ledger_spec) if ledger_spec else "validated"})
+        return {
+            "ledger_hash": result["ledger_hash"],
+            "ledger_index": int(result["ledger_index"]),
+            "close_time": result["ledger"]["close_time_human"]
+        }
     
-    def get_book_changes(self, ledger_hash: str) -> Dict:
+    def get_book_changes(self, ledger_index: int) -> Dict:
         """
         Fetch book_changes for a specific ledger
         
         Args:
-            ledger_hash: Ledger hash to query
+            ledger_index: Ledger index to query
         
         Returns:
             Dict with ledger info and changes
         """
         # Get ledger info
-        cmd_ledger = [
-            "docker", "exec", RIPPLED_CONTAINER,
-            "rippled", "-q", "ledger", ledger_hash
-        ]
-        ledger_result = subprocess.run(cmd_ledger, capture_output=True, text=True, check=True)
-        ledger_data = json.loads(ledger_result.stdout)
+        ledger = self.rippled.request("ledger", {"ledger_index": ledger_index})
         
-        # Get book changes
-        cmd_book = [
-            "docker", "exec", RIPPLED_CONTAINER,
-            "rippled", "-q", "book_changes", ledger_hash
-        ]
-        book_result = subprocess.run(cmd_book, capture_output=True, text=True, check=True)
-        book_data = json.loads(book_result.stdout)
+        # Get book changes (by hash, so both calls describe the same ledger)
+        book = self.rippled.request("book_changes", {"ledger_hash": ledger["ledger_hash"]})
         
         return {
-            "ledger_index": ledger_data["result"]["ledger_index"],
-            "ledger_hash": ledger_hash,
-            "close_time": ledger_data["result"]["ledger"]["close_time_human"],
-            "changes": book_data["result"].get("changes", [])
+            "ledger_index": int(ledger["ledger_index"]),
+            "ledger_hash": ledger["ledger_hash"],
+            "close_time": ledger["ledger"]["close_time_human"],
+            "changes": book.get("changes", [])
         }
     
     def parse_currency_pair(self, change: Dict) -> Dict:
@@ -170,10 +153,13 @@ class BookScreener:
         
         Args:
             ledger_data: Parsed ledger data with changes
+        
+        Returns:
+            (number of suspicious book changes, their volume_xrp sum)
         """
         if not ledger_data["changes"]:
             print(f"  No book changes in ledger {ledger_data['ledger_index']}")
-            return
+            return 0, 0.0
         
         rows = []
         for change in ledger_data["changes"]:
@@ -184,7 +170,10 @@ class BookScreener:
             # Calculate metrics
             volume_xrp = float(change["volume_a"])
             variance = self.calculate_variance(change)
-            suspicious = 1 if self.is_suspicious(volume_xrp, variance) else 0
+            if self.adaptive:
+                suspicious = 1 if self.adaptive.is_suspicious(currency_pair, volume_xrp, variance) else 0
+            else:
+                suspicious = 1 if self.is_suspicious(volume_xrp, variance) else 0
             
             # Convert close_time to DateTime
             # Format: "2025-Oct-19 08:59:20.000000000 UTC"
@@ -198,7 +187,7 @@ class BookScreener:
             row = (
                 time_value,                          # time
                 ledger_data["ledger_index"],         # ledger_index
-                ledger_data["ledger_hash"],          # ledger_hash
+                bytes.fromhex(ledger_data["ledger_hash"]),  # ledger_hash (binary)
                 currency_pair,                       # currency_pair
                 pair_info["currency_code"],          # currency_code
                 pair_info["issuer"],                 # issuer
@@ -225,54 +214,64 @@ class BookScreener:
         )
         
         suspicious_count = sum(1 for r in rows if r[13] == 1)
+        suspicious_volume = sum(r[10] for r in rows if r[13] == 1)
         print(f"  Inserted {len(rows)} book changes ({suspicious_count} suspicious)")
+        
+        if self.adaptive:
+            self.adaptive.observe_ledger(suspicious_count > 0)
+        
+        return suspicious_count, suspicious_volume
     
-    def scan_ledgers(self, count: int = 1, start_ledger: Optional[str] = None):
+    def scan_ledgers(self, count: int = 1, start_ledger: Optional[str] = None,
+                     on_suspicious: Optional[Callable[[str, int, float, int], None]] = None):
         """
         Scan N ledgers backwards from starting point
         
+        A ledger that still fails after the pool's retries is skipped (and listed
+        at the end) instead of ending the scan.
+        
         Args:
             count: Number of ledgers to scan
-            start_ledger: Starting ledger index/hash (None = latest)
+            start_ledger: Starting ledger index (None = latest validated)
+            on_suspicious: Called with (ledger_hash, ledger_index, suspicious volume,
+                flagged pairs) as soon as a ledger with suspicious changes is
+                inserted (may block: backpressure)
         """
         print(f"Starting book screener: {count} ledgers")
         
         # Get starting ledger
-        if start_ledger:
-            current = self.get_ledger_hash(start_ledger)
-        else:
-            current = self.get_ledger_hash()
-            # Get full info
-            full_current = self.get_book_changes(current["ledger_hash"])
-            current["close_time"] = full_current["close_time"]
-        
-        current_hash = current["ledger_hash"]
+        current_index = self.get_ledger_hash(start_ledger)["ledger_index"]
+        failed = []
         
         for i in range(count):
-            print(f"\nScanning ledger {i+1}/{count}: {current['ledger_index']}")
+            ledger_index = current_index - i
+            print(f"\nScanning ledger {i+1}/{count}: {ledger_index}")
             
             try:
                 # Get book changes
-                ledger_data = self.get_book_changes(current_hash)
+                ledger_data = self.get_book_changes(ledger_index)
                 
                 # Insert to ClickHouse
-                self.insert_book_changes(ledger_data)
-                
-                # Get parent hash for next iteration
-                cmd_parent = [
-                    "docker", "exec", RIPPLED_CONTAINER,
-                    "rippled", "-q", "ledger", current_hash
-                ]
-                result = subprocess.run(cmd_parent, capture_output=True, text=True, check=True)
-                data = json.loads(result.stdout)
-                current_hash = data["result"]["ledger"]["parent_hash"]
-                current["ledger_index"] = data["result"]["ledger_index"] - 1
+                suspicious_count, suspicious_volume = self.insert_book_changes(ledger_data)
+                if suspicious_count and on_suspicious:
+                    on_suspicious(ledger_data["ledger_hash"], ledger_data["ledger_index"],
+                                  suspicious_volume, suspicious_count)
                 
+            except RippledError as e:
+                print(f"  ERROR: {e} (skipping ledger)")
+                failed.append(ledger_index)
             except Exception as e:
                 print(f"  ERROR: {e}")
                 break
         
         print(f"\nBook screening complete!")
+        if self.adaptive:
+            self.adaptive.save_checkpoint()
+            print(f"  Adaptive thresholds: {self.adaptive.summary()}")
+        if failed:
+            print(f"  {len(failed)} ledgers skipped after retries: {', '.join(map(str, failed))}")
+        
+        return failed
 
 def main():
     """Main entry point"""
@@ -281,10 +280,14 @@ def main():
     parser = argparse.ArgumentParser(description="XRP Watchdog Book Screener")
     parser.add_argument("count", type=int, help="Number of ledgers to scan")
     parser.add_argument("--start", help="Starting ledger index (default: latest)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Per-pair adaptive thresholds (quantile sketches + target flag rate)")
+    parser.add_argument("--target-flag-rate", type=float, default=TARGET_FLAG_RATE,
+                        help=f"Share of ledgers to flag with --adaptive (default: {TARGET_FLAG_RATE})")
     
     args = parser.parse_args()
     
-    screener = BookScreener()
+    screener = BookScreener(adaptive=args.adaptive, target_flag_rate=args.target_flag_rate)
     screener.scan_ledgers(count=args.count, start_ledger=args.start)
 
 if __name__ == "__main__":
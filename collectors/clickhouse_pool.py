@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - ClickHouse Client Pool
+Named ClickHouse clients created once and shared by the orchestrator's
+components, so a long-running service reuses its connections every cycle
+"""
+
+import threading
+from typing import Dict
+import clickhouse_connect
+
+# Configuration
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+
+class ClickHousePool:
+    """
+    One client per name, created on first use
+
+    A clickhouse_connect client must not run concurrent queries, so every
+    component (and every collection worker) asks for a client under its own
+    name and keeps using it from a single thread.
+    """
+
+    def __init__(self):
+        self.clients: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str):
+        """Client for a component, created on first use"""
+        with self.lock:
+            client = self.clients.get(name)
+            if client is None:
+                client = self.clients[name] = clickhouse_connect.get_client(
+                    host=CLICKHOUSE_HOST,
+                    port=CLICKHOUSE_PORT,
+                    database=CLICKHOUSE_DB
+                )
+            return client
+
+    def names(self) -> list:
+        """Names of the clients created so far"""
+        with self.lock:
+            return sorted(self.clients)
+
+    def close(self):
+        """Close all clients"""
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
@@ -5,30 +5,66 @@ Coordinates book screening and trade collection
 Manages collection state and error handling
 """
 
+import os
 import sys
 import time
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
-import clickhouse_connect
 
+from clickhouse_pool import ClickHousePool
 from book_screener import BookScreener
 from trade_collector import TradeCollector
+from rippled_pool import RippledPool
+from token_monitor import TokenMonitor
+from token_registry import TokenRegistry
+from account_registry import AccountRegistry
+from account_clustering import AccountClusterer
+from ledger_queue import LedgerQueue
+from adaptive_thresholds import TARGET_FLAG_RATE
 
-# Configuration
-CLICKHOUSE_HOST = "localhost"
-CLICKHOUSE_PORT = 8123
-CLICKHOUSE_DB = "xrp_watchdog"
+# Analyzers live next to collectors/ in the project root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analyzers"))
+from token_analyzer import TokenAnalyzer
+
+# Configuration (pipeline: screening hands suspicious ledgers to trade-collection workers)
+COLLECT_WORKERS = 3               # Parallel TradeCollectors (one ClickHouse client each)
+QUEUE_SIZE = 6                    # Screened ledgers waiting for a worker before screening blocks
+COLLECT_BUDGET_SECONDS = 240      # Workers stop taking ledgers after this (cron runs every 5 min)
 
 class CollectionOrchestrator:
-    def __init__(self):
-        """Initialize orchestrator"""
-        self.client = clickhouse_connect.get_client(
-            host=CLICKHOUSE_HOST,
-            port=CLICKHOUSE_PORT,
-            database=CLICKHOUSE_DB
-        )
-        self.book_screener = BookScreener()
-        self.trade_collector = TradeCollector()
+    def __init__(self, adaptive: bool = False, target_flag_rate: float = TARGET_FLAG_RATE,
+                 workers: int = COLLECT_WORKERS, clients: Optional[ClickHousePool] = None):
+        """
+        Initialize orchestrator
+
+        Args:
+            adaptive: Screen with per-pair adaptive thresholds
+            target_flag_rate: Share of screened ledgers to send to Phase 2 (adaptive mode)
+            workers: Number of trade-collection workers
+            clients: ClickHouse client pool (default: new pool)
+        """
+        self.clients = clients or ClickHousePool()
+        self.client = self.clients.get("orchestrator")
+        self.client_lock = threading.Lock()
+        self.rippled = RippledPool()
+        self.book_screener = BookScreener(self.rippled, adaptive, target_flag_rate,
+                                          client=self.clients.get("book_screener"))
+
+        # ClickHouse clients are not safe for concurrent queries: every worker gets
+        # its own collector, and the shared token monitor and registries a client of their own
+        # (shared, so each new account or token is registered once)
+        self.monitor = TokenMonitor(self.clients.get("token_monitor"))
+        self.registry = TokenRegistry(self.clients.get("token_registry"))
+        self.accounts = AccountRegistry(self.clients.get("account_registry"))
+        self.trade_collectors = [
+            TradeCollector(self.rippled, self.monitor, client=self.clients.get(f"trade_collector_{i + 1}"),
+                           registry=self.registry, accounts=self.accounts)
+            for i in range(max(1, workers))
+        ]
+        self.ledger_queue = LedgerQueue(self.client)
+        self.clusterer = AccountClusterer(self.clients.get("account_clustering"), self.rippled)
+        self.analyzer = None
         self.start_time = None
     
     def get_last_state(self, collector_name: str) -> Optional[dict]:
@@ -56,34 +92,13 @@ class CollectionOrchestrator:
         status_map = {"running": 1, "stopped": 2, "error": 3}
         status_val = status_map.get(status, 1)
         
-        self.client.insert(
-            "collection_state",
-            [(collector_name, ledger_hash, ledger_index, datetime.now(), status_val, error_message)],
-            column_names=["collector_name", "last_ledger_hash", "last_ledger_index", 
-                         "last_update", "status", "error_message"]
-        )
-    
-    def get_suspicious_ledgers(self, limit: int = 100) -> list:
-        """Get suspicious ledgers that need detailed collection"""
-        result = self.client.query(f"""
-            SELECT DISTINCT ledger_hash, ledger_index
-            FROM book_changes
-            WHERE is_suspicious = 1
-            AND ledger_hash NOT IN (
-                SELECT DISTINCT ledger_hash FROM executed_trades
+        with self.client_lock:
+            self.client.insert(
+                "collection_state",
+                [(collector_name, ledger_hash, ledger_index, datetime.now(), status_val, error_message)],
+                column_names=["collector_name", "last_ledger_hash", "last_ledger_index", 
+                             "last_update", "status", "error_message"]
             )
-            ORDER BY ledger_index DESC
-            LIMIT {limit}
-        """)
-        
-        ledgers = []
-        for row in result.result_rows:
-            ledger_hash = row[0]
-            if isinstance(ledger_hash, bytes):
-                ledger_hash = ledger_hash.decode('utf-8')
-            ledgers.append((ledger_hash, row[1]))
-        
-        return ledgers
     
     def format_duration(self, seconds: float) -> str:
         """Format duration in human-readable format"""
@@ -97,56 +112,121 @@ class CollectionOrchestrator:
             minutes = (seconds % 3600) / 60
             return f"{hours:.1f}h ({minutes:.0f}m)"
     
+    def collect_worker(self, worker_id: int, stats: dict):
+        """
+        Trade-collection worker: collect ledgers from the ledger queue in priority
+        order until it is closed and empty, or the budget is spent
+
+        Args:
+            worker_id: Index into self.trade_collectors
+            stats: Shared counters (updated under stats["lock"])
+        """
+        collector = self.trade_collectors[worker_id]
+        while True:
+            item = self.ledger_queue.pop()
+            if item is None:
+                return
+            ledger_hash, ledger_index = item
+            ledger_start = time.time()
+            trades = None
+            try:
+                trades = collector.collect_for_ledger(ledger_hash)
+                self.update_state("trade_collector", ledger_hash, ledger_index, "running")
+                status = "ok" if trades is not None else "failed, requeued"
+            except Exception as e:
+                self.update_state("trade_collector", ledger_hash, ledger_index, "error", str(e))
+                status = f"ERROR: {e}"
+            self.ledger_queue.record(ledger_hash, trades)
+            ledger_duration = time.time() - ledger_start
+            with stats["lock"]:
+                stats["collected"] += 1
+                stats["busy"] += ledger_duration
+            print(f"  [worker {worker_id + 1}] Ledger {ledger_index}: {status} ({ledger_duration:.1f}s)")
+
     def collect_batch(self, ledger_count: int = 10, start_ledger: Optional[str] = None,
-                     run_analyzer: bool = False):
-        """Collect a batch of ledgers and optionally run risk analysis"""
+                     run_analyzer: bool = False, budget: Optional[float] = COLLECT_BUDGET_SECONDS):
+        """
+        Collect a batch of ledgers and optionally run risk analysis
+
+        Screening (Phase 1) and trade collection (Phase 2) run as a pipeline:
+        each ledger the screener flags is pushed to the ledger queue, which
+        workers drain in priority order together with the backlog left by
+        earlier runs. Screening blocks while QUEUE_SIZE of its ledgers wait
+        for a worker (backpressure). Workers stop taking ledgers after
+        budget seconds; whatever is left stays pending for the next run.
+        """
         self.start_time = time.time()
+        workers = len(self.trade_collectors)
 
         print(f"=== Collection Orchestrator Starting ===")
         print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Batch size: {ledger_count} ledgers")
         print(f"Run analyzer: {'Yes' if run_analyzer else 'No'}")
-        print(f"Using: TradeCollector (getMakerTaker.sh + RippleState extraction)\n")
-        
-        # Phase 1: Screen for volume
-        phase1_start = time.time()
-        print("Phase 1: Screening for suspicious volume...")
+        print(f"Using: TradeCollector (getMakerTaker.sh + RippleState extraction)")
+        print(f"Pipeline: {workers} collection workers, queue size {QUEUE_SIZE}, "
+              f"budget {self.format_duration(budget) if budget else 'none'}\n")
+
+        # Phase 1 + 2: Screen for volume, collect detailed trades as ledgers are flagged
+        pipeline_start = time.time()
+        print("Phase 1+2: Screening for suspicious volume, collecting trades for suspicious ledgers...")
+
+        self.ledger_queue.start(budget)
+        with self.client_lock:
+            backlog = self.ledger_queue.load_backlog()
+        if backlog:
+            print(f"  {backlog} suspicious ledgers pending from earlier runs")
+
+        stats = {"lock": threading.Lock(), "collected": 0, "busy": 0.0, "blocked": 0.0,
+                 "queued": 0}
+        threads = [threading.Thread(target=self.collect_worker, args=(i, stats),
+                                    name=f"collector-{i + 1}", daemon=True)
+                   for i in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        def enqueue(ledger_hash: str, ledger_index: int, suspicious_volume: float,
+                    flagged_pairs: int):
+            wait_start = time.time()
+            self.ledger_queue.push(ledger_hash, ledger_index, suspicious_volume,
+                                   flagged_pairs, max_waiting=QUEUE_SIZE)
+            stats["blocked"] += time.time() - wait_start
+            stats["queued"] += 1
+
+        screening_ok = True
         try:
-            self.book_screener.scan_ledgers(count=ledger_count, start_ledger=start_ledger)
+            self.book_screener.scan_ledgers(count=ledger_count, start_ledger=start_ledger,
+                                            on_suspicious=enqueue)
             self.update_state("book_screener", "latest", 0, "running")
-            phase1_duration = time.time() - phase1_start
-            print(f"Phase 1 completed in {self.format_duration(phase1_duration)}")
+            phase1_duration = time.time() - pipeline_start
+            print(f"Phase 1 completed in {self.format_duration(phase1_duration)} "
+                  f"({stats['queued']} suspicious ledgers queued, "
+                  f"{self.format_duration(stats['blocked'])} blocked on full queue)")
         except Exception as e:
             print(f"ERROR in book screening: {e}")
             self.update_state("book_screener", "", 0, "error", str(e))
+            screening_ok = False
+
+        # Drain: workers finish the queue or stop at the budget
+        self.ledger_queue.close()
+        for thread in threads:
+            thread.join()
+        self.ledger_queue.save_checkpoint()
+        with self.monitor.lock:
+            self.monitor.save_checkpoint()      # Workers only save every CHECKPOINT_INTERVAL_SECONDS
+
+        if not screening_ok:
             return
-        
-        # Phase 2: Collect detailed trades for suspicious ledgers
-        phase2_start = time.time()
-        print("\n" + "="*50)
-        print("Phase 2: Collecting detailed trades for suspicious ledgers...")
-        
-        suspicious = self.get_suspicious_ledgers(limit=ledger_count)
-        
-        if not suspicious:
+
+        pipeline_duration = time.time() - pipeline_start
+        if not stats["collected"]:
             print("  No new suspicious ledgers to analyze")
-        else:
-            print(f"  Found {len(suspicious)} suspicious ledgers to analyze\n")
-            
-            for i, (ledger_hash, ledger_index) in enumerate(suspicious, 1):
-                ledger_start = time.time()
-                print(f"Analyzing {i}/{len(suspicious)}: Ledger {ledger_index}", end=" ")
-                try:
-                    self.trade_collector.collect_for_ledger(ledger_hash)
-                    self.update_state("trade_collector", ledger_hash, ledger_index, "running")
-                    ledger_duration = time.time() - ledger_start
-                    print(f"({ledger_duration:.1f}s)")
-                except Exception as e:
-                    print(f"  ERROR: {e}")
-                    self.update_state("trade_collector", ledger_hash, ledger_index, "error", str(e))
-        
-        phase2_duration = time.time() - phase2_start
-        print(f"\nPhase 2 completed in {self.format_duration(phase2_duration)}")
+        print(f"\nCollected {stats['collected']} ledgers, "
+              f"worker utilization {stats['busy'] / (pipeline_duration * workers) * 100:.0f}%")
+        print(f"Ledger queue: {self.ledger_queue.summary()}")
+        print(f"\nAlerts: {self.monitor.alerts.summary()}")
+        print("\nRippled pool:")
+        self.rippled.print_metrics()
+        print(f"Phase 1+2 completed in {self.format_duration(pipeline_duration)}")
 
         # Phase 3: Risk analysis (optional)
         if run_analyzer:
@@ -154,12 +234,7 @@ class CollectionOrchestrator:
             print("\n" + "="*50)
             print("Phase 3: Running token risk analysis...")
             try:
-                import sys
-                sys.path.append('/home/grapedrop/monitoring/xrp-watchdog')
-                from analyzers.token_analyzer import TokenAnalyzer
-
-                analyzer = TokenAnalyzer()
-                analyzer.refresh_token_stats()
+                self.run_analysis()
 
                 phase3_duration = time.time() - phase3_start
                 print(f"\nPhase 3 completed in {self.format_duration(phase3_duration)}")
@@ -178,18 +253,35 @@ class CollectionOrchestrator:
 
         self.print_summary()
     
+    def run_analysis(self):
+        """Update account clusters, then refresh token_stats (the analyzer is created once and reused)"""
+        try:
+            self.clusterer.update()
+        except Exception as e:
+            print(f"Warning: Account clustering failed (analyzing with previous clusters): {e}")
+        if self.analyzer is None:
+            self.analyzer = TokenAnalyzer(self.clients.get("token_analyzer"),
+                                          writer=self.clients.get("token_analyzer_writer"))
+        self.analyzer.refresh_token_stats()
+
     def print_summary(self):
         """Print collection summary statistics"""
+        # Read the hourly rollup: book_changes itself only keeps non-suspicious
+        # rows for 7 days (tiered retention), so its row counts are not totals
         result = self.client.query("""
             SELECT 
-                COUNT(*) as total,
-                SUM(is_suspicious) as suspicious
-            FROM book_changes
+                SUM(changes) as total,
+                SUM(suspicious) as suspicious
+            FROM book_changes_hourly
         """)
         
-        if result.result_rows:
-            total, suspicious = result.result_rows[0]
+        # Empty until the first ledger is screened (SUM gives 0, or NULL for a Nullable sum)
+        total, suspicious = result.result_rows[0] if result.result_rows else (0, 0)
+        total, suspicious = total or 0, suspicious or 0
+        if total:
             print(f"\nBook Changes: {total} total, {suspicious} suspicious ({suspicious/total*100:.1f}%)")
+        else:
+            print("\nBook Changes: none screened yet")
         
         result = self.client.query("""
             SELECT 
@@ -216,12 +308,21 @@ def main():
     parser.add_argument("--start", help="Starting ledger index (default: latest)")
     parser.add_argument("--analyze", action="store_true",
                        help="Run token risk analysis after collection")
+    parser.add_argument("--adaptive", action="store_true",
+                       help="Screen with per-pair adaptive thresholds")
+    parser.add_argument("--target-flag-rate", type=float, default=TARGET_FLAG_RATE,
+                       help=f"Share of ledgers sent to Phase 2 with --adaptive (default: {TARGET_FLAG_RATE})")
+    parser.add_argument("--workers", type=int, default=COLLECT_WORKERS,
+                       help=f"Parallel trade-collection workers (default: {COLLECT_WORKERS})")
+    parser.add_argument("--budget", type=float, default=COLLECT_BUDGET_SECONDS,
+                       help=f"Seconds of trade collection per run, 0 = no limit "
+                            f"(default: {COLLECT_BUDGET_SECONDS})")
 
     args = parser.parse_args()
 
-    orchestrator = CollectionOrchestrator()
+    orchestrator = CollectionOrchestrator(args.adaptive, args.target_flag_rate, args.workers)
     orchestrator.collect_batch(ledger_count=args.count, start_ledger=args.start,
-                              run_analyzer=args.analyze)
+                              run_analyzer=args.analyze, budget=args.budget or None)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Ledger Queue
+Priority queue of suspicious ledgers awaiting trade collection (Phase 2)
+Pending ledgers come from book_changes (flagged, no rows in executed_trades) and
+from the screener as it runs; collection outcomes (empty ledgers, failed
+attempts) are kept in a JSON checkpoint between runs
+"""
+
+import os
+import json
+import math
+import time
+import heapq
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Configuration
+CHECKPOINT_PATH = "/home/grapedrop/monitoring/xrp-watchdog/logs/ledger_queue.json"
+CHECKPOINT_VERSION = 1
+LOOKBACK_DAYS = 30                # Pending ledgers older than this are not queued
+MAX_BACKLOG = 50_000              # Pending ledgers loaded per run (oldest first)
+
+# Priority = volume + pairs + aging - retries
+VOLUME_WEIGHT = 10.0              # Per decade of suspicious XRP volume (1 XRP -> 3, 50M XRP -> 77)
+PAIR_WEIGHT = 5.0                 # Per flagged pair beyond the first
+AGE_WEIGHT_PER_HOUR = 2.0         # Starvation prevention: +10 volume decades in 50h
+RETRY_PENALTY = 10.0              # Per failed attempt
+MAX_ATTEMPTS = 5                  # Give up on a ledger after N failed collections
+
+
+def priority(suspicious_volume: float, flagged_pairs: int, age_hours: float,
+             attempts: int = 0) -> float:
+    """
+    Collection priority of a pending ledger (higher first)
+
+    Args:
+        suspicious_volume: Sum of volume_xrp (drops) over the ledger's flagged pairs
+        flagged_pairs: Number of flagged pairs in the ledger
+        age_hours: Hours since the ledger closed
+        attempts: Failed collection attempts so far
+    """
+    volume_score = VOLUME_WEIGHT * math.log10(1 + suspicious_volume / 1e6)
+    return (volume_score + PAIR_WEIGHT * max(flagged_pairs - 1, 0)
+            + AGE_WEIGHT_PER_HOUR * age_hours - RETRY_PENALTY * attempts)
+
+
+class LedgerQueue:
+    def __init__(self, client, checkpoint_path: str = CHECKPOINT_PATH):
+        """
+        Initialize queue and restore collection outcomes
+
+        Args:
+            client: ClickHouse client used to load the pending backlog
+            checkpoint_path: JSON file holding outcomes between runs
+        """
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.heap = []                    # (-priority, -ledger_index, ledger_hash)
+        self.queued = set()
+        self.fresh_waiting = 0            # Screened this run, not yet taken by a worker
+        self.fresh = set()
+        self.closed = False
+        self.deadline = math.inf
+        self.condition = threading.Condition()
+        # ledger_hash -> {"attempts": n, "empty": bool, "updated": ts}
+        self.outcomes: Dict[str, dict] = {}
+        self.load_checkpoint()
+
+    def _skip(self, ledger_hash: str) -> bool:
+        """Known empty, or given up after MAX_ATTEMPTS"""
+        outcome = self.outcomes.get(ledger_hash)
+        return outcome is not None and (outcome["empty"] or outcome["attempts"] >= MAX_ATTEMPTS)
+
+    def _push(self, ledger_hash: str, ledger_index: int, score: float) -> bool:
+        if ledger_hash in self.queued or self._skip(ledger_hash):
+            return False
+        self.queued.add(ledger_hash)
+        heapq.heappush(self.heap, (-score, -ledger_index, ledger_hash))
+        self.condition.notify()
+        return True
+
+    def load_backlog(self, days: int = LOOKBACK_DAYS, limit: int = MAX_BACKLOG) -> int:
+        """
+        Queue flagged ledgers without collected trades
+
+        Returns:
+            Number of ledgers queued
+        """
+        result = self.client.query("""
+            SELECT
+                hex(any(ledger_hash)) as ledger_hash,
+                ledger_index,
+                sum(volume_xrp) as suspicious_volume,
+                count() as flagged_pairs,
+                min(time) as close_time
+            FROM book_changes
+            WHERE is_suspicious = 1
+              AND time > now() - INTERVAL {days:UInt32} DAY
+              AND ledger_hash NOT IN (
+                  -- Same window (plus a day of slack), so only those daily partitions are read
+                  SELECT DISTINCT ledger_hash FROM executed_trades
+                  WHERE time > now() - INTERVAL {days:UInt32} DAY - INTERVAL 1 DAY
+              )
+            GROUP BY ledger_index
+            ORDER BY ledger_index ASC
+            LIMIT {limit:UInt32}
+        """, parameters={"days": days, "limit": limit})
+
+        now = time.time()
+        added = 0
+        with self.condition:
+            for ledger_hash, ledger_index, volume, pairs, close_time in result.result_rows:
+                if isinstance(ledger_hash, bytes):
+                    ledger_hash = ledger_hash.decode('utf-8')
+                if close_time.tzinfo is None:
+                    close_time = close_time.replace(tzinfo=timezone.utc)
+                age_hours = max(now - close_time.timestamp(), 0) / 3600
+                attempts = self.outcomes.get(ledger_hash, {}).get("attempts", 0)
+                added += self._push(ledger_hash, ledger_index,
+                                    priority(volume, pairs, age_hours, attempts))
+        return added
+
+    def push(self, ledger_hash: str, ledger_index: int, suspicious_volume: float,
+             flagged_pairs: int, max_waiting: Optional[int] = None):
+        """
+        Queue a ledger flagged by the screener in this run
+
+        Blocks while max_waiting freshly screened ledgers are still waiting for a
+        worker (backpressure), until the collection deadline passes.
+        """
+        with self.condition:
+            while (max_waiting is not None and self.fresh_waiting >= max_waiting
+                   and not self.closed and time.time() < self.deadline):
+                self.condition.wait(timeout=max(0.0, min(1.0, self.deadline - time.time())))
+            attempts = self.outcomes.get(ledger_hash, {}).get("attempts", 0)
+            if self._push(ledger_hash, ledger_index,
+                          priority(suspicious_volume, flagged_pairs, 0.0, attempts)):
+                self.fresh.add(ledger_hash)
+                self.fresh_waiting += 1
+
+    def pop(self) -> Optional[tuple]:
+        """
+        Take the highest-priority ledger, waiting for the screener if needed
+
+        Returns:
+            (ledger_hash, ledger_index), or None once the deadline has passed or
+            the queue is closed and empty
+        """
+        with self.condition:
+            while True:
+                if time.time() >= self.deadline:
+                    return None
+                if self.heap:
+                    _, neg_index, ledger_hash = heapq.heappop(self.heap)
+                    self.queued.discard(ledger_hash)
+                    if ledger_hash in self.fresh:
+                        self.fresh.discard(ledger_hash)
+                        self.fresh_waiting -= 1
+                        self.condition.notify_all()
+                    return ledger_hash, -neg_index
+                if self.closed:
+                    return None
+                self.condition.wait(timeout=max(0.0, min(1.0, self.deadline - time.time())))
+
+    def start(self, budget_seconds: Optional[float] = None):
+        """
+        Open the queue for a run (empty: call load_backlog next)
+
+        Args:
+            budget_seconds: Workers stop taking ledgers after this long (None = no limit)
+        """
+        with self.condition:
+            self.heap = []
+            self.queued = set()
+            self.fresh = set()
+            self.fresh_waiting = 0
+            self.closed = False
+            self.deadline = time.time() + budget_seconds if budget_seconds else math.inf
+
+    def close(self):
+        """No more pushes: workers finish the remaining ledgers (within the budget)"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def record(self, ledger_hash: str, trades: Optional[int]):
+        """
+        Record a collection outcome
+
+        Args:
+            ledger_hash: Collected ledger
+            trades: Trades inserted (0 = ledger has no executed trades and is not
+                queued again), or None when collection failed
+        """
+        with self.condition:
+            outcome = self.outcomes.setdefault(ledger_hash, {"attempts": 0, "empty": False})
+            outcome["updated"] = time.time()
+            if trades is None:
+                outcome["attempts"] += 1
+            elif trades == 0:
+                outcome["empty"] = True
+            else:
+                # Now in executed_trades, so no longer pending
+                del self.outcomes[ledger_hash]
+
+    def summary(self) -> str:
+        """One-line queue summary"""
+        with self.condition:
+            empty = sum(1 for o in self.outcomes.values() if o["empty"])
+            given_up = sum(1 for o in self.outcomes.values()
+                           if not o["empty"] and o["attempts"] >= MAX_ATTEMPTS)
+            top = f", top priority {-self.heap[0][0]:.1f}" if self.heap else ""
+            return (f"{len(self.heap)} pending{top}, {empty} known empty, "
+                    f"{given_up} given up after {MAX_ATTEMPTS} attempts")
+
+    def save_checkpoint(self):
+        """Write outcomes to the checkpoint file (atomic replace), dropping old entries"""
+        cutoff = time.time() - LOOKBACK_DAYS * 86400
+        with self.condition:
+            self.outcomes = {h: o for h, o in self.outcomes.items() if o["updated"] > cutoff}
+            data = {
+                "version": CHECKPOINT_VERSION,
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "ledgers": self.outcomes
+            }
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        """Restore outcomes from the checkpoint file if present"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION:
+                print(f"  Warning: Ignoring ledger queue checkpoint version {data.get('version')}")
+                return
+            self.outcomes = data["ledgers"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  Warning: Could not load ledger queue checkpoint: {e}")
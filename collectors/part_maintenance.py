@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Part Maintenance
+Watches active parts per partition and runs targeted OPTIMIZE ... PARTITION
+where per-ledger inserts have left too many (or too many small) parts.
+ReplacingMergeTree tables are merged with FINAL so reads without FINAL see one
+row per key; partitions still being written get FINAL only once over threshold,
+closed ones as soon as they hold more than one part. Runs between collections (service job, or cron via the CLI)
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import clickhouse_connect
+
+# Configuration
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+# Thresholds per partition
+MAX_PARTS = 30                    # Optimize at this many active parts
+SMALL_PART_ROWS = 10_000          # A part below this is "small"
+SMALL_PART_RATIO = 0.5            # ...or when half the parts are small
+MIN_PARTS_FOR_RATIO = 8           # (only once there are a few parts)
+CLOSED_AFTER_SECONDS = 3600       # Partition is closed once no part was written for this long
+
+# Safety
+MAX_OPTIMIZE_BYTES = 20 * 1024**3 # Never rewrite partitions larger than 20 GiB
+FREE_SPACE_FACTOR = 2.0           # Require 2x the partition size free on disk
+BUDGET_SECONDS = 300              # Stop starting new OPTIMIZEs after this
+
+
+class PartMaintenance:
+    def __init__(self, client=None):
+        """
+        Initialize maintenance
+
+        Args:
+            client: ClickHouse client to use (default: new client)
+        """
+        self.client = client or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+
+    def collection_active(self) -> bool:
+        """True while inserts into this database are running (a collection is in progress)"""
+        result = self.client.query("""
+            SELECT count()
+            FROM system.processes
+            WHERE current_database = currentDatabase()
+              AND query_kind = 'Insert'
+        """)
+        return result.result_rows[0][0] > 0
+
+    def get_partitions(self) -> List[dict]:
+        """Active part statistics per partition of every MergeTree-family table"""
+        result = self.client.query("""
+            SELECT name, engine
+            FROM system.tables
+            WHERE database = currentDatabase()
+              AND engine LIKE '%MergeTree'
+        """)
+        engines = dict(result.result_rows)
+
+        result = self.client.query("""
+            SELECT
+                table,
+                partition_id,
+                any(partition) as partition,
+                count() as parts,
+                countIf(rows < {small_rows:UInt64}) as small_parts,
+                sum(rows) as rows,
+                sum(bytes_on_disk) as bytes,
+                max(modification_time) < now() - INTERVAL {closed:UInt32} SECOND as closed
+            FROM system.parts
+            WHERE database = currentDatabase()
+              AND active
+            GROUP BY table, partition_id
+            ORDER BY parts DESC
+        """, parameters={"small_rows": SMALL_PART_ROWS, "closed": CLOSED_AFTER_SECONDS})
+
+        return [
+            {"table": table, "partition_id": partition_id, "partition": partition,
+             "parts": parts, "small_parts": small, "rows": rows, "bytes": size,
+             "closed": bool(closed), "engine": engines[table]}
+            for table, partition_id, partition, parts, small, rows, size, closed in result.result_rows
+            if table in engines
+        ]
+
+    def free_bytes(self) -> int:
+        """Smallest free space across ClickHouse disks"""
+        result = self.client.query("SELECT min(free_space) FROM system.disks")
+        return result.result_rows[0][0]
+
+    def plan(self, partitions: List[dict], free_bytes: int) -> List[dict]:
+        """
+        Choose partitions to optimize
+
+        Live partitions (today's account_trades / collection_state) are only
+        touched over the part thresholds, so FINAL does not rewrite them on
+        every run; closed ReplacingMergeTree partitions get one FINAL to
+        collapse their duplicates.
+
+        Returns:
+            Actions (partition dict plus final, reason), worst partitions first;
+            skipped partitions carry skip instead of being dropped
+        """
+        actions = []
+        for p in partitions:
+            replacing = "Replacing" in p["engine"]
+            if p["parts"] >= MAX_PARTS:
+                reason = f"{p['parts']} parts"
+            elif (p["parts"] >= MIN_PARTS_FOR_RATIO
+                  and p["small_parts"] / p["parts"] >= SMALL_PART_RATIO):
+                reason = f"{p['small_parts']}/{p['parts']} small parts"
+            elif replacing and p["closed"] and p["parts"] > 1:
+                reason = f"{p['parts']} parts (closed, ReplacingMergeTree)"
+            else:
+                continue
+
+            skip = None
+            if p["bytes"] > MAX_OPTIMIZE_BYTES:
+                skip = "partition too large"
+            elif free_bytes < p["bytes"] * FREE_SPACE_FACTOR:
+                skip = "not enough free disk"
+            actions.append({**p, "final": replacing, "reason": reason, "skip": skip})
+        return actions
+
+    def optimize(self, action: dict) -> float:
+        """Run one OPTIMIZE, return its duration in seconds"""
+        start = time.time()
+        self.client.command(
+            f"OPTIMIZE TABLE {action['table']} PARTITION ID '{action['partition_id']}'"
+            f"{' FINAL' if action['final'] else ''}")
+        return time.time() - start
+
+    def run(self, dry_run: bool = False, budget: Optional[float] = BUDGET_SECONDS) -> Dict:
+        """
+        Check all partitions and optimize the ones over threshold
+
+        Args:
+            dry_run: Only report what would be optimized
+            budget: Seconds after which no new OPTIMIZE is started (None = no limit)
+
+        Returns:
+            Summary dict with the actions taken
+        """
+        start = time.time()
+        print(f"=== Part Maintenance ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
+        if not dry_run and self.collection_active():
+            print("Collection in progress (inserts running), skipping.")
+            return {"skipped": "collection active", "actions": []}
+
+        partitions = self.get_partitions()
+        actions = self.plan(partitions, self.free_bytes())
+        print(f"{len(partitions)} partitions checked, {len(actions)} over threshold"
+              f"{' (DRY RUN)' if dry_run else ''}\n")
+        if not actions:
+            return {"partitions": len(partitions), "actions": []}
+
+        print(f"{'Table':<24} {'Partition':<12} {'Parts':>6} {'Rows':>12} {'Reason':<34} {'Result':>10}")
+        print("-" * 104)
+        done = []
+        for action in actions:
+            if action["skip"]:
+                result = f"skipped: {action['skip']}"
+            elif dry_run:
+                result = "FINAL" if action["final"] else "merge"
+            elif budget is not None and time.time() - start > budget:
+                result = "skipped: budget"
+            else:
+                try:
+                    action["seconds"] = round(self.optimize(action), 2)
+                    result = f"{action['seconds']:.1f}s"
+                    done.append(action)
+                except Exception as e:
+                    result = f"ERROR: {e}"
+            action["result"] = result
+            print(f"{action['table'][:24]:<24} {str(action['partition'])[:12]:<12} {action['parts']:>6} "
+                  f"{action['rows']:>12,} {action['reason'][:34]:<34} {result:>10}")
+
+        print(f"\n{len(done)} partitions optimized in {time.time() - start:.1f}s")
+        return {
+            "partitions": len(partitions),
+            "actions": [{k: a[k] for k in ("table", "partition_id", "parts", "reason", "result")}
+                        for a in actions]
+        }
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Part Maintenance")
+    parser.add_argument("--dry-run", action="store_true", help="Report partitions over threshold only")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS,
+                        help=f"Seconds after which no new OPTIMIZE starts, 0 = no limit "
+                             f"(default: {BUDGET_SECONDS})")
+
+    args = parser.parse_args()
+
+    PartMaintenance().run(dry_run=args.dry_run, budget=args.budget or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Book Changes Re-screener
+Re-evaluates is_suspicious over stored book_changes with new thresholds, one daily
+partition at a time, entirely server-side (no rippled calls)
+Newly flagged ledgers are picked up by the orchestrator's Phase 2 queue
+(suspicious ledgers not yet in executed_trades)
+Today is only re-screened as the service's rescreen job, which never overlaps
+collection: curl -X POST http://127.0.0.1:8099/run/rescreen
+"""
+
+import os
+import time
+from datetime import date
+from typing import Dict, List, Tuple
+import clickhouse_connect
+
+from book_screener import VOLUME_THRESHOLD_XRP, PRICE_VARIANCE_THRESHOLD
+from adaptive_thresholds import CHECKPOINT_PATH as ADAPTIVE_CHECKPOINT_PATH
+
+# Configuration
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+# book_changes keeps non-suspicious rows for 7 days (migration 007). Older
+# partitions only hold previously flagged rows: they cannot gain flags, and
+# unflagged rows would be dropped by TTL and their rollups could not be rebuilt
+FULL_RESOLUTION_DAYS = 7
+# Partitions written to more recently are skipped (unless collection is known to be
+# stopped): the rollup materialized views would insert into the day while it is
+# deleted and re-aggregated
+QUIET_SECONDS = 3600
+SERVICE_RESCREEN_URL = "http://127.0.0.1:8099/run/rescreen"
+
+
+class Rescreener:
+    def __init__(self, volume_threshold: float, variance_threshold: float, client=None,
+                 ignore_adaptive: bool = False):
+        """
+        Initialize re-screener
+
+        Args:
+            volume_threshold: Minimum volume_xrp (drops)
+            variance_threshold: Maximum price_variance (exclusive)
+            client: ClickHouse client to use (default: new client)
+            ignore_adaptive: Rewrite flags with the fixed rule even though
+                BookScreener --adaptive flagged rows with per-pair thresholds
+        """
+        self.client = client or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.ignore_adaptive = ignore_adaptive
+        self.volume_threshold = float(volume_threshold)
+        self.variance_threshold = float(variance_threshold)
+        # Same rule as BookScreener.is_suspicious. Inlined as literals: mutations
+        # are re-parsed by the server after the query returns, without parameters.
+        self.rule = (f"toUInt8(volume_xrp >= {self.volume_threshold!r} "
+                     f"AND price_variance < {self.variance_threshold!r})")
+
+    def collection_active(self) -> bool:
+        """True while inserts into this database are running (a collection is in progress)"""
+        result = self.client.query("""
+            SELECT count()
+            FROM system.processes
+            WHERE current_database = currentDatabase()
+              AND query_kind = 'Insert'
+        """)
+        return result.result_rows[0][0] > 0
+
+    def get_partitions(self, days: int, include_open: bool = False) -> Tuple[List[tuple], List[tuple]]:
+        """
+        book_changes partitions of the last N days, newest first
+
+        Today and any partition with a part written in the last QUIET_SECONDS
+        are still receiving book changes and are skipped, unless include_open
+        (collection is stopped for the whole run).
+
+        Returns:
+            (partitions as (partition_id, day, rows), skipped as (day, reason))
+        """
+        result = self.client.query("""
+            SELECT
+                partition_id,
+                toDate(any(partition)) as day,
+                sum(rows) as rows,
+                max(modification_time) >= now() - INTERVAL {quiet:UInt32} SECOND as recent,
+                day >= today() as open_day
+            FROM system.parts
+            WHERE database = currentDatabase()
+              AND table = 'book_changes'
+              AND active
+            GROUP BY partition_id
+            HAVING day > today() - {days:UInt32}
+            ORDER BY day DESC
+        """, parameters={"days": days, "quiet": QUIET_SECONDS})
+
+        partitions, skipped = [], []
+        for partition_id, day, rows, recent, open_day in result.result_rows:
+            if include_open or not (recent or open_day):
+                partitions.append((partition_id, day, rows))
+            else:
+                skipped.append((day, "today" if open_day else
+                                f"written to in the last {QUIET_SECONDS // 60} min"))
+        return partitions, skipped
+
+    def diff_partition(self, partition_id: str) -> dict:
+        """
+        Compare stored flags with the new rule in one partition
+
+        Returns:
+            Dict with rows_up, rows_down and the newly flagged ledgers
+            (ledger_index, ledger_hash hex) - flagged now, not flagged before
+        """
+        result = self.client.query(f"""
+            SELECT
+                countIf(is_suspicious = 0 AND {self.rule} = 1) as rows_up,
+                countIf(is_suspicious = 1 AND {self.rule} = 0) as rows_down
+            FROM book_changes
+            WHERE _partition_id = {{partition:String}}
+        """, parameters={"partition": partition_id})
+        rows_up, rows_down = result.result_rows[0]
+
+        result = self.client.query(f"""
+            SELECT ledger_index, hex(any(ledger_hash)) as ledger_hash
+            FROM book_changes
+            WHERE _partition_id = {{partition:String}}
+            GROUP BY ledger_index
+            HAVING max(is_suspicious) = 0 AND max({self.rule}) = 1
+            ORDER BY ledger_index DESC
+        """, parameters={"partition": partition_id})
+
+        return {"rows_up": rows_up, "rows_down": rows_down, "new_ledgers": result.result_rows}
+
+    def apply_partition(self, partition_id: str, day: date):
+        """
+        Rewrite is_suspicious in one partition and rebuild that day's rollups
+
+        The UPDATE is a mutation of only the is_suspicious column of the partition.
+        book_changes_hourly / book_changes_1m counted flags at insert time, so
+        the day is deleted from both and re-aggregated from the updated rows.
+        Only safe while nothing inserts into the day (see get_partitions, run).
+        """
+        settings = {"mutations_sync": 1}
+        self.client.command(f"""
+            ALTER TABLE book_changes
+            UPDATE is_suspicious = {self.rule}
+            IN PARTITION ID '{partition_id}'
+            WHERE is_suspicious != {self.rule}
+        """, settings=settings)
+
+        day_params = {"day": day}
+        self.client.command(
+            f"ALTER TABLE book_changes_hourly DELETE WHERE toDate(hour) = '{day.isoformat()}'",
+            settings=settings)
+        self.client.command("""
+            INSERT INTO book_changes_hourly
+            SELECT
+              toStartOfHour(time) AS hour,
+              currency_code,
+              issuer,
+              count() AS changes,
+              toUInt64(sum(is_suspicious)) AS suspicious,
+              sum(volume_xrp) AS volume_xrp
+            FROM book_changes
+            WHERE toDate(time) = {day:Date}
+            GROUP BY hour, currency_code, issuer
+        """, parameters=day_params)
+
+        self.client.command(
+            f"ALTER TABLE book_changes_1m DELETE WHERE toDate(minute) = '{day.isoformat()}'",
+            settings=settings)
+        self.client.command("""
+            INSERT INTO book_changes_1m
+            SELECT
+              toStartOfMinute(time) AS minute,
+              currency_pair,
+              currency_code,
+              issuer,
+              argMinState(open, time) AS open,
+              max(high) AS high,
+              min(low) AS low,
+              argMaxState(close, time) AS close,
+              sum(volume_xrp) AS volume_xrp,
+              sum(volume_token) AS volume_token,
+              count() AS ledgers,
+              toUInt64(sum(is_suspicious)) AS suspicious,
+              min(ledger_index) AS first_ledger,
+              max(ledger_index) AS last_ledger
+            FROM book_changes
+            WHERE toDate(time) = {day:Date}
+            GROUP BY minute, currency_pair, currency_code, issuer
+        """, parameters=day_params)
+
+    def pending_ledgers(self, ledger_indexes: List[int], days: int) -> int:
+        """How many of the given ledgers (from the last N days) still need trade collection"""
+        if not ledger_indexes:
+            return 0
+        result = self.client.query("""
+            SELECT count()
+            FROM (SELECT arrayJoin({ledgers:Array(UInt32)}) as ledger_index)
+            WHERE ledger_index NOT IN (
+                -- Same window (plus a day of slack), so only those daily partitions are read
+                SELECT DISTINCT ledger_index FROM executed_trades
+                WHERE time > now() - INTERVAL {days:UInt32} DAY - INTERVAL 1 DAY
+            )
+        """, parameters={"ledgers": ledger_indexes, "days": days})
+        return result.result_rows[0][0]
+
+    def run(self, days: int = FULL_RESOLUTION_DAYS, dry_run: bool = False,
+            include_open: bool = False) -> Dict:
+        """
+        Re-screen the last N days of book_changes
+
+        Args:
+            days: Number of days (partitions) to re-screen
+            dry_run: Report changes without updating anything
+            include_open: Also re-screen today and recently written days; only when
+                collection cannot start during the run (the service's rescreen job)
+
+        Returns:
+            Summary dict (flag changes, newly flagged ledgers, skipped days)
+        """
+        start = time.time()
+        print("=== Book Changes Re-screen ===")
+        print(f"Thresholds: volume >= {self.volume_threshold:,.0f} drops, "
+              f"variance < {self.variance_threshold}")
+        print(f"Window: last {days} days{' (DRY RUN)' if dry_run else ''}\n")
+        if days > FULL_RESOLUTION_DAYS:
+            print(f"Warning: only suspicious rows are kept beyond {FULL_RESOLUTION_DAYS} days; "
+                  f"limiting window to {FULL_RESOLUTION_DAYS} days\n")
+            days = FULL_RESOLUTION_DAYS
+
+        # The fixed rule cannot reproduce per-pair adaptive flags: a run would
+        # unflag (and flag) rows across the window by a different rule
+        if os.path.exists(ADAPTIVE_CHECKPOINT_PATH) and not self.ignore_adaptive:
+            print(f"Adaptive thresholds in use ({ADAPTIVE_CHECKPOINT_PATH}): stored flags come "
+                  f"from per-pair thresholds, not this fixed rule.")
+            if not dry_run:
+                print("Refusing to rewrite them; pass --ignore-adaptive to replace them anyway.")
+                return {"skipped": "adaptive thresholds in use"}
+            print("Flag - below counts rows the adaptive screener flagged.\n")
+
+        if not dry_run and self.collection_active():
+            print("Collection in progress (inserts running): rollups would be rebuilt while "
+                  "being written. Run again when it has finished.")
+            return {"skipped": "collection active"}
+
+        partitions, skipped = self.get_partitions(days, include_open)
+        for day, reason in skipped:
+            print(f"Skipping {day}: {reason} (still receiving book changes)")
+        if skipped:
+            print(f"  Re-screen these days with collection stopped: curl -X POST {SERVICE_RESCREEN_URL}\n")
+        if not partitions:
+            print("No closed book_changes partitions in window.")
+            return {"skipped_days": [str(day) for day, _ in skipped]}
+
+        print(f"{'Partition':<12} {'Rows':>12} {'Flag +':>9} {'Flag -':>9} {'New ledgers':>12} {'Time':>8}")
+        print("-"*66)
+        total_up = total_down = 0
+        new_ledgers = []
+        for partition_id, day, rows in partitions:
+            part_start = time.time()
+            diff = self.diff_partition(partition_id)
+            if not dry_run and (diff["rows_up"] or diff["rows_down"]):
+                if self.collection_active():
+                    print(f"Collection started: stopping before {day} (rerun to continue)")
+                    break
+                self.apply_partition(partition_id, day)
+            total_up += diff["rows_up"]
+            total_down += diff["rows_down"]
+            new_ledgers.extend(diff["new_ledgers"])
+            print(f"{str(day):<12} {rows:>12,} {diff['rows_up']:>9,} {diff['rows_down']:>9,} "
+                  f"{len(diff['new_ledgers']):>12,} {time.time() - part_start:>7.1f}s")
+
+        pending = self.pending_ledgers([ledger for ledger, _ in new_ledgers], days)
+        print(f"\nRows newly flagged: {total_up:,}, unflagged: {total_down:,}")
+        print(f"Newly flagged ledgers: {len(new_ledgers):,} ({pending:,} without collected trades)")
+        if skipped:
+            print(f"Days not re-screened: {', '.join(str(day) for day, _ in skipped)}")
+        if dry_run:
+            print("Dry run: no changes written.")
+        else:
+            print("Newly flagged ledgers are now in the Phase 2 queue "
+                  "(collection_orchestrator.py picks them up on its next run).")
+        print(f"Duration: {time.time() - start:.1f}s")
+        return {"rows_up": total_up, "rows_down": total_down, "new_ledgers": len(new_ledgers),
+                "pending_ledgers": pending, "skipped_days": [str(day) for day, _ in skipped]}
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Book Changes Re-screen")
+    parser.add_argument("--volume", type=float, default=VOLUME_THRESHOLD_XRP,
+                        help=f"Volume threshold in drops (default: {VOLUME_THRESHOLD_XRP:,})")
+    parser.add_argument("--variance", type=float, default=PRICE_VARIANCE_THRESHOLD,
+                        help=f"Price variance threshold (default: {PRICE_VARIANCE_THRESHOLD})")
+    parser.add_argument("--days", type=int, default=FULL_RESOLUTION_DAYS,
+                        help=f"Days to re-screen (default: {FULL_RESOLUTION_DAYS})")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes only")
+    parser.add_argument("--ignore-adaptive", action="store_true",
+                        help="Replace flags set by adaptive screening (--adaptive) with the fixed rule")
+
+    args = parser.parse_args()
+
+    rescreener = Rescreener(args.volume, args.variance, ignore_adaptive=args.ignore_adaptive)
+    rescreener.run(days=args.days, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Rippled Connection Pool
+JSON-RPC access to one or more rippled nodes with pooled HTTP connections,
+health-weighted routing, per-method timeouts, jittered retries and a circuit
+breaker per endpoint
+"""
+
+import os
+import time
+import random
+import threading
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuration
+# Comma-separated JSON-RPC endpoints, e.g. "http://localhost:5005,http://10.0.0.2:5005"
+RIPPLED_ENDPOINTS = os.environ.get("RIPPLED_ENDPOINTS", "http://localhost:5005").split(",")
+POOL_SIZE = 8                     # Keep-alive connections per endpoint
+
+# Per-method timeouts in seconds (connect, read)
+METHOD_TIMEOUTS = {
+    "ledger": (2, 10),
+    "book_changes": (2, 10),
+    "tx": (2, 5),
+    "server_info": (2, 3),
+}
+DEFAULT_TIMEOUT = (2, 10)
+
+# Retries: full jitter exponential backoff, base * 2^attempt capped at max
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2.0
+
+# Circuit breaker
+FAILURE_THRESHOLD = 5             # Consecutive failures before opening
+OPEN_SECONDS = 30                 # Time before a half-open trial request
+
+# Health weighting (exponentially weighted moving averages)
+EWMA_ALPHA = 0.2
+
+# rippled error codes: server-side trouble (counts against the endpoint)
+RETRYABLE_ERRORS = {"tooBusy", "noNetwork", "noCurrent", "noClosed", "slowDown", "internal"}
+# Data missing on this node (another node may have the history; not a health failure)
+FAILOVER_ERRORS = {"lgrNotFound", "txnNotFound"}
+
+
+class RippledError(Exception):
+    """rippled request failed after all retries, or returned a non-retryable error"""
+
+    def __init__(self, method: str, error: str, message: str = ""):
+        self.method = method
+        self.error = error
+        super().__init__(f"{method}: {error}{' - ' + message if message else ''}")
+
+
+class Endpoint:
+    """One rippled node: HTTP session, circuit breaker state and health metrics"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+        self.session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+
+        # Circuit breaker
+        self.state = "closed"              # closed, open, half_open
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+        # Health
+        self.latency_ewma = 0.1            # Seconds
+        self.success_ewma = 1.0
+
+        # Metrics
+        self.metrics = {"requests": 0, "successes": 0, "failures": 0, "timeouts": 0,
+                        "failovers": 0, "breaker_opens": 0, "rejected": 0}
+
+    def weight(self) -> float:
+        """Routing weight: success rate over latency"""
+        return max(self.success_ewma, 0.01) / max(self.latency_ewma, 0.001)
+
+
+class RippledPool:
+    def __init__(self, endpoints: Optional[List[str]] = None):
+        """
+        Initialize pool
+
+        Args:
+            endpoints: JSON-RPC URLs (default: RIPPLED_ENDPOINTS)
+        """
+        self.endpoints = [Endpoint(url.strip()) for url in (endpoints or RIPPLED_ENDPOINTS) if url.strip()]
+        self.lock = threading.Lock()
+        self.method_metrics: Dict[str, Dict[str, int]] = {}
+
+    def _available(self, exclude: set) -> List[Endpoint]:
+        """Endpoints that may receive a request now (moves open breakers to half-open)"""
+        now = time.time()
+        available = []
+        for endpoint in self.endpoints:
+            if endpoint in exclude:
+                continue
+            if endpoint.state == "open" and now - endpoint.opened_at >= OPEN_SECONDS:
+                endpoint.state = "half_open"
+                endpoint.trial_in_flight = False
+            if endpoint.state == "closed":
+                available.append(endpoint)
+            elif endpoint.state == "half_open" and not endpoint.trial_in_flight:
+                available.append(endpoint)
+        return available
+
+    def _pick(self, exclude: set) -> Optional[Endpoint]:
+        """Choose an endpoint, weighted by health"""
+        with self.lock:
+            available = self._available(exclude)
+            if not available:
+                for endpoint in self.endpoints:
+                    if endpoint not in exclude:
+                        endpoint.metrics["rejected"] += 1
+                return None
+            endpoint = random.choices(available, weights=[e.weight() for e in available])[0]
+            if endpoint.state == "half_open":
+                endpoint.trial_in_flight = True
+            endpoint.metrics["requests"] += 1
+            return endpoint
+
+    def _record(self, endpoint: Endpoint, ok: bool, latency: float, counter: Optional[str] = None):
+        """Update health and circuit breaker after a request (and counter, e.g. timeouts)"""
+        with self.lock:
+            if counter:
+                endpoint.metrics[counter] += 1
+            endpoint.latency_ewma += EWMA_ALPHA * (latency - endpoint.latency_ewma)
+            endpoint.success_ewma += EWMA_ALPHA * ((1.0 if ok else 0.0) - endpoint.success_ewma)
+            endpoint.trial_in_flight = False
+            if ok:
+                endpoint.metrics["successes"] += 1
+                endpoint.consecutive_failures = 0
+                endpoint.state = "closed"
+                return
+            endpoint.metrics["failures"] += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.state == "half_open" or endpoint.consecutive_failures >= FAILURE_THRESHOLD:
+                if endpoint.state != "open":
+                    endpoint.metrics["breaker_opens"] += 1
+                endpoint.state = "open"
+                endpoint.opened_at = time.time()
+
+    def _count(self, method: str, key: str):
+        with self.lock:
+            counters = self.method_metrics.setdefault(
+                method, {"calls": 0, "errors": 0, "retries": 0})
+            counters[key] += 1
+
+    def request(self, method: str, params: Optional[dict] = None) -> dict:
+        """
+        Call a rippled JSON-RPC method
+
+        Args:
+            method: rippled method name (ledger, book_changes, tx, ...)
+            params: Method parameters
+
+        Returns:
+            The "result" object of a successful response
+
+        Raises:
+            RippledError: when all attempts fail or rippled returns a non-retryable error
+        """
+        self._count(method, "calls")
+        timeout = METHOD_TIMEOUTS.get(method, DEFAULT_TIMEOUT)
+        payload = {"method": method, "params": [params or {}]}
+        tried = set()
+        last_error = ("noEndpoint", "no healthy rippled endpoint")
+
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt > 0:
+                self._count(method, "retries")
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+            # Prefer endpoints not tried yet, fall back to any healthy one
+            endpoint = self._pick(tried) or self._pick(set())
+            if endpoint is None:
+                continue
+            tried.add(endpoint)
+
+            start = time.time()
+            try:
+                response = endpoint.session.post(endpoint.url, json=payload, timeout=timeout)
+                response.raise_for_status()
+                result = response.json().get("result", {})
+            except requests.Timeout:
+                self._record(endpoint, False, time.time() - start, "timeouts")
+                last_error = ("timeout", endpoint.url)
+                continue
+            except (requests.RequestException, ValueError) as e:
+                self._record(endpoint, False, time.time() - start)
+                last_error = ("transport", f"{endpoint.url}: {e}")
+                continue
+
+            latency = time.time() - start
+            if result.get("status") == "error":
+                error = result.get("error", "unknown")
+                message = result.get("error_message", "")
+                if error in RETRYABLE_ERRORS:
+                    self._record(endpoint, False, latency)
+                    last_error = (error, message)
+                    continue
+                failover = error in FAILOVER_ERRORS and len(tried) < len(self.endpoints)
+                self._record(endpoint, True, latency, "failovers" if failover else None)
+                if failover:
+                    last_error = (error, message)
+                    continue
+                self._count(method, "errors")
+                raise RippledError(method, error, message)
+
+            self._record(endpoint, True, latency)
+            return result
+
+        self._count(method, "errors")
+        raise RippledError(method, *last_error)
+
+    def metrics(self) -> dict:
+        """Snapshot of endpoint and method metrics"""
+        with self.lock:
+            return {
+                "endpoints": {
+                    e.url: {**e.metrics, "state": e.state,
+                            "latency_ms": round(e.latency_ewma * 1000, 1),
+                            "success_rate": round(e.success_ewma, 3)}
+                    for e in self.endpoints
+                },
+                "methods": {m: dict(c) for m, c in self.method_metrics.items()}
+            }
+
+    def print_metrics(self):
+        """Print endpoint and method metrics"""
+        snapshot = self.metrics()
+        print(f"{'Endpoint':<32} {'State':<10} {'Reqs':>7} {'OK':>7} {'Fail':>6} {'T/O':>5} "
+              f"{'Failover':>8} {'Opens':>5} {'Rej':>5} {'Lat ms':>7} {'Succ':>6}")
+        print("-"*108)
+        for url, m in snapshot["endpoints"].items():
+            print(f"{url[:32]:<32} {m['state']:<10} {m['requests']:>7} {m['successes']:>7} "
+                  f"{m['failures']:>6} {m['timeouts']:>5} {m['failovers']:>8} {m['breaker_opens']:>5} "
+                  f"{m['rejected']:>5} {m['latency_ms']:>7} {m['success_rate']:>6}")
+        print()
+        print(f"{'Method':<16} {'Calls':>7} {'Retries':>8} {'Errors':>7}")
+        print("-"*42)
+        for method, c in snapshot["methods"].items():
+            print(f"{method:<16} {c['calls']:>7} {c['retries']:>8} {c['errors']:>7}")
+
+
+def main():
+    """Exercise the pool against live or fake (scripts/fake_rippled.py) endpoints"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Rippled Pool Check")
+    parser.add_argument("--endpoints", help="Comma-separated JSON-RPC URLs (default: RIPPLED_ENDPOINTS)")
+    parser.add_argument("--calls", type=int, default=100, help="Number of server_info calls (default: 100)")
+    parser.add_argument("--method", default="server_info", help="Method to call (default: server_info)")
+
+    args = parser.parse_args()
+
+    pool = RippledPool(args.endpoints.split(",") if args.endpoints else None)
+    failed = 0
+    start = time.time()
+    for _ in range(args.calls):
+        try:
+            pool.request(args.method)
+        except RippledError as e:
+            failed += 1
+            print(f"  ERROR: {e}")
+
+    print(f"\n{args.calls} calls, {failed} failed in {time.time() - start:.2f}s\n")
+    pool.print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Token Monitor
+Online per-token statistics maintained by TradeCollector as trades are inserted
+Submits candidate alerts after every ledger while a threshold is crossed, without
+waiting for the batch TokenAnalyzer run (AlertManager deduplicates them)
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from alert_manager import AlertManager
+
+# Configuration
+CHECKPOINT_PATH = "/home/grapedrop/monitoring/xrp-watchdog/logs/token_monitor_state.json"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL_SECONDS = 60  # Checkpoint at most this often while collecting (and at the end of a run)
+DETECTOR_NAME = "token_monitor"
+
+# Online statistics
+RATE_WINDOW_SECONDS = 3600        # Sliding window for trade rate (1 hour)
+TOP_K_TAKERS = 10                 # Space-Saving counters per token
+STATE_TTL_SECONDS = 7 * 86400     # Drop tokens with no trades for 7 days
+
+# Alert thresholds (same tiers as the top TokenAnalyzer score components)
+MIN_TRADES_FOR_ALERT = 20         # Ignore tokens with too few observations
+BURST_TRADES_PER_HOUR = 100       # Burst: >=100 trades in the last hour
+PRICE_CV_PERCENT = 0.5            # Price precision: stddev/mean < 0.5%
+SIZE_CV_PERCENT = 2.0             # Trade size uniformity: stddev/mean < 2%
+TAKER_SHARE = 0.8                 # Concentration: top taker >= 80% of trades
+
+
+class RunningStats:
+    """Welford's online mean / variance"""
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, x: float):
+        """Add one observation"""
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation (matches stddevPop in the analyzer)"""
+        return math.sqrt(self.m2 / self.n) if self.n > 0 else 0.0
+
+    @property
+    def cv_percent(self) -> Optional[float]:
+        """Coefficient of variation in percent, None when undefined"""
+        if self.n < 2 or self.mean <= 0:
+            return None
+        return self.stddev / self.mean * 100
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStats":
+        return cls(data["n"], data["mean"], data["m2"])
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K heavy hitters
+
+    Keeps at most k counters. An unseen item replaces the smallest counter and
+    inherits its count as error, so count - error is a guaranteed lower bound.
+    """
+
+    def __init__(self, k: int = TOP_K_TAKERS):
+        self.k = k
+        self.total = 0
+        self.counters: Dict[str, List[int]] = {}  # item -> [count, error]
+
+    def update(self, item: str):
+        """Count one occurrence of item"""
+        self.total += 1
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self.counters) < self.k:
+            self.counters[item] = [1, 0]
+        else:
+            victim = min(self.counters, key=lambda key: self.counters[key][0])
+            min_count = self.counters.pop(victim)[0]
+            self.counters[item] = [min_count + 1, min_count]
+
+    def top(self, n: int = 1) -> List[tuple]:
+        """
+        Return the n heaviest items
+
+        Returns:
+            List of (item, count, error) sorted by count descending
+        """
+        items = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in items[:n]]
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "total": self.total, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        sketch = cls(data["k"])
+        sketch.total = data["total"]
+        sketch.counters = {item: list(c) for item, c in data["counters"].items()}
+        return sketch
+
+
+class TokenState:
+    """Online statistics for one (token_code, token_issuer)"""
+
+    def __init__(self):
+        self.trades = 0
+        self.volume_xrp = 0.0
+        self.price = RunningStats()
+        self.size = RunningStats()
+        self.rate_window = deque()  # [ledger close timestamp, trades], oldest first
+        self.window_trades = 0
+        self.takers = SpaceSaving()
+        self.last_trade = 0.0
+
+    def add_ledger(self, ts: float, trades: List[Dict]):
+        """Fold one ledger's trades for this token into the statistics"""
+        for trade in trades:
+            self.trades += 1
+            size = abs(trade['exec_xrp'])
+            self.volume_xrp += size
+            self.size.update(size)
+            if trade.get('exec_price', 0.0) > 0:
+                self.price.update(trade['exec_price'])
+            self.takers.update(trade['taker'])
+
+        # Ledgers can arrive out of order (backfills, queue retries): the window is
+        # kept in close-time order and trimmed relative to the newest ledger seen;
+        # a ledger already outside the window does not count towards the rate
+        if ts > self.last_trade - RATE_WINDOW_SECONDS:
+            i = len(self.rate_window)
+            while i and self.rate_window[i - 1][0] > ts:
+                i -= 1
+            self.rate_window.insert(i, [ts, len(trades)])
+            self.window_trades += len(trades)
+        self.last_trade = max(self.last_trade, ts)
+        while self.rate_window and self.rate_window[0][0] <= self.last_trade - RATE_WINDOW_SECONDS:
+            self.window_trades -= self.rate_window.popleft()[1]
+
+    @property
+    def trades_per_hour(self) -> float:
+        """Trades in the sliding window, scaled to one hour"""
+        return self.window_trades * 3600.0 / RATE_WINDOW_SECONDS
+
+    def snapshot(self) -> dict:
+        """Statistics stored with an alert"""
+        top = self.takers.top(1)
+        return {
+            "trades": self.trades,
+            "volume_xrp": round(self.volume_xrp, 2),
+            "trades_per_hour": round(self.trades_per_hour, 1),
+            "price_mean": self.price.mean,
+            "price_cv_percent": self.price.cv_percent,
+            "size_mean": round(self.size.mean, 4),
+            "size_cv_percent": self.size.cv_percent,
+            "top_taker": top[0][0] if top else "",
+            "top_taker_share": round(top[0][1] / self.takers.total, 3) if top else 0.0
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "trades": self.trades,
+            "volume_xrp": self.volume_xrp,
+            "price": self.price.to_dict(),
+            "size": self.size.to_dict(),
+            "rate_window": list(self.rate_window),
+            "takers": self.takers.to_dict(),
+            "last_trade": self.last_trade
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TokenState":
+        state = cls()
+        state.trades = data["trades"]
+        state.volume_xrp = data["volume_xrp"]
+        state.price = RunningStats.from_dict(data["price"])
+        state.size = RunningStats.from_dict(data["size"])
+        state.rate_window = deque(data["rate_window"])
+        state.window_trades = sum(n for _, n in state.rate_window)
+        state.takers = SpaceSaving.from_dict(data["takers"])
+        state.last_trade = data["last_trade"]
+        return state
+
+
+class TokenMonitor:
+    def __init__(self, client, checkpoint_path: str = CHECKPOINT_PATH):
+        """
+        Initialize monitor and restore the last checkpoint
+
+        Args:
+            client: ClickHouse client used to write detection_alerts (a client
+                of its own when the monitor is shared between threads)
+            checkpoint_path: JSON file holding the online state between runs
+        """
+        self.client = client
+        self.alerts = AlertManager(client)
+        self.checkpoint_path = checkpoint_path
+        self.tokens: Dict[tuple, TokenState] = {}
+        self.lock = threading.Lock()      # Held by callers sharing the monitor
+        self.saved_at = time.time()
+        self.load_checkpoint()
+
+    def evaluate(self, state: TokenState) -> Dict[str, tuple]:
+        """
+        Check thresholds for one token
+
+        Score is 50 at the threshold and rises to 100 as the metric gets more
+        extreme (2x the rate, zero variance, a single taker).
+
+        Returns:
+            Dict alert_type -> (value, threshold, score, account) for every crossed threshold
+        """
+        if state.trades < MIN_TRADES_FOR_ALERT:
+            return {}
+
+        crossed = {}
+        rate = state.trades_per_hour
+        if rate >= BURST_TRADES_PER_HOUR:
+            score = 50 + 50 * min(1.0, (rate - BURST_TRADES_PER_HOUR) / BURST_TRADES_PER_HOUR)
+            crossed['burst'] = (rate, BURST_TRADES_PER_HOUR, score, "")
+
+        price_cv = state.price.cv_percent
+        if price_cv is not None and state.price.n >= MIN_TRADES_FOR_ALERT and price_cv < PRICE_CV_PERCENT:
+            score = 50 + 50 * (1 - price_cv / PRICE_CV_PERCENT)
+            crossed['price_precision'] = (price_cv, PRICE_CV_PERCENT, score, "")
+
+        size_cv = state.size.cv_percent
+        if size_cv is not None and size_cv < SIZE_CV_PERCENT:
+            score = 50 + 50 * (1 - size_cv / SIZE_CV_PERCENT)
+            crossed['size_uniformity'] = (size_cv, SIZE_CV_PERCENT, score, "")
+
+        top = state.takers.top(1)
+        if top:
+            taker, count, error = top[0]
+            share = (count - error) / state.takers.total  # Lower bound
+            if share >= TAKER_SHARE:
+                score = 50 + 50 * (share - TAKER_SHARE) / (1 - TAKER_SHARE)
+                crossed['taker_concentration'] = (share, TAKER_SHARE, score, taker)
+
+        return crossed
+
+    def observe_ledger(self, trades: List[Dict], trade_time: datetime) -> List[dict]:
+        """
+        Update online statistics with one ledger's trades and submit alerts
+
+        Only IOU trades with an XRP leg are counted (same filter as TokenAnalyzer).
+        Every crossed threshold is submitted as a candidate on every ledger;
+        AlertManager decides what is written to detection_alerts.
+
+        Args:
+            trades: Enriched trades from TradeCollector
+            trade_time: Ledger close time
+
+        Returns:
+            List of alerts written
+        """
+        ts = trade_time.timestamp()
+        by_token: Dict[tuple, List[Dict]] = {}
+        for trade in trades:
+            if not trade.get('exec_iou_code') or trade['exec_xrp'] == 0:
+                continue
+            key = (trade['exec_iou_code'], trade['exec_iou_issuer'])
+            by_token.setdefault(key, []).append(trade)
+
+        candidates = []
+        ledger_index = trades[0]['ledger_index'] if trades else 0
+
+        for key, token_trades in by_token.items():
+            state = self.tokens.get(key)
+            if state is None:
+                state = self.tokens[key] = TokenState()
+            state.add_ledger(ts, token_trades)
+
+            crossed = self.evaluate(state)
+            if not crossed:
+                continue
+
+            severity = "high" if len(crossed) >= 3 else "medium"
+            details = state.snapshot()
+            for alert_type, (value, threshold, score, account) in crossed.items():
+                candidates.append({
+                    'detector': DETECTOR_NAME,
+                    'alert_type': alert_type,
+                    'severity': severity,
+                    'score': score,
+                    'token_code': key[0],
+                    'token_issuer': key[1],
+                    'account': account,
+                    'value': value,
+                    'threshold': threshold,
+                    'trade_time': trade_time,
+                    'ledger_index': ledger_index,
+                    'details': details
+                })
+
+        return self.alerts.submit(candidates)
+
+    def save_checkpoint(self):
+        """Write state to the checkpoint file (atomic replace), dropping idle tokens"""
+        newest = max((s.last_trade for s in self.tokens.values()), default=0.0)
+        self.tokens = {
+            key: state for key, state in self.tokens.items()
+            if state.last_trade > newest - STATE_TTL_SECONDS
+        }
+
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "tokens": [[code, issuer, state.to_dict()] for (code, issuer), state in self.tokens.items()]
+        }
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.saved_at = time.time()
+
+    def checkpoint_if_due(self):
+        """Save the checkpoint if CHECKPOINT_INTERVAL_SECONDS passed since the last save"""
+        if time.time() - self.saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+            self.save_checkpoint()
+
+    def load_checkpoint(self):
+        """Restore state from the checkpoint file if present"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION:
+                print(f"  Warning: Ignoring token monitor checkpoint version {data.get('version')}")
+                return
+            self.tokens = {
+                (code, issuer): TokenState.from_dict(state)
+                for code, issuer, state in data["tokens"]
+            }
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  Warning: Could not load token monitor checkpoint: {e}")
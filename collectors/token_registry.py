@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Token Registry
+Decodes currency codes once: new (code, issuer) pairs are written to
+token_registry at ingest (migration 013) so queries look display names up in
+token_registry_dict, and CLI output uses the memoized decode_token(). The
+token_id column (cityHash64 of code and issuer, migration 017) is computed by
+ClickHouse, so token_ids_dict decodes executed_trades.token_id
+"""
+
+import threading
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+
+# Configuration
+DECODE_CACHE_SIZE = 65536         # Distinct codes kept by decode_token()
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode_currency(code: str) -> Tuple[str, bool]:
+    """
+    Decode a currency code for display (same rules as migration 013)
+
+    Returns:
+        (display_name, is_valid_utf8); 40-char codes that are not valid
+        UTF-8 display as $XXXX...YYYY
+    """
+    if len(code) == 40:
+        try:
+            return bytes.fromhex(code).replace(b'\x00', b'').decode('utf-8').upper(), True
+        except (ValueError, UnicodeDecodeError):
+            return f"${code[:4]}...{code[-4:]}", False
+    return code.upper(), True
+
+
+def decode_token(code: str) -> str:
+    """Display name of a currency code"""
+    return decode_currency(code)[0]
+
+
+def issuer_short(issuer: str) -> str:
+    """Short issuer form used in summaries"""
+    return f"{issuer[:10]}..."
+
+
+class TokenRegistry:
+    def __init__(self, client):
+        """
+        Initialize registry (known tokens are loaded on first use)
+
+        Args:
+            client: ClickHouse client (used only by this registry)
+        """
+        self.client = client
+        self.known: Set[Tuple[str, str]] = set()
+        self.loaded = False
+        self.lock = threading.Lock()      # Shared by parallel trade collectors
+
+    def load(self):
+        """Load the (code, issuer) pairs already registered"""
+        result = self.client.query("SELECT DISTINCT token_code, token_issuer FROM token_registry")
+        self.known = {(code, issuer) for code, issuer in result.result_rows}
+        self.loaded = True
+
+    def register(self, trades: List[Dict]) -> int:
+        """
+        Register tokens not seen before (before the trades are inserted, so
+        every token_id they carry can be decoded)
+
+        Args:
+            trades: Enriched trades (exec_iou_code, exec_iou_issuer, ledger_index)
+
+        Returns:
+            Number of tokens added
+        """
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            new: Dict[Tuple[str, str], int] = {}
+            for trade in trades:
+                key = (trade.get('exec_iou_code', ''), trade.get('exec_iou_issuer', ''))
+                if not key[0] or key in self.known:
+                    continue
+                new[key] = min(new.get(key, trade['ledger_index']), trade['ledger_index'])
+            if not new:
+                return 0
+
+            rows = []
+            for (code, issuer), ledger_index in new.items():
+                name, valid = decode_currency(code)
+                rows.append((code, issuer, name, issuer_short(issuer), ledger_index, int(valid)))
+            self.client.insert(
+                "token_registry",
+                rows,
+                column_names=["token_code", "token_issuer", "display_name", "issuer_short",
+                              "first_seen_ledger", "is_valid_utf8"]
+            )
+            self.known.update(new)
+            return len(new)
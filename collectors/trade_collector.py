@@ -8,12 +8,16 @@ Combines getMakerTaker.sh accuracy with Python RippleState extraction
 import subprocess
 import sys
 import csv
-import json
 from io import StringIO
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 import clickhouse_connect
 
+from token_monitor import TokenMonitor
+from token_registry import TokenRegistry
+from account_registry import AccountRegistry
+from rippled_pool import RippledPool, RippledError
+
 # Configuration
 RIPPLED_CONTAINER = "rippledvalidator"
 CLICKHOUSE_HOST = "localhost"
@@ -21,15 +25,41 @@ CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DB = "xrp_watchdog"
 
 class TradeCollector:
-    def __init__(self):
-        """Initialize ClickHouse connection"""
-        self.client = clickhouse_connect.get_client(
+    def __init__(self, rippled: Optional[RippledPool] = None,
+                 monitor: Optional[TokenMonitor] = None, client=None,
+                 registry: Optional[TokenRegistry] = None,
+                 accounts: Optional[AccountRegistry] = None):
+        """
+        Initialize ClickHouse connection
+
+        Args:
+            rippled: Shared rippled pool (default: new pool over RIPPLED_ENDPOINTS)
+            monitor: Shared token monitor, for several collectors running in
+                parallel (default: own monitor on this collector's client)
+            client: ClickHouse client to use (default: new client)
+            registry: Shared token registry (default: own registry on this
+                collector's client)
+            accounts: Shared account registry (default: own registry on this
+                collector's client)
+        """
+        self.client = client or clickhouse_connect.get_client(
             host=CLICKHOUSE_HOST,
             port=CLICKHOUSE_PORT,
             database=CLICKHOUSE_DB
         )
+        self.rippled = rippled or RippledPool()
+        self.monitor = monitor or TokenMonitor(self.client)
+        self.registry = registry or TokenRegistry(self.client)
+        self.accounts = accounts or AccountRegistry(self.client)
     
-    def get_transaction_details(self, tx_hash: str) -> Optional[Dict]:
+    def parse_close_time(self, close_time_str: str) -> datetime:
+        """Parse getMakerTaker.sh close_time (e.g. 2025-Oct-19 12:00:01.000000000 UTC)"""
+        try:
+            return datetime.strptime(close_time_str.split('.')[0], "%Y-%b-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        except:
+            return datetime.now(timezone.utc)
+    
+    def get_transaction_details(self, tx_hash: str) -> Dict:
         """
         Fetch full transaction details including metadata
         
@@ -37,21 +67,14 @@ class TradeCollector:
             tx_hash: Transaction hash
         
         Returns:
-            Full transaction JSON or None
-        """
-        cmd = [
-            "docker", "exec", RIPPLED_CONTAINER,
-            "rippled", "-q", "json", "tx",
-            f'{{"transaction":"{tx_hash}","binary":false}}'
-        ]
+            Full transaction JSON
         
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            return data.get("result")
-        except Exception as e:
-            print(f"    Warning: Could not fetch tx {tx_hash[:8]}: {e}")
-            return None
+        Raises:
+            RippledError: if the transaction cannot be fetched from any endpoint.
+                The ledger is then not inserted and stays queued, rather than
+                being stored with empty IOU data.
+        """
+        return self.rippled.request("tx", {"transaction": tx_hash, "binary": False})
     
     def extract_iou_from_ripplestate(self, tx_data: Dict, taker: str) -> Dict:
         """
@@ -231,13 +254,12 @@ class TradeCollector:
         if not trades:
             return
         
+        # Hashes are stored as binary FixedString(32)
+        ledger_hash_bin = bytes.fromhex(ledger_hash)
+
         rows = []
         for trade in trades:
-            close_time_str = trade['close_time']
-            try:
-                dt = datetime.strptime(close_time_str.split('.')[0], "%Y-%b-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-            except:
-                dt = datetime.now(timezone.utc)
+            dt = self.parse_close_time(trade['close_time'])
             
             tx_type_map = {'OfferCreate': 1, 'Payment': 2}
             tx_type_val = tx_type_map.get(trade['tx_type'], 1)
@@ -245,8 +267,8 @@ class TradeCollector:
             row = (
                 dt,
                 trade['ledger_index'],
-                ledger_hash,
-                trade['tx_hash'],
+                ledger_hash_bin,
+                bytes.fromhex(trade['tx_hash']),
                 tx_type_val,
                 trade['taker'],
                 trade['counterparties'],
@@ -280,6 +302,9 @@ class TradeCollector:
         
         Args:
             ledger_hash: Ledger hash to analyze
+        
+        Returns:
+            Number of trades inserted (0 if the ledger has none), None on failure
         """
         print(f"Collecting trades for ledger hash: {ledger_hash}")
         
@@ -292,23 +317,45 @@ class TradeCollector:
             
             if not trades:
                 print(f"  No executed trades found")
-                return
+                return 0
             
             print(f"  Found {len(trades)} trades, enriching with RippleState data...")
             
             # Step 3: Enrich with RippleState IOU data
             enriched_trades = self.enrich_with_ripplestate(trades)
             
-            # Step 4: Insert to ClickHouse
+            # Step 4: Register accounts and tokens seen for the first time, so the
+            # IDs ClickHouse derives for the trades (migration 017) can be decoded;
+            # a registry failure leaves the ledger for retry
+            new_accounts = self.accounts.register(
+                account for t in enriched_trades for account in (t['taker'], *t['counterparties']))
+            new_tokens = self.registry.register(enriched_trades)
+            if new_accounts or new_tokens:
+                print(f"  Registered {new_accounts} new accounts, {new_tokens} new tokens")
+            
+            # Step 5: Insert to ClickHouse
             self.insert_trades(enriched_trades, ledger_hash)
             
             iou_count = sum(1 for t in enriched_trades if t.get('exec_iou_code'))
             print(f"  Inserted {len(enriched_trades)} trades ({iou_count} with IOU data)")
             
+            # Step 6: Update online token statistics (alerts are written immediately)
+            try:
+                trade_time = self.parse_close_time(enriched_trades[0]['close_time'])
+                with self.monitor.lock:
+                    self.monitor.observe_ledger(enriched_trades, trade_time)
+                    self.monitor.checkpoint_if_due()
+            except Exception as e:
+                print(f"  Warning: Token monitor update failed: {e}")
+            
+            return len(enriched_trades)
+            
         except subprocess.CalledProcessError as e:
             print(f"  ERROR running getMakerTaker.sh: {e}")
             if e.stderr:
                 print(f"  stderr: {e.stderr}")
+        except RippledError as e:
+            print(f"  ERROR fetching transactions: {e} (ledger left for retry)")
         except Exception as e:
             print(f"  ERROR: {e}")
 
@@ -323,6 +370,7 @@ def main():
     
     collector = TradeCollector()
     collector.collect_for_ledger(args.ledger_hash)
+    collector.monitor.save_checkpoint()
 
 if __name__ == "__main__":
     main()
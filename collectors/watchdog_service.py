@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Service
+Long-running replacement for the cron-launched run_collection.sh: one process
+runs collection, analysis, storage checks and part maintenance on an internal
+schedule, keeping ClickHouse clients, the rippled pool and all in-memory state
+warm between cycles
+Status and manual triggers over HTTP (localhost only by default):
+    curl http://127.0.0.1:8099/status
+    curl -X POST http://127.0.0.1:8099/run/collection
+    curl -X POST http://127.0.0.1:8099/run/rescreen   # on demand only
+"""
+
+import json
+import time
+import signal
+import threading
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from clickhouse_pool import ClickHousePool, CLICKHOUSE_DB
+from part_maintenance import PartMaintenance
+from rescreen import Rescreener
+from book_screener import VOLUME_THRESHOLD_XRP, PRICE_VARIANCE_THRESHOLD
+from collection_orchestrator import (CollectionOrchestrator, COLLECT_WORKERS,
+                                     COLLECT_BUDGET_SECONDS)
+from adaptive_thresholds import TARGET_FLAG_RATE
+
+# Configuration
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8099
+LEDGERS_PER_CYCLE = 130           # Same batch as run_collection.sh
+
+# Job intervals in seconds
+COLLECTION_INTERVAL = 300         # Former cron schedule: */5
+ANALYSIS_INTERVAL = 300           # Runs right after each collection
+STORAGE_INTERVAL = 3600
+MAINTENANCE_INTERVAL = 1800       # OPTIMIZE partitions over part-count thresholds
+RESCREEN_INTERVAL = None          # On demand only (after a threshold change)
+
+# Storage check warnings
+MIN_FREE_GB = 20                  # Free space on the ClickHouse data disk
+MAX_PARTS_PER_PARTITION = 150     # Inserts are throttled at 300 active parts by default
+
+
+class Job:
+    """A named task run every interval seconds (or on demand; interval None = only then)"""
+
+    def __init__(self, name: str, interval: Optional[float], func: Callable[[], Optional[dict]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0 if interval else float("inf")   # Due immediately at start
+        self.runs = 0
+        self.errors = 0
+        self.last_start = None
+        self.last_duration = None
+        self.last_status = "never run"
+        self.last_result: Optional[dict] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "interval": self.interval,
+            "next_run": (datetime.fromtimestamp(self.next_run).isoformat(timespec="seconds")
+                         if self.interval else None),
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_start": (datetime.fromtimestamp(self.last_start).isoformat(timespec="seconds")
+                           if self.last_start else None),
+            "last_duration": round(self.last_duration, 1) if self.last_duration is not None else None,
+            "last_status": self.last_status,
+            "last_result": self.last_result
+        }
+
+
+class WatchdogService:
+    def __init__(self, ledger_count: int = LEDGERS_PER_CYCLE, adaptive: bool = False,
+                 target_flag_rate: float = TARGET_FLAG_RATE, workers: int = COLLECT_WORKERS,
+                 budget: Optional[float] = COLLECT_BUDGET_SECONDS):
+        """
+        Initialize service (clients and collectors are created once here)
+
+        Args:
+            ledger_count: Ledgers screened per collection cycle
+            adaptive: Screen with per-pair adaptive thresholds
+            target_flag_rate: Share of screened ledgers to send to Phase 2 (adaptive mode)
+            workers: Number of trade-collection workers
+            budget: Seconds of trade collection per cycle (None = no limit)
+        """
+        self.ledger_count = ledger_count
+        self.budget = budget
+        self.clients = ClickHousePool()
+        self.orchestrator = CollectionOrchestrator(adaptive, target_flag_rate, workers, self.clients)
+        self.maintenance = PartMaintenance(self.clients.get("maintenance"))
+        self.rescreener = Rescreener(VOLUME_THRESHOLD_XRP, PRICE_VARIANCE_THRESHOLD,
+                                     self.clients.get("rescreen"))
+        self.jobs: Dict[str, Job] = {}
+        for job in (Job("collection", COLLECTION_INTERVAL, self.run_collection),
+                    Job("analysis", ANALYSIS_INTERVAL, self.run_analysis),
+                    Job("storage", STORAGE_INTERVAL, self.check_storage),
+                    Job("maintenance", MAINTENANCE_INTERVAL, self.run_maintenance),
+                    Job("rescreen", RESCREEN_INTERVAL, self.run_rescreen)):
+            self.jobs[job.name] = job
+
+        self.lock = threading.Lock()      # Guards job state and the trigger list
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.triggered = []
+        self.running: Optional[str] = None
+        self.started_at = time.time()
+
+    # Jobs ------------------------------------------------------------------
+
+    def run_collection(self) -> dict:
+        """One collection cycle (screening + trade collection, no analysis)"""
+        self.orchestrator.collect_batch(ledger_count=self.ledger_count, budget=self.budget)
+        return {"ledger_queue": self.orchestrator.ledger_queue.summary(),
+                "alerts": self.orchestrator.monitor.alerts.summary()}
+
+    def run_analysis(self) -> dict:
+        """Refresh token_stats with the warm analyzer"""
+        self.orchestrator.run_analysis()
+        return {}
+
+    def run_maintenance(self) -> dict:
+        """Targeted OPTIMIZE of fragmented partitions (jobs never overlap collection)"""
+        return self.maintenance.run()
+
+    def run_rescreen(self) -> dict:
+        """Re-screen book_changes with the current thresholds, today included (jobs never overlap collection)"""
+        return self.rescreener.run(include_open=True)
+
+    def check_storage(self) -> dict:
+        """Disk space and part counts (what scripts/check_storage.py reports, minus projections)"""
+        client = self.clients.get("storage")
+        result = client.query("""
+            SELECT table, sum(bytes_on_disk) as bytes, sum(rows) as rows,
+                   count() as parts, max(parts_in_partition) as max_partition_parts
+            FROM (
+                SELECT table, partition_id, bytes_on_disk, rows,
+                       count() OVER (PARTITION BY table, partition_id) as parts_in_partition
+                FROM system.parts
+                WHERE database = {db:String} AND active
+            )
+            GROUP BY table
+            ORDER BY bytes DESC
+        """, parameters={"db": CLICKHOUSE_DB})
+        tables = {table: {"bytes": size, "rows": rows, "parts": parts,
+                          "max_partition_parts": max_parts}
+                  for table, size, rows, parts, max_parts in result.result_rows}
+
+        result = client.query("SELECT name, free_space, total_space FROM system.disks")
+        disks = {name: {"free_gb": round(free / 1024**3, 1), "total_gb": round(total / 1024**3, 1)}
+                 for name, free, total in result.result_rows}
+
+        warnings = [f"disk {name}: {d['free_gb']} GB free" for name, d in disks.items()
+                    if d["free_gb"] < MIN_FREE_GB]
+        warnings += [f"{table}: {t['max_partition_parts']} active parts in one partition"
+                     for table, t in tables.items() if t["max_partition_parts"] > MAX_PARTS_PER_PARTITION]
+        for warning in warnings:
+            print(f"  Warning: {warning}")
+        return {"tables": tables, "disks": disks, "warnings": warnings}
+
+    # Scheduler -------------------------------------------------------------
+
+    def trigger(self, name: str) -> bool:
+        """Queue a job to run as soon as the current one finishes"""
+        if name not in self.jobs:
+            return False
+        with self.lock:
+            if name not in self.triggered:
+                self.triggered.append(name)
+        self.wakeup.set()
+        return True
+
+    def next_job(self) -> Optional[Job]:
+        """Triggered jobs first, then the most overdue scheduled job"""
+        with self.lock:
+            if self.triggered:
+                return self.jobs[self.triggered.pop(0)]
+        now = time.time()
+        due = [job for job in self.jobs.values() if job.next_run <= now]
+        return min(due, key=lambda job: job.next_run) if due else None
+
+    def run_job(self, job: Job):
+        """Run one job, recording its outcome (errors never stop the service)"""
+        start = time.time()
+        with self.lock:
+            self.running = job.name
+            job.last_start = start
+        print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting {job.name}")
+        try:
+            result = job.func()
+            status = "ok"
+        except Exception as e:
+            traceback.print_exc()
+            result = None
+            status = f"error: {e}"
+        duration = time.time() - start
+        with self.lock:
+            self.running = None
+            job.runs += 1
+            job.errors += status != "ok"
+            job.last_duration = duration
+            job.last_status = status
+            job.last_result = result
+            # Next run one interval after this start; missed slots are skipped, not replayed
+            job.next_run = start + job.interval if job.interval else float("inf")
+            while job.next_run <= time.time():
+                job.next_run += job.interval
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {job.name} {status} "
+              f"({self.orchestrator.format_duration(duration)})", flush=True)
+
+    def scheduler_loop(self):
+        """Run due and triggered jobs one at a time until stopped"""
+        while not self.stopping.is_set():
+            job = self.next_job()
+            if job is not None:
+                self.run_job(job)
+                continue
+            wait = min(job.next_run for job in self.jobs.values()) - time.time()
+            self.wakeup.wait(timeout=max(0.0, min(wait, 60)))
+            self.wakeup.clear()
+
+    def status(self) -> dict:
+        """Service, job, rippled and queue status"""
+        with self.lock:
+            jobs = {name: job.to_dict() for name, job in self.jobs.items()}
+            running = self.running
+            triggered = list(self.triggered)
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "uptime_seconds": round(time.time() - self.started_at),
+            "running": running,
+            "triggered": triggered,
+            "jobs": jobs,
+            "clickhouse_clients": self.clients.names(),
+            "ledger_queue": self.orchestrator.ledger_queue.summary(),
+            "rippled": self.orchestrator.rippled.metrics()
+        }
+
+    # HTTP ------------------------------------------------------------------
+
+    def make_handler(self):
+        service = self
+
+        class ServiceHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status: int, body: dict):
+                data = json.dumps(body, indent=2, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") in ("", "/status"):
+                    return self.reply(200, service.status())
+                self.reply(404, {"error": "unknown path", "paths": ["/status", "POST /run/<job>"]})
+
+            def do_POST(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "run":
+                    if service.trigger(parts[1]):
+                        return self.reply(202, {"triggered": parts[1]})
+                    return self.reply(404, {"error": f"unknown job {parts[1]}",
+                                            "jobs": list(service.jobs)})
+                self.reply(404, {"error": "unknown path"})
+
+        return ServiceHandler
+
+    def serve(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        """Start the HTTP endpoint and run the scheduler until SIGTERM / Ctrl+C"""
+        server = ThreadingHTTPServer((host, port), self.make_handler())
+        threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+        print(f"=== XRP Watchdog Service ===")
+        print(f"Status: http://{host}:{port}/status")
+        print(f"Jobs: " + ", ".join(f"{job.name} every {job.interval}s" if job.interval
+                                    else f"{job.name} on demand" for job in self.jobs.values()),
+              flush=True)
+
+        def stop(signum, frame):
+            print("\nStopping after the current job...", flush=True)
+            self.stopping.set()
+            self.wakeup.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            self.scheduler_loop()
+        finally:
+            server.shutdown()
+            self.clients.close()
+            print("Service stopped")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Service")
+    parser.add_argument("--count", type=int, default=LEDGERS_PER_CYCLE,
+                        help=f"Ledgers per collection cycle (default: {LEDGERS_PER_CYCLE})")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"HTTP bind address (default: {SERVICE_HOST})")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"HTTP port (default: {SERVICE_PORT})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Screen with per-pair adaptive thresholds")
+    parser.add_argument("--target-flag-rate", type=float, default=TARGET_FLAG_RATE,
+                        help=f"Share of ledgers sent to Phase 2 with --adaptive (default: {TARGET_FLAG_RATE})")
+    parser.add_argument("--workers", type=int, default=COLLECT_WORKERS,
+                        help=f"Parallel trade-collection workers (default: {COLLECT_WORKERS})")
+    parser.add_argument("--budget", type=float, default=COLLECT_BUDGET_SECONDS,
+                        help=f"Seconds of trade collection per cycle, 0 = no limit "
+                             f"(default: {COLLECT_BUDGET_SECONDS})")
+
+    args = parser.parse_args()
+
+    service = WatchdogService(args.count, args.adaptive, args.target_flag_rate,
+                              args.workers, args.budget or None)
+    service.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -41,9 +41,11 @@ echo "---"
 systemctl is-active --quiet cron
 print_status $? "Cron daemon running"
 
-# Check if cron job exists
+# Check if cron job exists (or the service mode replacing it answers)
 CRON_EXISTS=$(crontab -l 2>/dev/null | grep -c "collection_orchestrator")
-if [ $CRON_EXISTS -gt 0 ]; then
+if curl -sf http://127.0.0.1:8099/status > /dev/null 2>&1; then
+    print_status 0 "Watchdog service running (collection scheduled internally)"
+elif [ $CRON_EXISTS -gt 0 ]; then
     print_status 0 "Collection cron job configured"
     CRON_SCHEDULE=$(crontab -l | grep "collection_orchestrator" | awk '{print $1,$2,$3,$4,$5}')
     print_info "Schedule: $CRON_SCHEDULE (every 15 minutes expected: */15 * * * *)"
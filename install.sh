@@ -420,6 +420,11 @@ if [ "$SKIP_CLICKHOUSE_INSTALL" = false ] || [ "$INSTALL_GRAFANA" = true ]; then
         echo "Creating database schema..."
         docker exec -i xrp-watchdog-clickhouse clickhouse-client --multiquery < sql/schema.sql
         echo "✓ Database schema created"
+
+        # Apply migrations (recorded in schema_migrations)
+        echo "Applying migrations..."
+        python sql/migrations/run_migration.py
+        echo "✓ Migrations applied"
     fi
 
     if [ "$INSTALL_GRAFANA" = true ]; then
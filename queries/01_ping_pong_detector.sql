@@ -1,12 +1,14 @@
 -- Ping-Pong Trading Detector
 -- Identifies account pairs that trade back and forth repeatedly
 -- Indicators: Multiple trades, near-zero net flow, reciprocal relationship
+-- Pairs are grouped and joined on interned account IDs (migration 017);
+-- addresses are decoded only for the result rows
 
 -- Step 1: Get all taker→counterparty relationships with aggregated metrics
 WITH account_pairs AS (
   SELECT 
-    taker,
-    arrayJoin(counterparties) as counterparty,
+    taker_id as taker,
+    arrayJoin(counterparty_ids) as counterparty,
     COUNT(*) as trade_count,
     SUM(exec_xrp) as total_xrp,
     SUM(exec_iou) as total_iou,
@@ -20,8 +22,8 @@ WITH account_pairs AS (
 -- Step 2: Find reciprocal pairs (A→B AND B→A exist)
 reciprocal_pairs AS (
   SELECT 
-    a.taker as account_a,
-    a.counterparty as account_b,
+    a.taker as id_a,
+    a.counterparty as id_b,
     a.trade_count as a_to_b_count,
     b.trade_count as b_to_a_count,
     a.total_xrp as a_to_b_xrp,
@@ -41,8 +43,8 @@ reciprocal_pairs AS (
 
 -- Step 3: Calculate suspicion metrics and filter
 SELECT 
-  account_a,
-  account_b,
+  dictGet('xrp_watchdog.account_names_dict', 'account', id_a) as account_a,
+  dictGet('xrp_watchdog.account_names_dict', 'account', id_b) as account_b,
   a_to_b_count,
   b_to_a_count,
   (a_to_b_count + b_to_a_count) as total_trades,
@@ -1,28 +1,29 @@
 -- High-Volume Self-Traders Detector
 -- Identifies accounts with concentrated counterparty relationships
 -- Indicators: Many trades with single counterparty, high volume, repetitive behavior
+-- Grouped on interned account and token IDs (migration 017), decoded for output
 
 WITH account_counterparty_stats AS (
   SELECT 
-    taker,
-    arrayJoin(counterparties) as counterparty,
+    taker_id,
+    arrayJoin(counterparty_ids) as counterparty_id,
     COUNT(*) as trade_count,
     SUM(abs(exec_xrp)) as total_volume_xrp,
     COUNT(DISTINCT ledger_index) as ledger_span,
-    COUNT(DISTINCT exec_iou_code) as token_count,
+    COUNT(DISTINCT token_id) as token_count,
     MIN(time) as first_trade,
     MAX(time) as last_trade,
     ROUND(AVG(abs(exec_xrp)), 2) as avg_trade_size,
     ROUND(stddevPop(abs(exec_xrp)), 2) as trade_size_stddev,
-    groupArray(exec_iou_code) as tokens_traded
+    groupUniqArray(token_id) as tokens_traded
   FROM xrp_watchdog.executed_trades
   WHERE exec_xrp != 0
-  GROUP BY taker, counterparty
+  GROUP BY taker_id, counterparty_id
 )
 
 SELECT 
-  taker,
-  counterparty,
+  dictGet('xrp_watchdog.account_names_dict', 'account', taker_id) as taker,
+  dictGet('xrp_watchdog.account_names_dict', 'account', counterparty_id) as counterparty,
   trade_count,
   ROUND(total_volume_xrp, 2) as total_volume_xrp,
   ledger_span,
@@ -33,7 +34,7 @@ SELECT
   avg_trade_size,
   trade_size_stddev,
   ROUND((trade_size_stddev / nullIf(avg_trade_size, 0)) * 100, 2) as size_variance_percent,
-  arrayDistinct(tokens_traded) as tokens_list
+  arrayMap(t -> dictGet('xrp_watchdog.token_ids_dict', 'display_name', t), tokens_traded) as tokens_list
 FROM account_counterparty_stats
 WHERE 
   trade_count >= 5  -- At least 5 trades
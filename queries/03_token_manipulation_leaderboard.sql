@@ -7,8 +7,8 @@ WITH token_stats AS (
     exec_iou_code as token_code,
     exec_iou_issuer as token_issuer,
     COUNT(DISTINCT tx_hash) as total_trades,
-    COUNT(DISTINCT taker) as unique_takers,
-    COUNT(DISTINCT arrayJoin(counterparties)) as unique_counterparties,
+    COUNT(DISTINCT taker_id) as unique_takers,  -- Interned IDs (migration 017)
+    uniqExactArray(counterparty_ids) as unique_counterparties,  -- No arrayJoin: sums see each trade once
     COUNT(DISTINCT ledger_index) as ledger_span,
     SUM(abs(exec_xrp)) as total_xrp_volume,
     SUM(exec_iou) as total_token_volume,
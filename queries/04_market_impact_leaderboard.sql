@@ -16,9 +16,7 @@ WITH token_stats AS (
   WHERE exec_iou_code != ''
     AND exec_xrp != 0
     -- Exclude whitelisted tokens
-    AND (exec_iou_code, exec_iou_issuer) NOT IN (
-      SELECT token_code, token_issuer FROM xrp_watchdog.token_whitelist
-    )
+    AND NOT dictHas('xrp_watchdog.token_whitelist_dict', (exec_iou_code, exec_iou_issuer))
   GROUP BY exec_iou_code, exec_iou_issuer
 )
 
@@ -1,24 +1,22 @@
 -- Deep dive into specific account pair
 -- Shows chronological trade sequence with detailed metrics
+-- Reads account_trades (ordered by account, time) so only account A's granules are scanned.
+-- Both directions are covered: A as taker with B as counterparty, and B as taker with A
+-- as counterparty (which is indexed under A with role = 'counterparty').
 
-SELECT 
+SELECT
   time,
   ledger_index,
-  tx_hash,
-  taker,
-  counterparties,
+  hex(tx_hash) as tx_hash,
+  role as a_role,
+  if(role = 'taker', account, peers[1]) as taker,
+  if(role = 'taker', peers, [account]) as counterparties,
   ROUND(exec_xrp, 4) as exec_xrp,
   exec_iou_code,
   ROUND(exec_iou, 4) as exec_iou,
-  ROUND(exec_price, 6) as exec_price,
-  posted_gets,
-  posted_pays
-FROM xrp_watchdog.executed_trades
-WHERE 
-  (taker = 'rUHG1zwFNuRnN52hEo1Nmjd9xeWfMK5tA' 
-   AND has(counterparties, 'rswb3M3QRukbMWNhKmSsQFSU1DjQaUMF6d'))
-  OR
-  (taker = 'rswb3M3QRukbMWNhKmSsQFSU1DjQaUMF6d' 
-   AND has(counterparties, 'rUHG1zwFNuRnN52hEo1Nmjd9xeWfMK5tA'))
+  ROUND(exec_price, 6) as exec_price
+FROM xrp_watchdog.account_trades FINAL
+WHERE account = 'rUHG1zwFNuRnN52hEo1Nmjd9xeWfMK5tA'
+  AND has(peers, 'rswb3M3QRukbMWNhKmSsQFSU1DjQaUMF6d')
 ORDER BY time ASC
 FORMAT Vertical;
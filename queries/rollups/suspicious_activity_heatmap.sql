@@ -0,0 +1,24 @@
+-- Suspicious Activity Heatmap (rollup-backed)
+-- Same definition as the raw query: trades with abs(exec_xrp) > 100, plus every
+-- XRP-priced trade of a token with <= 3 distinct takers over the retention window.
+-- Distinct takers come from the uniq sketch (approximate, exact at this cardinality).
+-- Requires: sql/migrations/006_add_hourly_rollups.sql
+
+WITH few_taker_tokens AS (
+  SELECT token_code, token_issuer
+  FROM xrp_watchdog.token_hourly
+  WHERE token_code != ''
+  GROUP BY token_code, token_issuer
+  HAVING uniqMerge(takers) <= 3
+)
+
+SELECT
+  hour as time,
+  sum(
+    if((token_code, token_issuer) IN few_taker_tokens, xrp_trades, large_trades)
+  ) as suspicious_trades
+FROM xrp_watchdog.token_hourly
+WHERE token_code != ''
+  AND hour >= toStartOfHour(now() - INTERVAL 7 DAY)
+GROUP BY time
+ORDER BY time ASC
@@ -0,0 +1,10 @@
+-- Suspicious Rate (rollup-backed)
+-- Share of book_changes rows flagged suspicious, read from book_changes_hourly
+-- Requires: sql/migrations/006_add_hourly_rollups.sql
+
+SELECT
+  ROUND(
+    (sum(suspicious) / sum(changes)) * 100,
+    1
+  ) as suspicious_rate
+FROM xrp_watchdog.book_changes_hourly
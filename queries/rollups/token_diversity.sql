@@ -0,0 +1,11 @@
+-- Token Diversity Over Time (rollup-backed)
+-- Unique tokens traded per hour, read from token_hourly instead of executed_trades
+-- Requires: sql/migrations/006_add_hourly_rollups.sql
+
+SELECT
+  hour as time,
+  uniqExact(token_code, token_issuer) as "Unique Tokens"
+FROM xrp_watchdog.token_hourly
+WHERE $__timeFilter(hour)
+GROUP BY time
+ORDER BY time
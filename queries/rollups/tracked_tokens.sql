@@ -0,0 +1,7 @@
+-- Tracked Tokens (rollup-backed)
+-- Distinct IOU currency codes seen in the retention window, read from token_hourly
+-- Requires: sql/migrations/006_add_hourly_rollups.sql
+
+SELECT uniqExact(token_code) as total_tokens
+FROM xrp_watchdog.token_hourly
+WHERE token_code != ''
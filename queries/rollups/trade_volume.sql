@@ -0,0 +1,11 @@
+-- Trade Volume Over Time (rollup-backed)
+-- Hourly trade count, read from token_hourly instead of executed_trades
+-- Requires: sql/migrations/006_add_hourly_rollups.sql
+
+SELECT
+  hour as time,
+  sum(trades) as "Trades"
+FROM xrp_watchdog.token_hourly
+WHERE $__timeFilter(hour)
+GROUP BY time
+ORDER BY time
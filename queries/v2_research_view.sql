@@ -38,15 +38,8 @@ stats_7d AS (
 )
 
 SELECT
-  -- Token display
-  CASE
-    WHEN length(s24.token_code) = 40 THEN
-      CASE
-        WHEN isValidUTF8(unhex(s24.token_code)) THEN upper(replaceRegexpAll(unhex(s24.token_code), '\0', ''))
-        ELSE concat('$', substring(s24.token_code, 1, 4), '...', substring(s24.token_code, 37, 4))
-      END
-    ELSE upper(s24.token_code)
-  END as "Token",
+  -- Token display (decoded once at ingest, see token_registry)
+  dictGetOrDefault('xrp_watchdog.token_registry_dict', 'display_name', (s24.token_code, s24.token_issuer), upper(s24.token_code)) as "Token",
 
   s24.token_issuer as "Issuer",
 
@@ -101,14 +94,14 @@ LEFT JOIN stats_7d s7
 LEFT JOIN xrp_watchdog.token_stats tst
   ON s24.token_code = tst.token_code
   AND s24.token_issuer = tst.token_issuer
-WHERE s24.token_issuer NOT IN (SELECT token_issuer FROM xrp_watchdog.token_whitelist)
+WHERE NOT dictHas('xrp_watchdog.token_whitelist_issuer_dict', tuple(s24.token_issuer))
 AND (tst.classification IS NULL OR tst.classification NOT IN ('bridge', 'legitimate'))
 AND NOT (
-  upper(CASE WHEN length(s24.token_code) = 40 THEN replaceRegexpAll(unhex(s24.token_code), '\0', '') ELSE s24.token_code END) LIKE '%.AXL'
-  OR upper(CASE WHEN length(s24.token_code) = 40 THEN replaceRegexpAll(unhex(s24.token_code), '\0', '') ELSE s24.token_code END) LIKE 'USDC%AXL%'
-  OR upper(CASE WHEN length(s24.token_code) = 40 THEN replaceRegexpAll(unhex(s24.token_code), '\0', '') ELSE s24.token_code END) LIKE '%BRIDGE%'
-  OR upper(CASE WHEN length(s24.token_code) = 40 THEN replaceRegexpAll(unhex(s24.token_code), '\0', '') ELSE s24.token_code END) LIKE 'WRAPPED%'
-  OR upper(CASE WHEN length(s24.token_code) = 40 THEN replaceRegexpAll(unhex(s24.token_code), '\0', '') ELSE s24.token_code END) LIKE '%ALLBRIDGE%'
+  "Token" LIKE '%.AXL'
+  OR "Token" LIKE 'USDC%AXL%'
+  OR "Token" LIKE '%BRIDGE%'
+  OR "Token" LIKE 'WRAPPED%'
+  OR "Token" LIKE '%ALLBRIDGE%'
 )
 
 -- NO volume minimum filter (shows all patterns)
@@ -0,0 +1,41 @@
+-- XRP Watchdog v2.0 Risk Scoring (materialized)
+-- Same leaderboard as v2_risk_scoring.sql, read from the windowed scores that
+-- TokenAnalyzer stores in token_stats (migration 008) instead of rescanning
+-- 24h and 7d of executed_trades on every refresh.
+-- Windows are fixed (24h patterns / 7d impact) and end at window_end, the
+-- time of the last analyzer run (every 5 minutes); the dashboard time picker
+-- does not apply.
+
+SELECT
+  -- Token display (decoded once at ingest, see token_registry)
+  dictGetOrDefault('xrp_watchdog.token_registry_dict', 'display_name', (tst.token_code, tst.token_issuer), upper(tst.token_code)) as "Token",
+
+  tst.token_issuer as "Issuer",
+  ROUND(tst.risk_score_24h, 1) as "Risk Score",
+  tst.trades_24h as "Trades",
+  ROUND(tst.volume_xrp_24h, 0) as "XRP Volume (24h)",
+  ROUND(tst.volume_xrp_7d, 0) as "XRP Volume (7d)",
+  ROUND(tst.price_variance_24h, 1) as "Price Var %",
+  ROUND(tst.trades_per_hour_24h, 1) as "Trades/Hour",
+  ROUND(tst.burst_score_24h, 0) as "Burst",
+  ROUND(tst.duration_minutes_24h, 0) as "Duration (min)"
+
+FROM xrp_watchdog.token_stats tst
+
+-- Whitelist filtering
+WHERE NOT dictHas('xrp_watchdog.token_whitelist_issuer_dict', tuple(tst.token_issuer))
+AND tst.classification NOT IN ('bridge', 'legitimate')
+AND NOT (
+  "Token" LIKE '%.AXL'
+  OR "Token" LIKE 'USDC%AXL%'
+  OR "Token" LIKE '%BRIDGE%'
+  OR "Token" LIKE 'WRAPPED%'
+  OR "Token" LIKE '%ALLBRIDGE%'
+)
+
+-- v2.0 thresholds: minimum trades (pattern window) and minimum impact volume
+AND tst.trades_24h >= 5
+AND tst.volume_xrp_24h >= 10
+
+ORDER BY "Risk Score" DESC
+LIMIT 20;
@@ -0,0 +1,4 @@
+#!/bin/bash
+cd /home/grapedrop/monitoring/xrp-watchdog
+source venv/bin/activate
+exec python collectors/watchdog_service.py "$@"
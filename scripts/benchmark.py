@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Analyzer and Detector Benchmark
+Times every TokenAnalyzer.refresh_token_stats stage and every queries/*.sql
+detector, and reads rows, bytes and peak memory per query from
+system.query_log (queries are tagged with log_comment). Load data first with
+scripts/generate_load.py --scale 10 (or 100) on a local ClickHouse.
+"""
+
+import io
+import os
+import re
+import sys
+import glob
+import json
+import time
+import contextlib
+from datetime import datetime
+from typing import Dict, List
+import clickhouse_connect
+
+# Analyzer lives in analyzers/ next to scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analyzers"))
+from token_analyzer import TokenAnalyzer
+
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+QUERIES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queries")
+DEFAULT_REPEAT = 3
+DEFAULT_HOURS = 24                # Grafana $__timeFilter() replacement window
+MAX_DATA_POINTS = 1000            # Grafana panel width in points, sets $__interval_s
+
+
+def prepare_query(sql: str, hours: int, variables: Dict[str, str] = None) -> str:
+    """
+    Make a dashboard / CLI query runnable through the client
+
+    Expands the ClickHouse datasource macros for a range ending now, replaces
+    dashboard variables ($name, ${name}, [[name]]) and drops the trailing ';'
+    and FORMAT clause.
+
+    Args:
+        sql: Query text
+        hours: Dashboard time range ($__timeFilter and friends)
+        variables: Dashboard variable values by name
+    """
+    start = f"now() - INTERVAL {hours} HOUR"
+    interval = max(1, hours * 3600 // MAX_DATA_POINTS)
+    macros = [
+        (r"\$__timeFilter(?:_ms)?\(([\w.]+)\)", rf"(\1 >= {start} AND \1 <= now())"),
+        (r"\$__dateFilter\(([\w.]+)\)", rf"(\1 >= toDate({start}) AND \1 <= today())"),
+        (r"\$__timeInterval(?:_ms)?\(([\w.]+)\)", rf"toStartOfInterval(\1, INTERVAL {interval} second)"),
+        (r"\$__(?:fromTime|timeFrom)(?:_ms)?(?:\(\))?", start),
+        (r"\$__(?:toTime|timeTo)(?:_ms)?(?:\(\))?", "now()"),
+        (r"\$__interval_s", str(interval)),
+    ]
+    for pattern, replacement in macros:
+        sql = re.sub(pattern, replacement, sql)
+    for name, value in (variables or {}).items():
+        sql = re.sub(rf"\$\{{{name}(?::\w+)?\}}|\[\[{name}\]\]|\${name}\b", lambda _: str(value), sql)
+    sql = re.sub(r"\s*;\s*$", "", sql.strip())
+    return re.sub(r"\s+FORMAT\s+\w+$", "", sql)
+
+
+class Benchmark:
+    def __init__(self, repeat: int = DEFAULT_REPEAT, hours: int = DEFAULT_HOURS):
+        """
+        Initialize benchmark
+
+        Args:
+            repeat: Runs per analyzer refresh and per detector query
+            hours: Window substituted for $__timeFilter() in dashboard queries
+        """
+        self.client = clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.repeat = repeat
+        self.hours = hours
+        self.run_id = f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    def tag(self, label: str):
+        """Tag the following queries in system.query_log"""
+        self.client.set_client_setting("log_comment", f"{self.run_id}:{label}")
+
+    def dataset(self) -> Dict:
+        """Size of the data being benchmarked"""
+        result = self.client.query("SELECT count(), uniqExact(exec_iou_code, exec_iou_issuer) FROM executed_trades")
+        trades, tokens = result.result_rows[0]
+        book_changes = self.client.query("SELECT count() FROM book_changes").result_rows[0][0]
+        return {"trades": trades, "tokens": tokens, "book_changes": book_changes}
+
+    def run_analyzer(self, use_sketches: bool = False, verbose: bool = False) -> Dict:
+        """
+        Time refresh_token_stats stage by stage
+
+        Returns:
+            Dict stage -> list of seconds (one per run)
+        """
+        analyzer = TokenAnalyzer(self.client)
+        timings: Dict[str, List[float]] = {}
+        for i in range(self.repeat):
+            self.tag("analyzer")
+            start = time.time()
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                analyzer.refresh_token_stats(use_sketches)
+            for stage, seconds in analyzer.timings.items():
+                timings.setdefault(stage, []).append(seconds)
+            timings.setdefault("total", []).append(round(time.time() - start, 3))
+        return timings
+
+    def run_queries(self, paths: List[str]) -> Dict:
+        """
+        Run each detector query
+
+        Returns:
+            Dict query name -> {"seconds": [...], "rows": result rows}
+        """
+        results = {}
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(path) as f:
+                sql = prepare_query(f.read(), self.hours)
+            seconds, rows = [], 0
+            self.tag(f"query:{name}")
+            for _ in range(self.repeat):
+                start = time.time()
+                try:
+                    rows = len(self.client.query(sql).result_rows)
+                except Exception as e:
+                    print(f"  {name}: ERROR {e}")
+                    break
+                seconds.append(round(time.time() - start, 3))
+            results[name] = {"seconds": seconds, "rows": rows}
+        return results
+
+    def query_log(self) -> List[tuple]:
+        """Per tagged query shape: runs, avg duration, avg read rows / bytes, peak memory"""
+        self.client.set_client_setting("log_comment", "")
+        self.client.command("SYSTEM FLUSH LOGS")
+        result = self.client.query("""
+            SELECT
+                replaceOne(log_comment, {prefix:String}, '') as label,
+                any(replaceRegexpAll(substring(query, 1, 200), '[[:space:]]+', ' ')) as sample,
+                count() as runs,
+                avg(query_duration_ms) as duration_ms,
+                avg(read_rows) as read_rows,
+                avg(read_bytes) as read_bytes,
+                max(memory_usage) as peak_memory
+            FROM system.query_log
+            WHERE type = 'QueryFinish'
+              AND event_date >= yesterday()
+              AND startsWith(log_comment, {prefix:String})
+              AND query_kind IN ('Select', 'Insert')
+            GROUP BY label, normalized_query_hash
+            ORDER BY label, min(event_time_microseconds)
+        """, parameters={"prefix": f"{self.run_id}:"})
+        return result.result_rows
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Analyzer / Detector Benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Runs per analyzer refresh and query (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--hours", type=int, default=DEFAULT_HOURS,
+                        help=f"Window for $__timeFilter() (default: {DEFAULT_HOURS})")
+    parser.add_argument("--sketch", action="store_true", help="Benchmark the analyzer in sketch mode")
+    parser.add_argument("--skip-analyzer", action="store_true", help="Only run the detector queries")
+    parser.add_argument("--queries", default=os.path.join(QUERIES_DIR, "*.sql"),
+                        help="Glob of detector queries (default: queries/*.sql)")
+    parser.add_argument("--json", metavar="PATH", help="Also write results to a JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show analyzer output")
+
+    args = parser.parse_args()
+
+    bench = Benchmark(args.repeat, args.hours)
+    sizes = bench.dataset()
+    print(f"=== Benchmark {bench.run_id} ===")
+    print(f"Dataset: {sizes['trades']:,} trades, {sizes['tokens']:,} tokens, "
+          f"{sizes['book_changes']:,} book changes\n")
+
+    analyzer = {} if args.skip_analyzer else bench.run_analyzer(args.sketch, args.verbose)
+    if analyzer:
+        print(f"Analyzer stages ({'sketch' if args.sketch else 'exact'} mode, {args.repeat} runs)")
+        print(f"{'Stage':<16} {'Min (s)':>10} {'Max (s)':>10}")
+        print("-" * 38)
+        for stage, seconds in analyzer.items():
+            print(f"{stage:<16} {min(seconds):>10.3f} {max(seconds):>10.3f}")
+        print()
+
+    queries = bench.run_queries(sorted(glob.glob(args.queries)))
+    print(f"Detector queries ({args.repeat} runs)")
+    print(f"{'Query':<40} {'Min (s)':>10} {'Max (s)':>10} {'Rows':>8}")
+    print("-" * 71)
+    for name, result in queries.items():
+        if result["seconds"]:
+            print(f"{name[:40]:<40} {min(result['seconds']):>10.3f} {max(result['seconds']):>10.3f} "
+                  f"{result['rows']:>8}")
+
+    log = bench.query_log()
+    print(f"\nsystem.query_log (averages per run)")
+    print(f"{'Label':<36} {'Query':<44} {'Runs':>5} {'ms':>9} {'Read rows':>13} {'Read':>11} {'Peak mem':>11}")
+    print("-" * 135)
+    for label, sample, runs, duration, read_rows, read_bytes, memory in log:
+        print(f"{label[:36]:<36} {sample[:44]:<44} {runs:>5} {duration:>9.0f} {read_rows:>13,.0f} "
+              f"{format_bytes(read_bytes):>11} {format_bytes(memory):>11}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "run_id": bench.run_id,
+                "dataset": sizes,
+                "analyzer": analyzer,
+                "queries": queries,
+                "query_log": [dict(zip(("label", "query", "runs", "duration_ms", "read_rows",
+                                        "read_bytes", "peak_memory"), row)) for row in log]
+            }, f, indent=2, default=str)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -114,6 +114,8 @@ def main():
         else:
             print(f"{table:<20} No TTL (indefinite retention)")
 
+    print_compression_report(client)
+
     print(f"\n### Recommendations ###\n")
 
     # Calculate when we'll reach steady state (90 days)
@@ -127,10 +129,51 @@ def main():
         print(f"• Current size: {format_bytes(total_bytes)}")
 
     print(f"• Storage is very manageable - no action needed")
-    print(f"• Consider running OPTIMIZE TABLE monthly for best performance")
+    print(f"• Fragmented partitions: python collectors/part_maintenance.py --dry-run "
+          f"(runs every 30 min in service mode)")
 
     print("\n" + "=" * 80)
 
+def print_compression_report(client, tables=('executed_trades', 'book_changes', 'account_trades')):
+    """Print per-column compressed/uncompressed sizes, codecs and ratios"""
+    print(f"\n### Column Compression ###")
+
+    for table in tables:
+        result = client.query("""
+            SELECT
+                name,
+                type,
+                compression_codec,
+                data_compressed_bytes,
+                data_uncompressed_bytes
+            FROM system.columns
+            WHERE database = {db:String}
+              AND table = {table:String}
+            ORDER BY data_compressed_bytes DESC
+        """, parameters={"db": CLICKHOUSE_DB, "table": table})
+
+        if not result.result_rows:
+            continue
+
+        print(f"\n{table}\n")
+        print(f"{'Column':<20} {'Type':<32} {'Codec':<24} {'Compressed':>12} {'Raw':>12} {'Ratio':>7}")
+        print("-" * 112)
+
+        total_compressed = 0
+        total_uncompressed = 0
+        for name, col_type, codec, compressed, uncompressed in result.result_rows:
+            ratio = uncompressed / compressed if compressed else 0
+            codec = codec.replace('CODEC(', '').rstrip(')') if codec else 'default (LZ4)'
+            print(f"{name:<20} {col_type[:32]:<32} {codec[:24]:<24} "
+                  f"{format_bytes(compressed):>12} {format_bytes(uncompressed):>12} {ratio:>6.1f}x")
+            total_compressed += compressed
+            total_uncompressed += uncompressed
+
+        ratio = total_uncompressed / total_compressed if total_compressed else 0
+        print("-" * 112)
+        print(f"{'TOTAL':<20} {'':<32} {'':<24} "
+              f"{format_bytes(total_compressed):>12} {format_bytes(total_uncompressed):>12} {ratio:>6.1f}x")
+
 def format_bytes(bytes_val):
     """Format bytes to human readable string"""
     if bytes_val < 1024:
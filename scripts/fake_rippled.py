@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Fake rippled JSON-RPC servers
+Starts one or more local servers answering server_info, ledger, book_changes and tx
+with synthetic data, each configurable to fail, so RippledPool retries, failover and
+circuit breaking can be exercised without a real node.
+
+Example:
+    python scripts/fake_rippled.py --servers 3 --fail-rate 0,0.3,1 --mode ok,busy,hang
+    python collectors/rippled_pool.py \
+        --endpoints http://127.0.0.1:15005,http://127.0.0.1:15006,http://127.0.0.1:15007
+"""
+
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Failure modes applied with probability fail_rate:
+#   busy    - rippled error tooBusy (retryable)
+#   missing - rippled error lgrNotFound / txnNotFound (fail over to another node)
+#   http500 - HTTP 500
+#   hang    - sleep past the client read timeout
+#   ok      - never fail
+FAILURE_MODES = ("ok", "busy", "missing", "http500", "hang")
+HANG_SECONDS = 15
+LATEST_LEDGER = 90_000_000
+CLOSE_EPOCH = 1_760_000_000        # Synthetic close time of LATEST_LEDGER
+
+
+def ledger_hash(index: int) -> str:
+    return hashlib.sha256(f"ledger{index}".encode()).hexdigest().upper()
+
+
+def close_time_human(index: int) -> str:
+    ts = CLOSE_EPOCH - (LATEST_LEDGER - index) * 4
+    return time.strftime("%Y-%b-%d %H:%M:%S.000000000 UTC", time.gmtime(ts))
+
+
+def resolve_index(params: dict) -> int:
+    """Map ledger_index / ledger_hash / "closed" to an index"""
+    if "ledger_hash" in params:
+        for offset in range(10_000):
+            if ledger_hash(LATEST_LEDGER - offset) == params["ledger_hash"].upper():
+                return LATEST_LEDGER - offset
+        return -1
+    index = params.get("ledger_index", "validated")
+    return LATEST_LEDGER if index in ("closed", "validated", "current") else int(index)
+
+
+def handle(method: str, params: dict) -> dict:
+    """Synthetic result for one request"""
+    if method == "server_info":
+        return {"status": "success", "info": {"server_state": "full",
+                                              "validated_ledger": {"seq": LATEST_LEDGER}}}
+
+    if method in ("ledger", "book_changes"):
+        index = resolve_index(params)
+        if index < 0:
+            return {"status": "error", "error": "lgrNotFound", "error_message": "ledgerNotFound"}
+        if method == "ledger":
+            return {"status": "success", "validated": True, "ledger_index": index,
+                    "ledger_hash": ledger_hash(index),
+                    "ledger": {"close_time_human": close_time_human(index),
+                               "parent_hash": ledger_hash(index - 1)}}
+        rng = random.Random(index)
+        changes = []
+        for pair in range(rng.randint(0, 5)):
+            open_price = rng.uniform(0.1, 3.0)
+            changes.append({
+                "currency_a": "XRP_drops",
+                "currency_b": f"rFakeIssuer{pair}/{'USD' if pair % 2 else 'EUR'}",
+                "volume_a": str(rng.choice([1e5, 1e6, 6e6, 2e7])),
+                "volume_b": str(rng.uniform(10, 1e4)),
+                "open": str(open_price),
+                "high": str(open_price * rng.uniform(1.0, 1.03)),
+                "low": str(open_price * rng.uniform(0.97, 1.0)),
+                "close": str(open_price),
+            })
+        return {"status": "success", "ledger_index": index, "ledger_hash": ledger_hash(index),
+                "validated": True, "changes": changes}
+
+    if method == "tx":
+        return {"status": "success", "hash": params.get("transaction", ""), "validated": True,
+                "meta": {"AffectedNodes": [], "TransactionResult": "tesSUCCESS"}}
+
+    return {"status": "error", "error": "unknownCmd", "error_message": "Unknown method."}
+
+
+def make_handler(name: str, fail_rate: float, mode: str, latency: float):
+    class FakeRippledHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            method = request.get("method", "")
+            params = (request.get("params") or [{}])[0]
+            time.sleep(latency)
+
+            if mode != "ok" and random.random() < fail_rate:
+                if mode == "busy":
+                    return self.reply(200, {"result": {"status": "error", "error": "tooBusy",
+                                                       "error_message": "The server is too busy."}})
+                if mode == "missing":
+                    error = "txnNotFound" if method == "tx" else "lgrNotFound"
+                    return self.reply(200, {"result": {"status": "error", "error": error}})
+                if mode == "http500":
+                    return self.reply(500, {"error": "internal"})
+                if mode == "hang":
+                    time.sleep(HANG_SECONDS)
+
+            self.reply(200, {"result": handle(method, params)})
+
+    FakeRippledHandler.server_name = name
+    return FakeRippledHandler
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake rippled JSON-RPC servers")
+    parser.add_argument("--servers", type=int, default=3, help="Number of servers (default: 3)")
+    parser.add_argument("--base-port", type=int, default=15005, help="First port (default: 15005)")
+    parser.add_argument("--fail-rate", default="0",
+                        help="Per-server failure probability, comma-separated (last value repeats)")
+    parser.add_argument("--mode", default="busy",
+                        help=f"Per-server failure mode, comma-separated: {', '.join(FAILURE_MODES)}")
+    parser.add_argument("--latency", default="0.01",
+                        help="Per-server latency in seconds, comma-separated")
+
+    args = parser.parse_args()
+
+    def per_server(value: str, cast):
+        values = [cast(v) for v in value.split(",")]
+        return [values[min(i, len(values) - 1)] for i in range(args.servers)]
+
+    fail_rates = per_server(args.fail_rate, float)
+    modes = per_server(args.mode, str)
+    latencies = per_server(args.latency, float)
+
+    threads = []
+    for i in range(args.servers):
+        if modes[i] not in FAILURE_MODES:
+            parser.error(f"unknown mode {modes[i]}")
+        port = args.base_port + i
+        server = ThreadingHTTPServer(("127.0.0.1", port),
+                                     make_handler(f"fake{i}", fail_rates[i], modes[i], latencies[i]))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        threads.append(thread)
+        print(f"fake rippled {i}: http://127.0.0.1:{port} mode={modes[i]} "
+              f"fail_rate={fail_rates[i]} latency={latencies[i]}s")
+
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Synthetic Load Generator
+Writes realistic executed_trades and book_changes into a local ClickHouse so the
+analyzer and the queries/*.sql detectors can be benchmarked at 10x / 100x the
+production volume (see scripts/benchmark.py).
+
+Token activity and account activity follow Zipf distributions; a few tokens get
+injected wash trading (2-3 accounts, uniform sizes and prices, bursts) and some
+account pairs ping-pong the same token back and forth. Synthetic rows use ledger
+indexes from SYNTHETIC_LEDGER_BASE up, so they never collide with real ledgers
+and --clean removes exactly them.
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import hashlib
+import bisect
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import clickhouse_connect
+
+# Synthetic accounts and tokens are registered like collected ones (migration 017)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "collectors"))
+from account_registry import AccountRegistry
+from token_registry import TokenRegistry
+
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+# Synthetic data lives far above real ledger indexes (~100M in 2025)
+SYNTHETIC_LEDGER_BASE = 3_000_000_000
+LEDGER_SECONDS = 3.9              # Average ledger close interval
+INSERT_BATCH = 100_000            # Rows per ClickHouse insert
+
+# Defaults: production scale as of November 2025 (~280K trades, ~1000 tokens)
+DEFAULT_TRADES = 280_000
+DEFAULT_TOKENS = 1_000
+DEFAULT_ACCOUNTS = 20_000
+DEFAULT_DAYS = 7
+DEFAULT_ZIPF = 1.1                # Exponent of the token / account popularity distributions
+DEFAULT_WASH_TOKENS = 20
+DEFAULT_PING_PONG_PAIRS = 50
+PATTERN_SHARE = 0.05              # Share of trades that are injected patterns
+PATTERN_TRADES = 4.25             # Average trades per injected pattern (ping-pong 2, wash burst 3-10)
+
+# book_screener.py thresholds (volume in drops)
+VOLUME_THRESHOLD_XRP = 5_000_000
+PRICE_VARIANCE_THRESHOLD = 0.01
+
+BASE58 = "rpshnaf39wBUDNEGHJKLM4PQRST7VWXYZ2bcdeCg65jkm8oFqi1tuvAxyz"
+
+TRADE_COLUMNS = [
+    "time", "ledger_index", "ledger_hash", "tx_hash", "tx_type",
+    "taker", "counterparties", "counterparty_count",
+    "posted_gets", "posted_pays",
+    "exec_xrp", "exec_iou_code", "exec_iou_issuer", "exec_iou", "exec_price",
+    "total_volume_xrp"
+]
+BOOK_COLUMNS = [
+    "time", "ledger_index", "ledger_hash", "currency_pair", "currency_code", "issuer",
+    "open", "high", "low", "close", "volume_xrp", "volume_token",
+    "price_variance", "is_suspicious"
+]
+
+
+def fake_address(rng: random.Random) -> str:
+    """Random classic-address-looking string (not a valid checksum)"""
+    return "r" + "".join(rng.choice(BASE58) for _ in range(33))
+
+
+def fake_currency(rng: random.Random, index: int) -> str:
+    """3-char code or 40-char hex code (about half of real tokens)"""
+    if index % 2:
+        return "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(3))
+    name = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(rng.randint(4, 10)))
+    return name.encode().hex().upper().ljust(40, "0")
+
+
+def zipf_cumulative(n: int, s: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..n (sample with bisect)"""
+    total, cumulative = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1 / rank ** s
+        cumulative.append(total)
+    return cumulative
+
+
+def ledger_hash(ledger_index: int) -> bytes:
+    return hashlib.sha256(f"synthetic-{ledger_index}".encode()).digest()
+
+
+class LoadGenerator:
+    def __init__(self, tokens: int = DEFAULT_TOKENS, accounts: int = DEFAULT_ACCOUNTS,
+                 days: int = DEFAULT_DAYS, zipf: float = DEFAULT_ZIPF,
+                 wash_tokens: int = DEFAULT_WASH_TOKENS,
+                 ping_pong_pairs: int = DEFAULT_PING_PONG_PAIRS, seed: int = 42):
+        """
+        Initialize generator (token and account universe)
+
+        Args:
+            tokens: Distinct tokens
+            accounts: Distinct organic accounts
+            days: Time span the trades are spread over (ending now)
+            zipf: Popularity exponent for tokens and accounts
+            wash_tokens: Tokens with injected wash trading
+            ping_pong_pairs: Account pairs trading one token back and forth
+            seed: Random seed (same seed, same data)
+        """
+        self.rng = random.Random(seed)
+        rng = self.rng
+        self.client = clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.days = days
+        self.account_registry = AccountRegistry(self.client)
+        self.token_registry = TokenRegistry(self.client)
+        self.tokens = [(fake_currency(rng, i), fake_address(rng), math.exp(rng.uniform(-9, 2)))
+                       for i in range(tokens)]                     # (code, issuer, base price in XRP)
+        self.accounts = [fake_address(rng) for _ in range(accounts)]
+        self.token_weights = zipf_cumulative(tokens, zipf)
+        self.account_weights = zipf_cumulative(accounts, zipf)
+
+        # Injected patterns use tail tokens (low organic activity, like real manipulation)
+        tail = list(range(tokens // 2, tokens))
+        rng.shuffle(tail)
+        self.wash = [(t, [fake_address(rng) for _ in range(rng.randint(2, 3))], rng.uniform(50, 5000))
+                     for t in tail[:wash_tokens]]                  # (token, ring accounts, trade size)
+        self.ping_pong = [(rng.choice(tail), fake_address(rng), fake_address(rng))
+                          for _ in range(ping_pong_pairs)]
+
+    def check_target(self, force: bool):
+        """Refuse to mix synthetic rows into a database holding real trades"""
+        result = self.client.query(
+            "SELECT count() FROM executed_trades WHERE ledger_index < {base:UInt32}",
+            parameters={"base": SYNTHETIC_LEDGER_BASE})
+        real = result.result_rows[0][0]
+        if real and not force:
+            print(f"ERROR: executed_trades holds {real:,} real trades. Run against a local "
+                  f"ClickHouse, or pass --force.")
+            sys.exit(1)
+
+    def pick(self, cumulative: List[float]) -> int:
+        return bisect.bisect_left(cumulative, self.rng.random() * cumulative[-1])
+
+    def trade(self, ledger_index: int, when: datetime, token: int, taker: str,
+              counterparties: List[str], xrp: float, price: float) -> tuple:
+        """One executed_trades row (xrp signed from the taker's perspective)"""
+        code, issuer, _ = self.tokens[token]
+        iou = abs(xrp) / price
+        side = f"iou:{code}/{issuer}={iou:.6f}"
+        gets, pays = (side, f"xrp={abs(xrp):.6f}") if xrp > 0 else (f"xrp={abs(xrp):.6f}", side)
+        return (when, ledger_index, ledger_hash(ledger_index), self.rng.randbytes(32), 1,
+                taker, counterparties, len(counterparties), gets, pays,
+                xrp, code, issuer, iou, price, abs(xrp))
+
+    def organic_trade(self, ledger_index: int, when: datetime) -> tuple:
+        rng = self.rng
+        token = self.pick(self.token_weights)
+        taker = self.accounts[self.pick(self.account_weights)]
+        counterparties = [self.accounts[self.pick(self.account_weights)]
+                          for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+        price = self.tokens[token][2] * (1 + rng.gauss(0, 0.03))
+        xrp = rng.lognormvariate(3.5, 1.8) * rng.choice((1, -1))
+        return self.trade(ledger_index, when, token, taker, counterparties, xrp, abs(price))
+
+    def pattern_trades(self, ledger_index: int, when: datetime) -> List[tuple]:
+        """A burst of wash trades or one ping-pong round trip"""
+        rng = self.rng
+        if self.ping_pong and rng.random() < 0.5:
+            token, a, b = rng.choice(self.ping_pong)
+            price = self.tokens[token][2]
+            xrp = rng.uniform(10, 500)
+            # A sells to B, B sells the same amount back: net XRP flow ~0
+            return [self.trade(ledger_index, when, token, a, [b], xrp, price),
+                    self.trade(ledger_index + 1, when + timedelta(seconds=LEDGER_SECONDS),
+                               token, b, [a], -xrp, price)]
+        token, ring, size = rng.choice(self.wash)
+        price = self.tokens[token][2]
+        rows = []
+        for i in range(rng.randint(3, 10)):
+            taker, other = rng.sample(ring, 2)
+            rows.append(self.trade(ledger_index + i, when + timedelta(seconds=i * LEDGER_SECONDS),
+                                   token, taker, [other], size * (1 + rng.gauss(0, 0.001)) * rng.choice((1, -1)),
+                                   price * (1 + rng.gauss(0, 0.0005))))
+        return rows
+
+    def book_changes(self, trades: List[tuple]) -> List[tuple]:
+        """Per ledger and token OHLC rows, as book_screener.py would insert them"""
+        books: Dict[tuple, list] = {}
+        for row in trades:
+            when, ledger_index, lhash, _, _, _, _, _, _, _, xrp, code, issuer, iou, price, _ = row
+            book = books.get((ledger_index, code, issuer))
+            if book is None:
+                books[(ledger_index, code, issuer)] = [when, lhash, price, price, price, price, 0.0, 0.0]
+                book = books[(ledger_index, code, issuer)]
+            book[3] = max(book[3], price)
+            book[4] = min(book[4], price)
+            book[5] = price
+            book[6] += abs(xrp) * 1e6             # drops
+            book[7] += iou
+        rows = []
+        for (ledger_index, code, issuer), (when, lhash, o, h, l, c, volume, volume_token) in books.items():
+            variance = (h - l) / o if o else 0.0
+            suspicious = 1 if volume >= VOLUME_THRESHOLD_XRP and variance < PRICE_VARIANCE_THRESHOLD else 0
+            rows.append((when, ledger_index, lhash, f"XRP_drops/{issuer}/{code}", code, issuer,
+                         o, h, l, c, volume, volume_token, variance, suspicious))
+        return rows
+
+    def generate(self, total_trades: int, batch: int = INSERT_BATCH) -> Dict:
+        """
+        Generate and insert trades (and matching book changes) in time order
+
+        Returns:
+            Counts of inserted rows
+        """
+        rng = self.rng
+        start_time = datetime.now(timezone.utc) - timedelta(days=self.days)
+        ledgers = int(self.days * 86400 / LEDGER_SECONDS)
+        trades_per_ledger = total_trades / ledgers
+        counts = {"trades": 0, "book_changes": 0, "pattern_trades": 0}
+        started = time.time()
+
+        pending: List[tuple] = []
+        for offset in range(ledgers):
+            if counts["trades"] + len(pending) >= total_trades:
+                break
+            ledger_index = SYNTHETIC_LEDGER_BASE + offset
+            when = start_time + timedelta(seconds=offset * LEDGER_SECONDS)
+            # Poisson-ish number of trades in this ledger
+            n = int(trades_per_ledger) + (1 if rng.random() < trades_per_ledger % 1 else 0)
+            for _ in range(n):
+                if self.wash and rng.random() < PATTERN_SHARE / PATTERN_TRADES:
+                    rows = self.pattern_trades(ledger_index, when)
+                    counts["pattern_trades"] += len(rows)
+                    pending.extend(rows)
+                else:
+                    pending.append(self.organic_trade(ledger_index, when))
+
+            if len(pending) >= batch:
+                self.flush(pending, counts, started)
+                pending = []
+        if pending:
+            self.flush(pending, counts, started)
+        return counts
+
+    def flush(self, trades: List[tuple], counts: Dict, started: float):
+        books = self.book_changes(trades)
+        self.account_registry.register(account for row in trades for account in (row[5], *row[6]))
+        self.token_registry.register([{'exec_iou_code': row[11], 'exec_iou_issuer': row[12],
+                                       'ledger_index': row[1]} for row in trades])
+        self.client.insert("executed_trades", trades, column_names=TRADE_COLUMNS)
+        self.client.insert("book_changes", books, column_names=BOOK_COLUMNS)
+        counts["trades"] += len(trades)
+        counts["book_changes"] += len(books)
+        rate = counts["trades"] / max(time.time() - started, 0.001)
+        print(f"  {counts['trades']:>12,} trades, {counts['book_changes']:>12,} book changes "
+              f"({rate:,.0f} trades/s)")
+
+    def clean(self):
+        """Delete all synthetic rows (mutations, synchronous; registry rows are kept)"""
+        for table in ("executed_trades", "book_changes", "account_trades"):
+            self.client.command(
+                f"ALTER TABLE {table} DELETE WHERE ledger_index >= {SYNTHETIC_LEDGER_BASE}",
+                settings={"mutations_sync": 1})
+            print(f"  Removed synthetic rows from {table}")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Synthetic Load Generator")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"Multiple of production volume ({DEFAULT_TRADES:,} trades), e.g. 10 or 100")
+    parser.add_argument("--trades", type=int, help="Exact number of trades (overrides --scale)")
+    parser.add_argument("--tokens", type=int, default=DEFAULT_TOKENS,
+                        help=f"Distinct tokens (default: {DEFAULT_TOKENS})")
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS,
+                        help=f"Distinct organic accounts (default: {DEFAULT_ACCOUNTS})")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help=f"Days of history, ending now (default: {DEFAULT_DAYS})")
+    parser.add_argument("--zipf", type=float, default=DEFAULT_ZIPF,
+                        help=f"Zipf exponent of token / account activity (default: {DEFAULT_ZIPF})")
+    parser.add_argument("--wash-tokens", type=int, default=DEFAULT_WASH_TOKENS,
+                        help=f"Tokens with injected wash trading (default: {DEFAULT_WASH_TOKENS})")
+    parser.add_argument("--ping-pong-pairs", type=int, default=DEFAULT_PING_PONG_PAIRS,
+                        help=f"Ping-pong account pairs (default: {DEFAULT_PING_PONG_PAIRS})")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--clean", action="store_true", help="Delete synthetic rows and exit")
+    parser.add_argument("--force", action="store_true",
+                        help="Write even if the database holds real trades")
+
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.tokens, args.accounts, args.days, args.zipf,
+                              args.wash_tokens, args.ping_pong_pairs, args.seed)
+    if args.clean:
+        generator.clean()
+        return
+
+    generator.check_target(args.force)
+    total = args.trades or int(DEFAULT_TRADES * args.scale)
+    print(f"Generating {total:,} trades over {args.days} days "
+          f"({args.tokens:,} tokens, {args.accounts:,} accounts, zipf {args.zipf})")
+    start = time.time()
+    counts = generator.generate(total)
+    print(f"\nInserted {counts['trades']:,} trades ({counts['pattern_trades']:,} injected) and "
+          f"{counts['book_changes']:,} book changes in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
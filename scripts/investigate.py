@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Account Investigation CLI
+Answers "what did this account do" and "how do these two accounts trade"
+using the account-keyed account_trades table (ORDER BY account, time)
+"""
+
+import os
+import sys
+import time
+import clickhouse_connect
+
+# Shared decoder (memoized) from collectors/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "collectors"))
+from token_registry import decode_token
+
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+
+class Investigator:
+    def __init__(self):
+        """Initialize ClickHouse connection"""
+        self.client = clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+
+    def _query(self, sql: str, parameters: dict):
+        """Run a parameterized query and return (rows, elapsed_ms)"""
+        start = time.time()
+        result = self.client.query(sql, parameters=parameters)
+        return result.result_rows, (time.time() - start) * 1000
+
+    def account_summary(self, account: str, days: int = 90):
+        """Print totals, top tokens and top counterparties for an account"""
+        params = {"account": account, "days": days}
+
+        rows, elapsed = self._query("""
+            SELECT
+                role,
+                count() as trades,
+                round(sum(total_volume_xrp), 2) as volume_xrp,
+                uniqExact(exec_iou_code, exec_iou_issuer) as tokens,
+                min(time) as first_trade,
+                max(time) as last_trade
+            FROM account_trades FINAL
+            WHERE account = {account:String}
+              AND time >= now() - INTERVAL {days:UInt32} DAY
+            GROUP BY role
+            ORDER BY role
+        """, params)
+
+        print(f"\nAccount {account} (last {days} days) [{elapsed:.0f} ms]")
+        print("="*90)
+        if not rows:
+            print("No trades found.")
+            return
+
+        print(f"{'Role':<14} {'Trades':>8} {'Volume (XRP)':>16} {'Tokens':>7}  {'First trade':<20} {'Last trade':<20}")
+        print("-"*90)
+        for role, trades, volume, tokens, first, last in rows:
+            print(f"{role:<14} {trades:>8,} {volume:>16,.2f} {tokens:>7}  "
+                  f"{first.strftime('%Y-%m-%d %H:%M:%S'):<20} {last.strftime('%Y-%m-%d %H:%M:%S'):<20}")
+
+        rows, elapsed = self._query("""
+            SELECT
+                exec_iou_code,
+                exec_iou_issuer,
+                count() as trades,
+                round(sum(total_volume_xrp), 2) as volume_xrp
+            FROM account_trades FINAL
+            WHERE account = {account:String}
+              AND time >= now() - INTERVAL {days:UInt32} DAY
+              AND exec_iou_code != ''
+            GROUP BY exec_iou_code, exec_iou_issuer
+            ORDER BY volume_xrp DESC
+            LIMIT 10
+        """, params)
+
+        print(f"\nTop tokens [{elapsed:.0f} ms]")
+        print(f"{'Token':<14} {'Issuer':<36} {'Trades':>8} {'Volume (XRP)':>16}")
+        print("-"*78)
+        for code, issuer, trades, volume in rows:
+            print(f"{decode_token(code)[:12]:<14} {issuer:<36} {trades:>8,} {volume:>16,.2f}")
+
+        rows, elapsed = self._query("""
+            SELECT
+                peer,
+                countIf(role = 'taker') as as_taker,
+                countIf(role = 'counterparty') as as_counterparty,
+                round(sum(total_volume_xrp), 2) as volume_xrp
+            FROM account_trades FINAL
+            ARRAY JOIN peers AS peer
+            WHERE account = {account:String}
+              AND time >= now() - INTERVAL {days:UInt32} DAY
+            GROUP BY peer
+            ORDER BY (as_taker + as_counterparty) DESC, volume_xrp DESC
+            LIMIT 10
+        """, params)
+
+        print(f"\nTop counterparties [{elapsed:.0f} ms]")
+        print(f"{'Account':<36} {'As taker':>9} {'As cpty':>9} {'Volume (XRP)':>16}")
+        print("-"*74)
+        for peer, as_taker, as_cp, volume in rows:
+            print(f"{peer:<36} {as_taker:>9,} {as_cp:>9,} {volume:>16,.2f}")
+        print()
+
+    def account_trades(self, account: str, limit: int = 50):
+        """Print the most recent trades of an account"""
+        rows, elapsed = self._query("""
+            SELECT
+                time,
+                ledger_index,
+                hex(tx_hash) as tx_hash,
+                role,
+                peers,
+                exec_xrp,
+                exec_iou_code,
+                exec_iou
+            FROM account_trades FINAL
+            WHERE account = {account:String}
+            ORDER BY time DESC
+            LIMIT {limit:UInt32}
+        """, {"account": account, "limit": limit})
+
+        print(f"\nLast {limit} trades of {account} [{elapsed:.0f} ms]")
+        self._print_trades(rows)
+
+    def pair_history(self, account_a: str, account_b: str, limit: int = 200):
+        """Print the chronological trade sequence between two accounts"""
+        # Indexed under A: covers A as taker with B as counterparty
+        # and B as taker with A as counterparty
+        rows, elapsed = self._query("""
+            SELECT
+                time,
+                ledger_index,
+                hex(tx_hash) as tx_hash,
+                role,
+                peers,
+                exec_xrp,
+                exec_iou_code,
+                exec_iou
+            FROM account_trades FINAL
+            WHERE account = {a:String}
+              AND has(peers, {b:String})
+            ORDER BY time ASC
+            LIMIT {limit:UInt32}
+        """, {"a": account_a, "b": account_b, "limit": limit})
+
+        print(f"\nTrades between {account_a} and {account_b} [{elapsed:.0f} ms]")
+        self._print_trades(rows)
+
+        if rows:
+            a_taker = sum(1 for r in rows if r[3] == 'taker')
+            net_xrp = sum(r[5] if r[3] == 'taker' else -r[5] for r in rows)
+            print(f"A as taker: {a_taker}, B as taker: {len(rows) - a_taker}")
+            print(f"Net XRP flow (A perspective): {net_xrp:,.4f}\n")
+
+    def _print_trades(self, rows: list):
+        """Print trade rows in a fixed-width table"""
+        if not rows:
+            print("No trades found.\n")
+            return
+
+        print(f"{'Time':<20} {'Ledger':>10} {'Tx':<10} {'Role':<13} {'Peer':<36} {'XRP':>14} {'Token':<12} {'IOU':>14}")
+        print("-"*136)
+        for ts, ledger, tx_hash, role, peers, exec_xrp, code, exec_iou in rows:
+            peer = peers[0] if peers else ''
+            if len(peers) > 1:
+                peer = f"{peer[:30]} (+{len(peers) - 1})"
+            print(f"{ts.strftime('%Y-%m-%d %H:%M:%S'):<20} {ledger:>10} {tx_hash[:8]:<10} {role:<13} "
+                  f"{peer:<36} {exec_xrp:>14,.4f} {decode_token(code)[:12]:<12} {exec_iou:>14,.4f}")
+        print(f"\n{len(rows)} trades\n")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Account Investigation")
+    subparsers = parser.add_subparsers(dest="command", help="Command")
+
+    # Account summary
+    parser_account = subparsers.add_parser("account", help="Summarize an account's trading")
+    parser_account.add_argument("account", help="Account address")
+    parser_account.add_argument("--days", type=int, default=90, help="Lookback window in days (default: 90)")
+
+    # Account trades
+    parser_trades = subparsers.add_parser("trades", help="List an account's most recent trades")
+    parser_trades.add_argument("account", help="Account address")
+    parser_trades.add_argument("--limit", type=int, default=50, help="Number of trades (default: 50)")
+
+    # Pair history
+    parser_pair = subparsers.add_parser("pair", help="Show trades between two accounts")
+    parser_pair.add_argument("account_a", help="First account address")
+    parser_pair.add_argument("account_b", help="Second account address")
+    parser_pair.add_argument("--limit", type=int, default=200, help="Maximum trades (default: 200)")
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        return
+
+    investigator = Investigator()
+
+    if args.command == "account":
+        investigator.account_summary(args.account, args.days)
+    elif args.command == "trades":
+        investigator.account_trades(args.account, args.limit)
+    elif args.command == "pair":
+        investigator.pair_history(args.account_a, args.account_b, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ CLICKHOUSE_HOST = "localhost"
 CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DB = "xrp_watchdog"
 
+# Dictionaries over token_whitelist (migration 012)
+WHITELIST_DICTIONARIES = ["token_whitelist_dict", "token_whitelist_issuer_dict"]
+
 class WhitelistManager:
     def __init__(self):
         """Initialize whitelist manager"""
@@ -71,10 +74,10 @@ class WhitelistManager:
             return False
 
         # Check if already exists
-        result = self.client.query(f"""
+        result = self.client.query("""
             SELECT COUNT(*) FROM token_whitelist
-            WHERE token_code = '{token_code}' AND token_issuer = '{token_issuer}'
-        """)
+            WHERE token_code = {code:String} AND token_issuer = {issuer:String}
+        """, parameters={"code": token_code, "issuer": token_issuer})
 
         if result.result_rows[0][0] > 0:
             print(f"WARNING: Token {token_name} ({token_code}) already in whitelist")
@@ -94,6 +97,7 @@ class WhitelistManager:
             column_names=["token_code", "token_issuer", "token_name", "category", "reason", "added_date", "added_by"]
         )
 
+        self.bump_version(added_by)
         print(f"✓ Added {token_name} ({token_code}) to whitelist as {category}")
         return True
 
@@ -101,10 +105,10 @@ class WhitelistManager:
         """Remove a token from the whitelist"""
 
         # Check if exists
-        result = self.client.query(f"""
+        result = self.client.query("""
             SELECT token_name FROM token_whitelist
-            WHERE token_code = '{token_code}' AND token_issuer = '{token_issuer}'
-        """)
+            WHERE token_code = {code:String} AND token_issuer = {issuer:String}
+        """, parameters={"code": token_code, "issuer": token_issuer})
 
         if not result.result_rows:
             print(f"ERROR: Token {token_code} not found in whitelist")
@@ -112,15 +116,35 @@ class WhitelistManager:
 
         token_name = result.result_rows[0][0]
 
-        # Delete
-        self.client.command(f"""
+        # Delete (wait for the mutation so the version bump reloads without the token)
+        self.client.command("""
             ALTER TABLE token_whitelist DELETE
-            WHERE token_code = '{token_code}' AND token_issuer = '{token_issuer}'
-        """)
+            WHERE token_code = {code:String} AND token_issuer = {issuer:String}
+        """, parameters={"code": token_code, "issuer": token_issuer},
+            settings={"mutations_sync": 1})
 
+        self.bump_version("admin")
         print(f"✓ Removed {token_name} ({token_code}) from whitelist")
         return True
 
+    def bump_version(self, updated_by: str):
+        """
+        Record a whitelist change so cached copies reload
+
+        The dictionaries and the analyzer's WhitelistCache reload when
+        max(version) changes; the dictionaries are also reloaded right away.
+        """
+        self.client.command("""
+            INSERT INTO whitelist_version (version, updated_by)
+            SELECT max(version) + 1, {updated_by:String} FROM whitelist_version
+        """, parameters={"updated_by": updated_by})
+
+        for dictionary in WHITELIST_DICTIONARIES:
+            try:
+                self.client.command(f"SYSTEM RELOAD DICTIONARY {CLICKHOUSE_DB}.{dictionary}")
+            except Exception as e:
+                print(f"WARNING: Could not reload {dictionary} (reloads within 60s): {e}")
+
     def find_token(self, search: str):
         """Find tokens in executed_trades by code or name"""
         result = self.client.query(f"""
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+XRP Watchdog - Query Regression Harness
+Runs every detector and dashboard query (queries/**/*.sql, the ```sql blocks of
+grafana/token_stats_queries.md and the rawSql targets of
+grafana/xrp-watchdog-dashboard.json) against a seeded local ClickHouse, reads
+duration, rows / bytes read and peak memory from system.query_log, and fails
+when a query costs more than the stored baseline allows.
+
+    python scripts/query_regression.py --seed-data --update-baseline   # record
+    python scripts/query_regression.py --seed-data                     # check
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+from datetime import datetime
+from typing import Dict, List
+import clickhouse_connect
+
+from benchmark import prepare_query, format_bytes
+from generate_load import LoadGenerator, DEFAULT_TRADES
+
+CLICKHOUSE_HOST = "localhost"
+CLICKHOUSE_PORT = 8123
+CLICKHOUSE_DB = "xrp_watchdog"
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES_DIR = os.path.join(ROOT_DIR, "queries")
+QUERY_DOC = os.path.join(ROOT_DIR, "grafana", "token_stats_queries.md")
+DASHBOARD = os.path.join(ROOT_DIR, "grafana", "xrp-watchdog-dashboard.json")
+BASELINE_PATH = os.path.join(QUERIES_DIR, "query_baseline.json")
+
+DEFAULT_REPEAT = 3
+DEFAULT_HOURS = 24
+DEFAULT_SEED = 42                 # Same seed and scale, same data (generate_load.py)
+
+# Filled by materialized views and not keyed by ledger, so --clean cannot remove the
+# synthetic share; reseeding truncates them to keep the data set reproducible
+ROLLUP_TABLES = [
+    "token_hourly", "book_changes_hourly", "book_changes_1m", "token_window_buckets",
+    "token_sketch_buckets", "token_trade_seconds"
+]
+
+# Allowed growth over the baseline per metric; differences under the floor are noise
+THRESHOLDS = {
+    "read_rows": 0.10,
+    "read_bytes": 0.10,
+    "peak_memory": 0.25,
+    "duration_ms": 0.50,
+}
+FLOORS = {
+    "read_rows": 10_000,
+    "read_bytes": 1 << 20,
+    "peak_memory": 4 << 20,
+    "duration_ms": 25,
+}
+
+
+def slug(text: str) -> str:
+    """Query name fragment from a heading or panel title"""
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def extract_queries() -> List[Dict]:
+    """
+    Every runnable query in the repository
+
+    Returns:
+        List of {"name", "source", "sql"}; names are stable across runs
+    """
+    queries = []
+
+    for path in sorted(glob.glob(os.path.join(QUERIES_DIR, "**", "*.sql"), recursive=True)):
+        with open(path) as f:
+            queries.append({"name": os.path.relpath(path, ROOT_DIR), "source": "queries", "sql": f.read()})
+
+    # Only complete statements: the doc also holds WHERE fragments
+    with open(QUERY_DOC) as f:
+        doc = f.read()
+    heading = "doc"
+    seen: Dict[str, int] = {}
+    for match in re.finditer(r"^(#+ [^\n]*)$|^```sql\n(.*?)^```", doc, re.MULTILINE | re.DOTALL):
+        if match.group(1):
+            heading = slug(match.group(1).lstrip("#"))
+            continue
+        sql = match.group(2)
+        if not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+            continue
+        seen[heading] = seen.get(heading, 0) + 1
+        suffix = f"_{seen[heading]}" if seen[heading] > 1 else ""
+        queries.append({"name": f"token_stats_queries.md#{heading}{suffix}", "source": "doc", "sql": sql})
+
+    with open(DASHBOARD) as f:
+        dashboard = json.load(f)
+
+    def panels(items):
+        for panel in items:
+            yield panel
+            yield from panels(panel.get("panels", []))
+
+    for panel in panels(dashboard.get("panels", [])):
+        for target in panel.get("targets", []):
+            if target.get("rawSql", "").strip():
+                title = slug(panel.get("title") or f"panel_{panel.get('id')}")
+                queries.append({"name": f"dashboard#{title}_{target.get('refId', 'A')}",
+                                "source": "dashboard", "sql": target["rawSql"]})
+
+    return queries
+
+
+def dashboard_variables() -> Dict[str, str]:
+    """Current values of the dashboard variables"""
+    with open(DASHBOARD) as f:
+        dashboard = json.load(f)
+    return {var["name"]: var.get("current", {}).get("value", "")
+            for var in dashboard.get("templating", {}).get("list", [])}
+
+
+class QueryRegression:
+    def __init__(self, client=None, repeat: int = DEFAULT_REPEAT, hours: int = DEFAULT_HOURS):
+        """
+        Initialize harness
+
+        Args:
+            client: ClickHouse client to use (default: new client)
+            repeat: Runs per query (the median duration is compared)
+            hours: Window substituted for $__timeFilter() and the other time macros
+        """
+        self.client = client or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.repeat = repeat
+        self.hours = hours
+        self.run_id = f"regress-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    def seed(self, scale: float, seed: int, force: bool = False):
+        """Replace the synthetic rows with a fresh deterministic data set"""
+        generator = LoadGenerator(seed=seed)
+        generator.check_target(force)
+        generator.clean()
+        if force:
+            print("⚠️  --force: rollup tables keep earlier rows, metrics are not comparable to the baseline")
+        else:
+            for table in ROLLUP_TABLES:
+                self.client.command(f"TRUNCATE TABLE IF EXISTS {table}")
+        total = int(DEFAULT_TRADES * scale)
+        print(f"Seeding {total:,} synthetic trades (seed {seed})...")
+        counts = generator.generate(total)
+        print(f"  ✓ {counts['trades']:,} trades, {counts['book_changes']:,} book changes\n")
+
+    def run(self, queries: List[Dict]) -> Dict[str, Dict]:
+        """
+        Run each query repeat times, tagged with log_comment
+
+        Returns:
+            Dict name -> {"source", "rows", "error"}
+        """
+        variables = dashboard_variables()
+        results = {}
+        for query in queries:
+            sql = prepare_query(query["sql"], self.hours, variables)
+            self.client.set_client_setting("log_comment", f"{self.run_id}:{query['name']}")
+            result = {"source": query["source"], "rows": 0, "error": None}
+            for _ in range(self.repeat):
+                try:
+                    result["rows"] = len(self.client.query(sql).result_rows)
+                except Exception as e:
+                    result["error"] = str(e).splitlines()[0][:200]
+                    break
+            results[query["name"]] = result
+        self.client.set_client_setting("log_comment", "")
+        return results
+
+    def collect(self, results: Dict[str, Dict]):
+        """Add query_log metrics (median duration, max rows / bytes read, peak memory)"""
+        self.client.command("SYSTEM FLUSH LOGS")
+        result = self.client.query("""
+            SELECT
+                replaceOne(log_comment, {prefix:String}, '') as name,
+                count() as runs,
+                quantileExact(0.5)(query_duration_ms) as duration_ms,
+                max(read_rows) as read_rows,
+                max(read_bytes) as read_bytes,
+                max(memory_usage) as peak_memory
+            FROM system.query_log
+            WHERE type = 'QueryFinish'
+              AND event_date >= yesterday()
+              AND startsWith(log_comment, {prefix:String})
+            GROUP BY name
+        """, parameters={"prefix": f"{self.run_id}:"})
+        for name, runs, duration, read_rows, read_bytes, memory in result.result_rows:
+            if name in results:
+                results[name].update({"runs": runs, "duration_ms": duration, "read_rows": read_rows,
+                                      "read_bytes": read_bytes, "peak_memory": memory})
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            thresholds: Dict[str, float] = THRESHOLDS) -> List[str]:
+    """
+    Regressions against the baseline
+
+    Returns:
+        One line per failed query, query without metrics or metric over its
+        threshold (empty if none)
+    """
+    failures = []
+    for name, result in results.items():
+        if result["error"]:
+            failures.append(f"{name}: ERROR {result['error']}")
+            continue
+        if "read_rows" not in result:
+            failures.append(f"{name}: no system.query_log entry for its log_comment")
+            continue
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, allowed in thresholds.items():
+            before, after = previous.get(metric, 0), result[metric]
+            if after - before > FLOORS[metric] and after > before * (1 + allowed):
+                growth = (after / before - 1) * 100 if before else float("inf")
+                failures.append(f"{name}: {metric} {before:,.0f} -> {after:,.0f} "
+                                f"(+{growth:.0f}%, allowed +{allowed * 100:.0f}%)")
+    return failures
+
+
+def load_baseline(path: str) -> Dict[str, Dict]:
+    """Stored per-query metrics (empty if no baseline yet)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("queries", {})
+
+
+def save_baseline(path: str, results: Dict[str, Dict], meta: Dict):
+    """Write the current metrics as the new baseline"""
+    metrics = ("rows", "duration_ms", "read_rows", "read_bytes", "peak_memory")
+    data = {
+        **meta,
+        "queries": {name: {m: result[m] for m in metrics if m in result}
+                    for name, result in sorted(results.items())
+                    if not result["error"] and "read_rows" in result}
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Query Regression Harness")
+    parser.add_argument("--seed-data", action="store_true",
+                        help="Regenerate the synthetic data set before running (generate_load.py)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"Seeded volume as a multiple of {DEFAULT_TRADES:,} trades (default: 1)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED})")
+    parser.add_argument("--force", action="store_true", help="Seed even if the database holds real trades")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Runs per query (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--hours", type=int, default=DEFAULT_HOURS,
+                        help=f"Dashboard time range in hours (default: {DEFAULT_HOURS})")
+    parser.add_argument("--only", help="Only run queries whose name contains this text")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file (default: queries/query_baseline.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline")
+    for metric, allowed in THRESHOLDS.items():
+        parser.add_argument(f"--max-{metric.replace('_', '-')}", type=float, default=allowed,
+                            dest=metric, help=f"Allowed {metric} growth (default: {allowed:.2f})")
+
+    args = parser.parse_args()
+
+    harness = QueryRegression(repeat=args.repeat, hours=args.hours)
+    if args.seed_data:
+        harness.seed(args.scale, args.seed, args.force)
+
+    queries = [q for q in extract_queries() if not args.only or args.only in q["name"]]
+    print(f"=== Query regression {harness.run_id}: {len(queries)} queries x {args.repeat} ===\n")
+    start = time.time()
+    results = harness.run(queries)
+    harness.collect(results)
+
+    print(f"{'Query':<60} {'Rows':>7} {'ms':>7} {'Read rows':>13} {'Read':>11} {'Peak mem':>11}")
+    print("-" * 113)
+    for name, result in results.items():
+        if result["error"]:
+            print(f"{name[:60]:<60} ERROR {result['error'][:45]}")
+        elif "read_rows" in result:
+            print(f"{name[:60]:<60} {result['rows']:>7} {result['duration_ms']:>7.0f} "
+                  f"{result['read_rows']:>13,} {format_bytes(result['read_bytes']):>11} "
+                  f"{format_bytes(result['peak_memory']):>11}")
+        else:
+            print(f"{name[:60]:<60} no query_log entry")
+    print(f"\nRan in {time.time() - start:.1f}s\n")
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results, {
+            "run_id": harness.run_id, "hours": args.hours, "repeat": args.repeat,
+            "seed": args.seed, "scale": args.scale
+        })
+        print(f"✓ Baseline written to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"⚠️  No baseline at {args.baseline}; run with --update-baseline first")
+    thresholds = {metric: getattr(args, metric) for metric in THRESHOLDS}
+    failures = compare(results, baseline, thresholds)
+    new = [name for name in results if baseline and name not in baseline]
+    if new:
+        print(f"New queries (not in baseline): {', '.join(new)}")
+    if failures:
+        print(f"✗ {len(failures)} regression(s):")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+    print("✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,37 @@ Update Grafana dashboard to v2.0
 - Replace Top 10 Suspicious Tokens query with Actionable Threats view
 - Add new Research/Patterns panel
 - Add volume threshold variable
+- Optionally (--rollups) point time-series and overview panels at hourly rollups
+- Optionally (--materialized) read Actionable Threats from analyzer-scored token_stats
 """
 
+import argparse
 import json
 import sys
 from pathlib import Path
 
+parser = argparse.ArgumentParser(description="Update Grafana dashboard to v2.0")
+parser.add_argument("--rollups", action="store_true",
+                    help="Rewrite raw-scan panels against hourly rollup tables (migration 006)")
+parser.add_argument("--materialized", action="store_true",
+                    help="Read Actionable Threats from windowed token_stats scores (migration 008)")
+args = parser.parse_args()
+
+# Panel ID -> rollup-backed query (queries/rollups/)
+ROLLUP_PANEL_QUERIES = {
+    1: "tracked_tokens.sql",               # Tracked
+    3: "suspicious_rate.sql",              # Suspicious Rate
+    11: "suspicious_activity_heatmap.sql", # Suspicious Activity Heatmap
+    22: "token_diversity.sql",             # Token Diversity Over Time
+    6: "xrp_volume.sql",                   # XRP Volume Over Time
+    23: "trade_volume.sql",                # Trade Volume Over Time
+}
+
 # Load queries
-actionable_query = Path("queries/v2_risk_scoring.sql").read_text()
+if args.materialized:
+    actionable_query = Path("queries/v2_risk_scoring_materialized.sql").read_text()
+else:
+    actionable_query = Path("queries/v2_risk_scoring.sql").read_text()
 research_query = Path("queries/v2_research_view.sql").read_text()
 
 # Load dashboard
@@ -87,6 +110,16 @@ research_row = {
 dashboard['panels'].insert(table_panel_index + 1, research_row)
 print("✅ Added Research panel (collapsed row)")
 
+# Rewrite raw-scan panels against hourly rollups
+if args.rollups:
+    rollup_dir = Path("queries/rollups")
+    for panel in dashboard['panels']:
+        query_file = ROLLUP_PANEL_QUERIES.get(panel.get('id'))
+        if not query_file or not panel.get('targets'):
+            continue
+        panel['targets'][0]['rawSql'] = (rollup_dir / query_file).read_text()
+        print(f"✅ Panel {panel['id']} ({panel.get('title') or 'untitled'}) now reads {query_file}")
+
 # Increment version
 dashboard['version'] += 1
 print(f"📦 Incremented version: {dashboard['version'] - 1} → {dashboard['version']}")
@@ -0,0 +1,118 @@
+-- Migration 004: Account-centric trade index
+-- Date: 2025-11-08
+-- Description: Add account_trades, one row per (account, role, trade), ordered by (account, time)
+-- Purpose: Investigation lookups read only the granules of the account being investigated
+--          instead of relying on the idx_taker bloom filter (which cannot see counterparties)
+
+-- ============================================
+-- Step 1: Create account_trades table
+-- ============================================
+-- Takers get one row per trade, counterparties get one row per trade they appear in.
+-- "peers" holds the other side of the trade: the counterparties for a taker row,
+-- the taker for a counterparty row. Amounts are always from the taker's perspective.
+-- ReplacingMergeTree collapses rows written twice for the same trade (re-collected
+-- ledgers, or trades caught by both the materialized views and the backfill below).
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.account_trades (
+  account String COMMENT 'Account this row is indexed under',
+  role Enum8('taker' = 1, 'counterparty' = 2) COMMENT 'Role of the account in the trade',
+  time DateTime64(3) COMMENT 'Ledger close time',
+  ledger_index UInt32 COMMENT 'XRPL ledger number',
+  tx_hash FixedString(64) COMMENT 'Transaction hash',
+  peers Array(String) COMMENT 'Other side of the trade (counterparties for takers, taker for counterparties)',
+  exec_xrp Float64 COMMENT 'Executed XRP (taker perspective, signed)',
+  exec_iou_code String COMMENT 'IOU currency code',
+  exec_iou_issuer String COMMENT 'IOU issuer',
+  exec_iou Float64 COMMENT 'Executed IOU amount (absolute)',
+  exec_price Float64 COMMENT 'Executed price (XRP per IOU)',
+  total_volume_xrp Float64 COMMENT 'Abs(exec_xrp) for volume queries'
+) ENGINE = ReplacingMergeTree()
+PARTITION BY toYYYYMM(time)
+PRIMARY KEY (account, time)
+ORDER BY (account, time, tx_hash, role)
+TTL toDateTime(time) + INTERVAL 90 DAY
+COMMENT 'Executed trades indexed by every participating account';
+
+-- ============================================
+-- Step 2: Populate at ingest via materialized views
+-- ============================================
+-- TradeCollector keeps inserting into executed_trades only; these views fan each
+-- insert block out into account_trades.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.account_trades_taker_mv
+TO xrp_watchdog.account_trades AS
+SELECT
+  taker AS account,
+  'taker' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  counterparties AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.account_trades_counterparty_mv
+TO xrp_watchdog.account_trades AS
+SELECT
+  counterparty AS account,
+  'counterparty' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  [taker] AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades
+ARRAY JOIN counterparties AS counterparty;
+
+-- ============================================
+-- Step 3: Backfill existing trades
+-- ============================================
+-- Safe to re-run: duplicates are collapsed by ReplacingMergeTree on merge.
+
+INSERT INTO xrp_watchdog.account_trades
+SELECT
+  taker AS account,
+  'taker' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  counterparties AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades;
+
+INSERT INTO xrp_watchdog.account_trades
+SELECT
+  counterparty AS account,
+  'counterparty' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  [taker] AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades
+ARRAY JOIN counterparties AS counterparty;
+
+-- Verification Queries
+-- SELECT role, count() FROM xrp_watchdog.account_trades GROUP BY role;
+-- SELECT count() FROM xrp_watchdog.executed_trades;
+-- SELECT sum(counterparty_count) FROM xrp_watchdog.executed_trades;
@@ -0,0 +1,224 @@
+-- Migration 005: Storage layout v3
+-- Date: 2025-11-09
+-- Description: Rebuild executed_trades, book_changes and account_trades with a tuned layout
+--   - LowCardinality for token and issuer columns (account columns stay String:
+--     far more distinct values than low_cardinality_max_dictionary_size per part)
+--   - Binary FixedString(32) hashes (collectors now insert raw bytes, queries use hex())
+--   - DoubleDelta for time, Delta for ledger_index, ZSTD for floats
+--   - Daily partitions with ttl_only_drop_parts so the 90-day TTL drops whole
+--     partitions instead of rewriting parts row by row
+-- Note: Stop collection (crontab / scripts/prod_stop.sh) while this runs.
+--       The previous tables are kept as *_v2 until you have verified the copy.
+
+-- ============================================
+-- Step 1: Detach ingest-time fan-out (recreated in Step 5)
+-- ============================================
+
+DROP VIEW IF EXISTS xrp_watchdog.account_trades_taker_mv;
+DROP VIEW IF EXISTS xrp_watchdog.account_trades_counterparty_mv;
+
+-- ============================================
+-- Step 2: Create v3 tables
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.executed_trades_v3 (
+  time DateTime64(3) CODEC(DoubleDelta, ZSTD(1)) COMMENT 'Ledger close time',
+  ledger_index UInt32 CODEC(Delta, ZSTD(1)) COMMENT 'XRPL ledger number',
+  ledger_hash FixedString(32) CODEC(ZSTD(1)) COMMENT 'Ledger hash (binary, use hex())',
+  tx_hash FixedString(32) CODEC(ZSTD(1)) COMMENT 'Transaction hash (binary, use hex())',
+  tx_type Enum8('OfferCreate'=1, 'Payment'=2) COMMENT 'Transaction type',
+  taker String CODEC(ZSTD(1)) COMMENT 'Account executing trade',
+  counterparties Array(String) CODEC(ZSTD(1)) COMMENT 'Real counterparties (Modified/Deleted Offers only)',
+  counterparty_count UInt8 COMMENT 'Number of counterparties',
+  posted_gets String CODEC(ZSTD(3)) COMMENT 'Posted TakerGets (format: kind:code/issuer=value)',
+  posted_pays String CODEC(ZSTD(3)) COMMENT 'Posted TakerPays (format: kind:code/issuer=value)',
+  exec_xrp Float64 CODEC(ZSTD(1)) COMMENT 'Executed XRP (fee-corrected, signed)',
+  exec_iou_code LowCardinality(String) COMMENT 'IOU currency code',
+  exec_iou_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  exec_iou Float64 CODEC(ZSTD(1)) COMMENT 'Executed IOU amount (absolute)',
+  exec_price Float64 CODEC(ZSTD(1)) COMMENT 'Executed price (XRP per IOU)',
+  total_volume_xrp Float64 CODEC(ZSTD(1)) COMMENT 'Abs(exec_xrp) for volume queries',
+
+  INDEX idx_taker taker TYPE bloom_filter GRANULARITY 1,
+  INDEX idx_hash tx_hash TYPE bloom_filter GRANULARITY 1,
+  INDEX idx_volume total_volume_xrp TYPE minmax GRANULARITY 1
+) ENGINE = MergeTree()
+PARTITION BY toDate(time)
+ORDER BY (time, total_volume_xrp)
+TTL toDateTime(time) + INTERVAL 90 DAY
+SETTINGS ttl_only_drop_parts = 1
+COMMENT 'Executed trades with real counterparties and balance-change volumes';
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.book_changes_v3 (
+  time DateTime64(3) CODEC(DoubleDelta, ZSTD(1)) COMMENT 'Ledger close time',
+  ledger_index UInt32 CODEC(Delta, ZSTD(1)) COMMENT 'XRPL ledger number',
+  ledger_hash FixedString(32) CODEC(ZSTD(1)) COMMENT 'Ledger hash (binary, use hex())',
+  currency_pair LowCardinality(String) COMMENT 'e.g., XRP_drops/issuer/USD',
+  currency_code LowCardinality(String) COMMENT 'Token currency code',
+  issuer LowCardinality(String) COMMENT 'Token issuer address',
+  open Float64 CODEC(ZSTD(1)) COMMENT 'Opening price',
+  high Float64 CODEC(ZSTD(1)) COMMENT 'Highest price',
+  low Float64 CODEC(ZSTD(1)) COMMENT 'Lowest price',
+  close Float64 CODEC(ZSTD(1)) COMMENT 'Closing price',
+  volume_xrp Float64 CODEC(ZSTD(1)) COMMENT 'XRP volume in drops',
+  volume_token Float64 CODEC(ZSTD(1)) COMMENT 'Token volume',
+  price_variance Float64 CODEC(ZSTD(1)) COMMENT '(high-low)/open ratio',
+  is_suspicious UInt8 COMMENT 'Flag: 1 if volume >=5M AND variance <0.01',
+
+  INDEX idx_suspicious is_suspicious TYPE set(2) GRANULARITY 1
+) ENGINE = MergeTree()
+PARTITION BY toDate(time)
+ORDER BY (time, volume_xrp)
+TTL toDateTime(time) + INTERVAL 90 DAY
+SETTINGS ttl_only_drop_parts = 1
+COMMENT 'DEX book changes for volume screening';
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.account_trades_v3 (
+  account String CODEC(ZSTD(1)) COMMENT 'Account this row is indexed under',
+  role Enum8('taker' = 1, 'counterparty' = 2) COMMENT 'Role of the account in the trade',
+  time DateTime64(3) CODEC(DoubleDelta, ZSTD(1)) COMMENT 'Ledger close time',
+  ledger_index UInt32 CODEC(Delta, ZSTD(1)) COMMENT 'XRPL ledger number',
+  tx_hash FixedString(32) CODEC(ZSTD(1)) COMMENT 'Transaction hash (binary, use hex())',
+  peers Array(String) CODEC(ZSTD(1)) COMMENT 'Other side of the trade (counterparties for takers, taker for counterparties)',
+  exec_xrp Float64 CODEC(ZSTD(1)) COMMENT 'Executed XRP (taker perspective, signed)',
+  exec_iou_code LowCardinality(String) COMMENT 'IOU currency code',
+  exec_iou_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  exec_iou Float64 CODEC(ZSTD(1)) COMMENT 'Executed IOU amount (absolute)',
+  exec_price Float64 CODEC(ZSTD(1)) COMMENT 'Executed price (XRP per IOU)',
+  total_volume_xrp Float64 CODEC(ZSTD(1)) COMMENT 'Abs(exec_xrp) for volume queries'
+) ENGINE = ReplacingMergeTree()
+PARTITION BY toDate(time)
+PRIMARY KEY (account, time)
+ORDER BY (account, time, tx_hash, role)
+TTL toDateTime(time) + INTERVAL 90 DAY
+SETTINGS ttl_only_drop_parts = 1
+COMMENT 'Executed trades indexed by every participating account';
+
+-- ============================================
+-- Step 3: Copy data (hex hashes -> binary)
+-- ============================================
+
+INSERT INTO xrp_watchdog.executed_trades_v3
+SELECT
+  time,
+  ledger_index,
+  toFixedString(unhex(ledger_hash), 32),
+  toFixedString(unhex(tx_hash), 32),
+  tx_type,
+  taker,
+  counterparties,
+  counterparty_count,
+  posted_gets,
+  posted_pays,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades;
+
+INSERT INTO xrp_watchdog.book_changes_v3
+SELECT
+  time,
+  ledger_index,
+  toFixedString(unhex(ledger_hash), 32),
+  currency_pair,
+  currency_code,
+  issuer,
+  open,
+  high,
+  low,
+  close,
+  volume_xrp,
+  volume_token,
+  price_variance,
+  is_suspicious
+FROM xrp_watchdog.book_changes;
+
+INSERT INTO xrp_watchdog.account_trades_v3
+SELECT
+  account,
+  role,
+  time,
+  ledger_index,
+  toFixedString(unhex(tx_hash), 32),
+  peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.account_trades;
+
+-- ============================================
+-- Step 4: Swap tables (previous layout kept as *_v2)
+-- ============================================
+
+RENAME TABLE
+  xrp_watchdog.executed_trades TO xrp_watchdog.executed_trades_v2,
+  xrp_watchdog.executed_trades_v3 TO xrp_watchdog.executed_trades,
+  xrp_watchdog.book_changes TO xrp_watchdog.book_changes_v2,
+  xrp_watchdog.book_changes_v3 TO xrp_watchdog.book_changes,
+  xrp_watchdog.account_trades TO xrp_watchdog.account_trades_v2,
+  xrp_watchdog.account_trades_v3 TO xrp_watchdog.account_trades;
+
+-- ============================================
+-- Step 5: Recreate account_trades fan-out on the new executed_trades
+-- ============================================
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.account_trades_taker_mv
+TO xrp_watchdog.account_trades AS
+SELECT
+  taker AS account,
+  'taker' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  counterparties AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.account_trades_counterparty_mv
+TO xrp_watchdog.account_trades AS
+SELECT
+  counterparty AS account,
+  'counterparty' AS role,
+  time,
+  ledger_index,
+  tx_hash,
+  [taker] AS peers,
+  exec_xrp,
+  exec_iou_code,
+  exec_iou_issuer,
+  exec_iou,
+  exec_price,
+  total_volume_xrp
+FROM xrp_watchdog.executed_trades
+ARRAY JOIN counterparties AS counterparty;
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- Row counts must match the v2 tables:
+-- SELECT count() FROM xrp_watchdog.executed_trades;
+-- SELECT count() FROM xrp_watchdog.executed_trades_v2;
+--
+-- Compression per column (also: python scripts/check_storage.py):
+-- SELECT table, name, type, compression_codec,
+--        formatReadableSize(data_compressed_bytes) AS compressed,
+--        formatReadableSize(data_uncompressed_bytes) AS uncompressed
+-- FROM system.columns
+-- WHERE database = 'xrp_watchdog' AND table IN ('executed_trades', 'executed_trades_v2')
+-- ORDER BY table, data_compressed_bytes DESC;
+--
+-- Once verified:
+-- DROP TABLE xrp_watchdog.executed_trades_v2;
+-- DROP TABLE xrp_watchdog.book_changes_v2;
+-- DROP TABLE xrp_watchdog.account_trades_v2;
@@ -0,0 +1,122 @@
+-- Migration 006: Hourly rollup tables for the Grafana dashboard
+-- Date: 2025-11-10
+-- Description: Per-token, per-hour rollups of executed_trades and book_changes,
+--              maintained at ingest time by materialized views
+-- Purpose: Time-series, heatmap and overview panels read a few thousand pre-aggregated
+--          rows instead of re-aggregating raw trades on every refresh for every viewer
+-- Note: Stop collection while running the backfill (Step 3), otherwise rows inserted
+--       between the view creation and the backfill are counted twice.
+
+-- ============================================
+-- Step 1: Create rollup tables
+-- ============================================
+-- AggregatingMergeTree merges rows with the same (hour, token) key in the background.
+-- Always re-aggregate when reading (sum/min/max for the simple columns,
+-- uniqMerge/avgMerge for the state columns); never assume one row per key.
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_hourly (
+  hour DateTime COMMENT 'Start of hour (toStartOfHour(time))',
+  token_code LowCardinality(String) COMMENT 'IOU currency code (empty for XRP-only trades)',
+  token_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  trades SimpleAggregateFunction(sum, UInt64) COMMENT 'All trades',
+  xrp_trades SimpleAggregateFunction(sum, UInt64) COMMENT 'Trades with exec_xrp != 0',
+  large_trades SimpleAggregateFunction(sum, UInt64) COMMENT 'Trades with abs(exec_xrp) > 100',
+  volume_xrp SimpleAggregateFunction(sum, Float64) COMMENT 'Sum of abs(exec_xrp)',
+  volume_token SimpleAggregateFunction(sum, Float64) COMMENT 'Sum of exec_iou',
+  takers AggregateFunction(uniq, String) COMMENT 'Distinct taker sketch (uniqMerge)',
+  price_min SimpleAggregateFunction(min, Float64) COMMENT 'Lowest exec_price',
+  price_max SimpleAggregateFunction(max, Float64) COMMENT 'Highest exec_price',
+  price_avg AggregateFunction(avg, Float64) COMMENT 'Average exec_price (avgMerge)'
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (hour, token_code, token_issuer)
+TTL hour + INTERVAL 90 DAY
+COMMENT 'Hourly per-token trade rollup for dashboard panels';
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.book_changes_hourly (
+  hour DateTime COMMENT 'Start of hour (toStartOfHour(time))',
+  currency_code LowCardinality(String) COMMENT 'Token currency code',
+  issuer LowCardinality(String) COMMENT 'Token issuer address',
+  changes SimpleAggregateFunction(sum, UInt64) COMMENT 'Book change rows (pair x ledger)',
+  suspicious SimpleAggregateFunction(sum, UInt64) COMMENT 'Rows flagged is_suspicious',
+  volume_xrp SimpleAggregateFunction(sum, Float64) COMMENT 'XRP volume in drops'
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (hour, currency_code, issuer)
+TTL hour + INTERVAL 90 DAY
+COMMENT 'Hourly per-pair book_changes rollup for dashboard panels';
+
+-- ============================================
+-- Step 2: Materialized views (maintain rollups at ingest)
+-- ============================================
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.token_hourly_mv
+TO xrp_watchdog.token_hourly AS
+SELECT
+  toStartOfHour(time) AS hour,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trades,
+  countIf(exec_xrp != 0) AS xrp_trades,
+  countIf(abs(exec_xrp) > 100) AS large_trades,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  sum(exec_iou) AS volume_token,
+  uniqState(CAST(taker AS String)) AS takers,
+  min(exec_price) AS price_min,
+  max(exec_price) AS price_max,
+  avgState(exec_price) AS price_avg
+FROM xrp_watchdog.executed_trades
+GROUP BY hour, token_code, token_issuer;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.book_changes_hourly_mv
+TO xrp_watchdog.book_changes_hourly AS
+SELECT
+  toStartOfHour(time) AS hour,
+  currency_code,
+  issuer,
+  count() AS changes,
+  toUInt64(sum(is_suspicious)) AS suspicious,
+  sum(volume_xrp) AS volume_xrp
+FROM xrp_watchdog.book_changes
+GROUP BY hour, currency_code, issuer;
+
+-- ============================================
+-- Step 3: Backfill from existing raw data
+-- ============================================
+
+INSERT INTO xrp_watchdog.token_hourly
+SELECT
+  toStartOfHour(time) AS hour,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trades,
+  countIf(exec_xrp != 0) AS xrp_trades,
+  countIf(abs(exec_xrp) > 100) AS large_trades,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  sum(exec_iou) AS volume_token,
+  uniqState(CAST(taker AS String)) AS takers,
+  min(exec_price) AS price_min,
+  max(exec_price) AS price_max,
+  avgState(exec_price) AS price_avg
+FROM xrp_watchdog.executed_trades
+GROUP BY hour, token_code, token_issuer;
+
+INSERT INTO xrp_watchdog.book_changes_hourly
+SELECT
+  toStartOfHour(time) AS hour,
+  currency_code,
+  issuer,
+  count() AS changes,
+  toUInt64(sum(is_suspicious)) AS suspicious,
+  sum(volume_xrp) AS volume_xrp
+FROM xrp_watchdog.book_changes
+GROUP BY hour, currency_code, issuer;
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- Totals must match the raw tables:
+-- SELECT sum(trades), sum(volume_xrp) FROM xrp_watchdog.token_hourly;
+-- SELECT count(), sum(abs(exec_xrp)) FROM xrp_watchdog.executed_trades;
+-- SELECT sum(changes), sum(suspicious) FROM xrp_watchdog.book_changes_hourly;
+-- SELECT count(), sum(is_suspicious) FROM xrp_watchdog.book_changes;
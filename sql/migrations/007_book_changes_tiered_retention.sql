@@ -0,0 +1,169 @@
+-- Migration 007: Tiered retention for book_changes
+-- Date: 2025-11-11
+-- Description: Keep full-resolution book_changes for 7 days (suspicious rows for the full
+--              90 days), plus per-pair per-minute OHLCV aggregates for 90 days
+-- Purpose: book_changes stores every pair for every ledger (~1 ledger / 3-4s) and almost
+--          all rows have is_suspicious = 0. Old rows are only ever read in aggregate.
+-- Reading: book_changes_tiered returns full-resolution rows for the last 7 days and
+--          minute aggregates before that, with the same column names.
+-- Note: Stop collection while running the backfill (Step 2).
+
+-- ============================================
+-- Step 1: Create minute tier
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.book_changes_1m (
+  minute DateTime COMMENT 'Start of minute (toStartOfMinute(time))',
+  currency_pair LowCardinality(String) COMMENT 'e.g., XRP_drops/issuer/USD',
+  currency_code LowCardinality(String) COMMENT 'Token currency code',
+  issuer LowCardinality(String) COMMENT 'Token issuer address',
+  open AggregateFunction(argMin, Float64, DateTime64(3)) COMMENT 'First open in the minute (argMinMerge)',
+  high SimpleAggregateFunction(max, Float64) COMMENT 'Highest price',
+  low SimpleAggregateFunction(min, Float64) COMMENT 'Lowest price',
+  close AggregateFunction(argMax, Float64, DateTime64(3)) COMMENT 'Last close in the minute (argMaxMerge)',
+  volume_xrp SimpleAggregateFunction(sum, Float64) COMMENT 'XRP volume in drops',
+  volume_token SimpleAggregateFunction(sum, Float64) COMMENT 'Token volume',
+  ledgers SimpleAggregateFunction(sum, UInt64) COMMENT 'Ledgers in which the pair changed',
+  suspicious SimpleAggregateFunction(sum, UInt64) COMMENT 'Ledgers flagged is_suspicious',
+  first_ledger SimpleAggregateFunction(min, UInt32) COMMENT 'First ledger_index in the minute',
+  last_ledger SimpleAggregateFunction(max, UInt32) COMMENT 'Last ledger_index in the minute'
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toDate(minute)
+ORDER BY (minute, currency_pair)
+TTL minute + INTERVAL 90 DAY
+SETTINGS ttl_only_drop_parts = 1
+COMMENT 'Per-pair per-minute OHLCV aggregates of book_changes (90-day tier)';
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.book_changes_1m_mv
+TO xrp_watchdog.book_changes_1m AS
+SELECT
+  toStartOfMinute(time) AS minute,
+  currency_pair,
+  currency_code,
+  issuer,
+  argMinState(open, time) AS open,
+  max(high) AS high,
+  min(low) AS low,
+  argMaxState(close, time) AS close,
+  sum(volume_xrp) AS volume_xrp,
+  sum(volume_token) AS volume_token,
+  count() AS ledgers,
+  toUInt64(sum(is_suspicious)) AS suspicious,
+  min(ledger_index) AS first_ledger,
+  max(ledger_index) AS last_ledger
+FROM xrp_watchdog.book_changes
+GROUP BY minute, currency_pair, currency_code, issuer;
+
+-- ============================================
+-- Step 2: Backfill minute tier from existing rows
+-- ============================================
+
+INSERT INTO xrp_watchdog.book_changes_1m
+SELECT
+  toStartOfMinute(time) AS minute,
+  currency_pair,
+  currency_code,
+  issuer,
+  argMinState(open, time) AS open,
+  max(high) AS high,
+  min(low) AS low,
+  argMaxState(close, time) AS close,
+  sum(volume_xrp) AS volume_xrp,
+  sum(volume_token) AS volume_token,
+  count() AS ledgers,
+  toUInt64(sum(is_suspicious)) AS suspicious,
+  min(ledger_index) AS first_ledger,
+  max(ledger_index) AS last_ledger
+FROM xrp_watchdog.book_changes
+GROUP BY minute, currency_pair, currency_code, issuer;
+
+-- ============================================
+-- Step 3: Shorten full-resolution retention
+-- ============================================
+-- Non-suspicious rows expire after 7 days, suspicious rows after 90 days.
+-- Row-level (WHERE) TTL is applied by TTL merges, which ttl_only_drop_parts
+-- would skip, so it is disabled for this table; daily partitions still expire whole.
+
+ALTER TABLE xrp_watchdog.book_changes
+MODIFY SETTING ttl_only_drop_parts = 0;
+
+ALTER TABLE xrp_watchdog.book_changes
+MODIFY TTL
+  toDateTime(time) + INTERVAL 7 DAY DELETE WHERE is_suspicious = 0,
+  toDateTime(time) + INTERVAL 90 DAY DELETE;
+
+-- ============================================
+-- Step 4: Unified read view
+-- ============================================
+-- resolution = 'ledger' rows are single book changes, 'minute' rows are aggregates.
+-- "ledgers" is the number of ledgers each row represents (1 for 'ledger' rows), and
+-- is_suspicious is 1 when any ledger in the row was flagged. Suspicious rows older than
+-- 7 days are still in book_changes (for trade collection) but are read here through
+-- the minute tier, so nothing is counted twice.
+
+CREATE VIEW IF NOT EXISTS xrp_watchdog.book_changes_tiered AS
+SELECT
+  time,
+  ledger_index,
+  currency_pair,
+  currency_code,
+  issuer,
+  open,
+  high,
+  low,
+  close,
+  volume_xrp,
+  volume_token,
+  price_variance,
+  is_suspicious,
+  toUInt64(1) AS ledgers,
+  'ledger' AS resolution
+FROM xrp_watchdog.book_changes
+WHERE time >= toStartOfMinute(now() - INTERVAL 7 DAY)
+
+UNION ALL
+
+SELECT
+  toDateTime64(minute, 3) AS time,
+  max_ledger AS ledger_index,
+  currency_pair,
+  currency_code,
+  issuer,
+  o AS open,
+  h AS high,
+  l AS low,
+  c AS close,
+  v_xrp AS volume_xrp,
+  v_token AS volume_token,
+  if(o = 0, 0, (h - l) / o) AS price_variance,
+  toUInt8(flagged > 0) AS is_suspicious,
+  n_ledgers AS ledgers,
+  'minute' AS resolution
+FROM (
+  SELECT
+    minute,
+    currency_pair,
+    currency_code,
+    issuer,
+    argMinMerge(open) AS o,
+    max(high) AS h,
+    min(low) AS l,
+    argMaxMerge(close) AS c,
+    sum(volume_xrp) AS v_xrp,
+    sum(volume_token) AS v_token,
+    sum(suspicious) AS flagged,
+    sum(ledgers) AS n_ledgers,
+    max(last_ledger) AS max_ledger
+  FROM xrp_watchdog.book_changes_1m
+  WHERE minute < toStartOfMinute(now() - INTERVAL 7 DAY)
+  GROUP BY minute, currency_pair, currency_code, issuer
+);
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- SELECT resolution, count(), sum(ledgers), sum(volume_xrp)
+-- FROM xrp_watchdog.book_changes_tiered GROUP BY resolution;
+--
+-- Raw table should shrink to ~7 days of rows plus suspicious rows:
+-- SELECT is_suspicious, min(time), count() FROM xrp_watchdog.book_changes GROUP BY is_suspicious;
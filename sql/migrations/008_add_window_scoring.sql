@@ -0,0 +1,119 @@
+-- Migration 008: Dual-window (24h/7d) scoring materialized by the analyzer
+-- Date: 2025-11-12
+-- Description: 15-minute per-token partial aggregates of executed_trades, plus windowed
+--              score columns on token_stats
+-- Purpose: The leaderboard (queries/v2_risk_scoring.sql) rescans 24h and 7d of raw trades
+--          on every refresh. TokenAnalyzer now merges the buckets covering each window
+--          and stores the windowed scores in token_stats, so the dashboard table is a
+--          plain read (queries/v2_risk_scoring_materialized.sql).
+-- Note: Stop collection while running the backfill (Step 2).
+
+-- ============================================
+-- Step 1: Create bucket table and materialized view
+-- ============================================
+-- Same row set as the live leaderboard (no exec_iou_code / exec_xrp filter).
+-- Buckets are filled at ingest, so late trades from backfilled ledgers land in the
+-- right bucket; the analyzer slides the windows forward by selecting buckets.
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_window_buckets (
+  bucket DateTime COMMENT 'Start of 15-minute bucket',
+  token_code LowCardinality(String) COMMENT 'IOU currency code',
+  token_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  trades SimpleAggregateFunction(sum, UInt64) COMMENT 'Trades in bucket',
+  volume_xrp SimpleAggregateFunction(sum, Float64) COMMENT 'Sum of abs(exec_xrp)',
+  takers AggregateFunction(uniq, String) COMMENT 'Distinct takers (uniqMerge)',
+  price_avg AggregateFunction(avg, Float64) COMMENT 'avgMerge(exec_price)',
+  price_var AggregateFunction(varPop, Float64) COMMENT 'varPopMerge(exec_price)',
+  size_avg AggregateFunction(avg, Float64) COMMENT 'avgMerge(abs(exec_xrp))',
+  size_var AggregateFunction(varPop, Float64) COMMENT 'varPopMerge(abs(exec_xrp))',
+  first_trade SimpleAggregateFunction(min, DateTime64(3)) COMMENT 'First trade time in bucket',
+  last_trade SimpleAggregateFunction(max, DateTime64(3)) COMMENT 'Last trade time in bucket'
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMMDD(bucket)
+ORDER BY (bucket, token_code, token_issuer)
+TTL bucket + INTERVAL 8 DAY
+COMMENT '15-minute per-token partial aggregates for windowed scoring';
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.token_window_buckets_mv
+TO xrp_watchdog.token_window_buckets AS
+SELECT
+  toStartOfFifteenMinutes(time) AS bucket,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trades,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  uniqState(CAST(taker AS String)) AS takers,
+  avgState(exec_price) AS price_avg,
+  varPopState(exec_price) AS price_var,
+  avgState(abs(exec_xrp)) AS size_avg,
+  varPopState(abs(exec_xrp)) AS size_var,
+  min(time) AS first_trade,
+  max(time) AS last_trade
+FROM xrp_watchdog.executed_trades
+GROUP BY bucket, token_code, token_issuer;
+
+-- ============================================
+-- Step 2: Backfill the last 8 days
+-- ============================================
+
+INSERT INTO xrp_watchdog.token_window_buckets
+SELECT
+  toStartOfFifteenMinutes(time) AS bucket,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trades,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  uniqState(CAST(taker AS String)) AS takers,
+  avgState(exec_price) AS price_avg,
+  varPopState(exec_price) AS price_var,
+  avgState(abs(exec_xrp)) AS size_avg,
+  varPopState(abs(exec_xrp)) AS size_var,
+  min(time) AS first_trade,
+  max(time) AS last_trade
+FROM xrp_watchdog.executed_trades
+WHERE time >= now() - INTERVAL 8 DAY
+GROUP BY bucket, token_code, token_issuer;
+
+-- ============================================
+-- Step 3: Windowed columns on token_stats
+-- ============================================
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS trades_24h UInt32 DEFAULT 0 COMMENT 'Trades in 24h pattern window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS unique_takers_24h UInt32 DEFAULT 0 COMMENT 'Distinct takers in 24h window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS volume_xrp_24h Float64 DEFAULT 0 COMMENT 'XRP volume in 24h window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS volume_xrp_7d Float64 DEFAULT 0 COMMENT 'XRP volume in 7d impact window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS price_variance_24h Float64 DEFAULT 0 COMMENT 'Price stddev/avg % in 24h window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS trades_per_hour_24h Float64 DEFAULT 0 COMMENT 'Trades per active hour in 24h window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS duration_minutes_24h Float64 DEFAULT 0 COMMENT 'First to last trade in 24h window';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS risk_score_24h Float32 DEFAULT 0 COMMENT 'Risk score over 24h window (0-100)';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS burst_score_24h Float32 DEFAULT 0 COMMENT 'Burst score over 24h window (0-100)';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS impact_factor Float32 DEFAULT 0 COMMENT 'log10(volume_xrp_7d / 10 + 1), capped at 1';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS final_priority Float32 DEFAULT 0 COMMENT 'risk_score_24h x impact_factor';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS window_end DateTime DEFAULT now() COMMENT 'End of the windows used for the *_24h / *_7d columns';
+
+-- Verification Queries
+-- SELECT token_code, trades_24h, volume_xrp_24h, volume_xrp_7d, risk_score_24h, final_priority
+-- FROM xrp_watchdog.token_stats ORDER BY risk_score_24h DESC LIMIT 10;
@@ -0,0 +1,104 @@
+-- Migration 009: Mergeable distinct-count sketches for token statistics
+-- Date: 2025-11-13
+-- Description: Hourly per-token buckets holding uniqCombined sketches of tx_hash, taker,
+--              counterparties and ledger_index, plus the additive token_base metrics
+-- Purpose: token_base in TokenAnalyzer computes four exact COUNT(DISTINCT ...) over the
+--          whole executed_trades table on every run. With --sketch the analyzer merges
+--          these buckets instead (any window, no rescan of raw trades).
+-- Error bound: uniqCombined(17) is exact while a bucket's set is small (array / hash
+--          table phases) and switches to a 2^17-cell HyperLogLog above that, with a
+--          relative standard error of ~0.3% (1.04 / sqrt(2^17)), i.e. within ~1% at
+--          three sigma. Merging buckets does not add error.
+--          Check against exact counts with: token_analyzer.py --compare-sketches
+-- Note: Stop collection while running the backfill (Step 2).
+
+-- ============================================
+-- Step 1: Create sketch table and materialized view
+-- ============================================
+-- Same row set as token_base (exec_iou_code != '' AND exec_xrp != 0).
+-- Always re-aggregate when reading (uniqCombinedMerge(17), avgMerge, stddevPopMerge).
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_sketch_buckets (
+  hour DateTime COMMENT 'Start of hour (toStartOfHour(time))',
+  token_code LowCardinality(String) COMMENT 'IOU currency code',
+  token_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  trade_rows SimpleAggregateFunction(sum, UInt64) COMMENT 'Rows in bucket (not distinct)',
+  tx_hashes AggregateFunction(uniqCombined(17), FixedString(32)) COMMENT 'Distinct tx_hash sketch',
+  takers AggregateFunction(uniqCombined(17), String) COMMENT 'Distinct taker sketch',
+  counterparties AggregateFunction(uniqCombinedArray(17), Array(String)) COMMENT 'Distinct counterparty sketch',
+  ledgers AggregateFunction(uniqCombined(17), UInt32) COMMENT 'Distinct ledger_index sketch',
+  volume_xrp SimpleAggregateFunction(sum, Float64) COMMENT 'Sum of abs(exec_xrp)',
+  volume_token SimpleAggregateFunction(sum, Float64) COMMENT 'Sum of exec_iou',
+  price_avg AggregateFunction(avg, Float64) COMMENT 'avgMerge(exec_price)',
+  price_stddev AggregateFunction(stddevPop, Float64) COMMENT 'stddevPopMerge(exec_price)',
+  size_avg AggregateFunction(avg, Float64) COMMENT 'avgMerge(abs(exec_xrp))',
+  size_stddev AggregateFunction(stddevPop, Float64) COMMENT 'stddevPopMerge(abs(exec_xrp))',
+  first_trade SimpleAggregateFunction(min, DateTime64(3)) COMMENT 'First trade time in bucket',
+  last_trade SimpleAggregateFunction(max, DateTime64(3)) COMMENT 'Last trade time in bucket'
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (token_code, token_issuer, hour)
+TTL hour + INTERVAL 90 DAY
+COMMENT 'Hourly per-token distinct-count sketches for TokenAnalyzer --sketch';
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.token_sketch_buckets_mv
+TO xrp_watchdog.token_sketch_buckets AS
+SELECT
+  toStartOfHour(time) AS hour,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trade_rows,
+  uniqCombinedState(17)(tx_hash) AS tx_hashes,
+  uniqCombinedState(17)(CAST(taker AS String)) AS takers,
+  uniqCombinedArrayState(17)(CAST(counterparties AS Array(String))) AS counterparties,
+  uniqCombinedState(17)(ledger_index) AS ledgers,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  sum(exec_iou) AS volume_token,
+  avgState(exec_price) AS price_avg,
+  stddevPopState(exec_price) AS price_stddev,
+  avgState(abs(exec_xrp)) AS size_avg,
+  stddevPopState(abs(exec_xrp)) AS size_stddev,
+  min(time) AS first_trade,
+  max(time) AS last_trade
+FROM xrp_watchdog.executed_trades
+WHERE exec_iou_code != ''
+  AND exec_xrp != 0
+GROUP BY hour, token_code, token_issuer;
+
+-- ============================================
+-- Step 2: Backfill from existing trades
+-- ============================================
+
+INSERT INTO xrp_watchdog.token_sketch_buckets
+SELECT
+  toStartOfHour(time) AS hour,
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  count() AS trade_rows,
+  uniqCombinedState(17)(tx_hash) AS tx_hashes,
+  uniqCombinedState(17)(CAST(taker AS String)) AS takers,
+  uniqCombinedArrayState(17)(CAST(counterparties AS Array(String))) AS counterparties,
+  uniqCombinedState(17)(ledger_index) AS ledgers,
+  sum(abs(exec_xrp)) AS volume_xrp,
+  sum(exec_iou) AS volume_token,
+  avgState(exec_price) AS price_avg,
+  stddevPopState(exec_price) AS price_stddev,
+  avgState(abs(exec_xrp)) AS size_avg,
+  stddevPopState(abs(exec_xrp)) AS size_stddev,
+  min(time) AS first_trade,
+  max(time) AS last_trade
+FROM xrp_watchdog.executed_trades
+WHERE exec_iou_code != ''
+  AND exec_xrp != 0
+GROUP BY hour, token_code, token_issuer;
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- Row totals must match exactly (sketches only approximate the distinct counts):
+-- SELECT sum(trade_rows), sum(volume_xrp) FROM xrp_watchdog.token_sketch_buckets;
+-- SELECT count(), sum(abs(exec_xrp)) FROM xrp_watchdog.executed_trades
+-- WHERE exec_iou_code != '' AND exec_xrp != 0;
+--
+-- Distinct-count accuracy per token:
+-- python3 analyzers/token_analyzer.py --compare-sketches
@@ -0,0 +1,79 @@
+-- Migration 010: detection_alerts columns for real-time detectors
+-- Date: 2025-11-14
+-- Description: Define detection_alerts (kept from the original deployment but never
+--              written) with the columns used by the in-collector token monitor
+-- Purpose: TradeCollector now keeps online per-token statistics and writes an alert as
+--          soon as a threshold is crossed, instead of waiting for the batch analyzer.
+-- Note: The table may already exist from the original deployment (schema.sql keeps it);
+--       the ALTERs add any missing columns.
+
+-- ============================================
+-- Step 1: Create table (fresh installs)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.detection_alerts (
+  alert_time DateTime64(3) COMMENT 'When the alert was raised',
+  trade_time DateTime64(3) COMMENT 'Ledger close time of the triggering trades',
+  ledger_index UInt32 COMMENT 'Ledger that triggered the alert',
+  detector LowCardinality(String) COMMENT 'Emitting component, e.g. token_monitor',
+  alert_type LowCardinality(String) COMMENT 'burst, price_precision, size_uniformity, taker_concentration',
+  severity Enum8('low' = 1, 'medium' = 2, 'high' = 3, 'critical' = 4) COMMENT 'Alert severity',
+  token_code LowCardinality(String) COMMENT 'IOU currency code',
+  token_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  account String COMMENT 'Account involved (top taker for concentration alerts)',
+  value Float64 COMMENT 'Observed metric value',
+  threshold Float64 COMMENT 'Threshold that was crossed',
+  details String COMMENT 'JSON snapshot of the statistics behind the alert'
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(alert_time)
+ORDER BY (alert_time, alert_type, token_code, token_issuer)
+TTL toDateTime(alert_time) + INTERVAL 90 DAY
+COMMENT 'Alerts raised by streaming and batch detectors';
+
+-- ============================================
+-- Step 2: Add columns to a pre-existing table
+-- ============================================
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS alert_time DateTime64(3) COMMENT 'When the alert was raised';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS trade_time DateTime64(3) COMMENT 'Ledger close time of the triggering trades';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS ledger_index UInt32 COMMENT 'Ledger that triggered the alert';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS detector LowCardinality(String) COMMENT 'Emitting component, e.g. token_monitor';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS alert_type LowCardinality(String) COMMENT 'burst, price_precision, size_uniformity, taker_concentration';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS severity Enum8('low' = 1, 'medium' = 2, 'high' = 3, 'critical' = 4) COMMENT 'Alert severity';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS token_code LowCardinality(String) COMMENT 'IOU currency code';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS token_issuer LowCardinality(String) COMMENT 'IOU issuer';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS account String COMMENT 'Account involved (top taker for concentration alerts)';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS value Float64 COMMENT 'Observed metric value';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS threshold Float64 COMMENT 'Threshold that was crossed';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS details String COMMENT 'JSON snapshot of the statistics behind the alert';
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- DESCRIBE TABLE xrp_watchdog.detection_alerts;
+--
+-- SELECT alert_time, alert_type, severity, token_code, account, value, threshold
+-- FROM xrp_watchdog.detection_alerts ORDER BY alert_time DESC LIMIT 20;
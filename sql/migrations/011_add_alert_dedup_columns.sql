@@ -0,0 +1,33 @@
+-- Migration 011: Alert deduplication metadata on detection_alerts
+-- Date: 2025-11-15
+-- Description: Columns written by AlertManager (collectors/alert_manager.py)
+-- Purpose: Detectors submit candidate alerts on every run; AlertManager deduplicates
+--          them per key (detector, alert_type, token, account) within a 6-hour window,
+--          escalates severity when the score rises, rate-limits each key and coalesces
+--          alerts for the same token into one row. Its in-memory index is rebuilt from
+--          these columns on start.
+
+-- ============================================
+-- Step 1: Add columns
+-- ============================================
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS score Float32 DEFAULT 0 COMMENT 'Detector score (0-100), drives escalation';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS related_types Array(LowCardinality(String)) COMMENT 'Other alert types coalesced into this row';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS escalated UInt8 DEFAULT 0 COMMENT '1 if written because the score / severity rose';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS suppressed UInt32 DEFAULT 0 COMMENT 'Duplicates suppressed since the previous row for this key';
+
+ALTER TABLE xrp_watchdog.detection_alerts
+ADD COLUMN IF NOT EXISTS first_seen DateTime64(3) DEFAULT alert_time COMMENT 'First candidate of the current dedup window';
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+-- SELECT alert_time, alert_type, related_types, severity, score, escalated, suppressed
+-- FROM xrp_watchdog.detection_alerts ORDER BY alert_time DESC LIMIT 20;
@@ -0,0 +1,74 @@
+-- Migration 012: token_whitelist dictionaries and version stamp
+-- Date: 2025-11-16
+-- Description: Expose token_whitelist as in-memory dictionaries (dictHas / dictGet)
+--              and add whitelist_version, bumped by scripts/manage_whitelist.py
+-- Purpose: Whitelist checks were a LEFT JOIN in the analyzer and NOT IN subqueries in
+--          the dashboard queries, re-reading token_whitelist on every query. Dictionary
+--          lookups are O(1) hash probes; the analyzer keeps its own cached copy and
+--          reloads it only when whitelist_version changes.
+-- Note: Dictionaries reload when whitelist_version changes (checked every 30-60s);
+--       manage_whitelist.py also runs SYSTEM RELOAD DICTIONARY for immediate effect.
+
+-- ============================================
+-- Step 1: Version stamp
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.whitelist_version (
+  version UInt64 COMMENT 'Incremented on every whitelist change',
+  updated_at DateTime DEFAULT now() COMMENT 'When the change was made',
+  updated_by String DEFAULT 'system' COMMENT 'Who made the change'
+) ENGINE = MergeTree()
+ORDER BY version
+COMMENT 'Whitelist change counter (dictionary and analyzer cache invalidation)';
+
+INSERT INTO xrp_watchdog.whitelist_version (version, updated_by)
+SELECT 1, 'migration_012'
+WHERE (SELECT count() FROM xrp_watchdog.whitelist_version) = 0;
+
+-- ============================================
+-- Step 2: Token dictionary (token_code, token_issuer)
+-- ============================================
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.token_whitelist_dict (
+  token_code String,
+  token_issuer String,
+  token_name String DEFAULT '',
+  category String DEFAULT ''
+)
+PRIMARY KEY token_code, token_issuer
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT token_code, token_issuer, any(token_name) AS token_name, toString(any(category)) AS category FROM xrp_watchdog.token_whitelist GROUP BY token_code, token_issuer'
+  INVALIDATE_QUERY 'SELECT max(version) FROM xrp_watchdog.whitelist_version'
+))
+LIFETIME(MIN 30 MAX 60)
+LAYOUT(COMPLEX_KEY_HASHED())
+COMMENT 'token_whitelist by (token_code, token_issuer)';
+
+-- ============================================
+-- Step 3: Issuer dictionary (dashboard queries whitelist whole issuers)
+-- ============================================
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.token_whitelist_issuer_dict (
+  token_issuer String,
+  category String DEFAULT ''
+)
+PRIMARY KEY token_issuer
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT token_issuer, toString(any(category)) AS category FROM xrp_watchdog.token_whitelist GROUP BY token_issuer'
+  INVALIDATE_QUERY 'SELECT max(version) FROM xrp_watchdog.whitelist_version'
+))
+LIFETIME(MIN 30 MAX 60)
+LAYOUT(COMPLEX_KEY_HASHED())
+COMMENT 'token_whitelist issuers';
+
+-- ============================================
+-- Verification
+-- ============================================
+
+-- SELECT name, status, element_count, last_successful_update_time
+-- FROM system.dictionaries WHERE database = 'xrp_watchdog';
+--
+-- SELECT dictHas('xrp_watchdog.token_whitelist_dict',
+--                ('524C555344000000000000000000000000000000', 'rMxCKbEDwqr76QuheSUMdEGf4B9xJ8m5De'));
+--
+-- SELECT dictHas('xrp_watchdog.token_whitelist_issuer_dict', tuple('rMxCKbEDwqr76QuheSUMdEGf4B9xJ8m5De'));
@@ -0,0 +1,86 @@
+-- Migration 013: token_registry (pre-decoded token display names)
+-- Date: 2025-11-16
+-- Description: One row per (token_code, token_issuer) with the decoded display name,
+--              short issuer, first-seen ledger and a UTF-8 validity flag, served as
+--              the token_registry_dict dictionary
+-- Purpose: Display queries decoded 40-char hex currency codes on every row
+--          (unhex + isValidUTF8 + replaceRegexpAll); the same ~1000 tokens were
+--          decoded millions of times a day. New tokens are registered at ingest by
+--          collectors/token_registry.py and queries use dictGetOrDefault instead.
+-- Note: Step 3 backfills existing tokens from executed_trades (safe to re-run:
+--       ReplacingMergeTree collapses duplicates, the dictionary takes min ledger)
+
+-- ============================================
+-- Step 1: Registry table
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_registry (
+  token_code String COMMENT 'IOU currency code (3-char or 40-char hex)',
+  token_issuer String COMMENT 'IOU issuer',
+  display_name String COMMENT 'Decoded, upper-cased name ($XXXX...YYYY if not valid UTF-8)',
+  issuer_short String COMMENT 'First 10 chars of the issuer plus ...',
+  first_seen_ledger UInt32 COMMENT 'Ledger of the first collected trade',
+  is_valid_utf8 UInt8 COMMENT '1 if the code decodes as UTF-8 (always 1 for 3-char codes)',
+  registered_at DateTime DEFAULT now() COMMENT 'When the row was written'
+) ENGINE = ReplacingMergeTree(registered_at)
+ORDER BY (token_code, token_issuer)
+COMMENT 'Token display names decoded once at ingest (see token_registry_dict)';
+
+-- ============================================
+-- Step 2: Dictionary
+-- ============================================
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.token_registry_dict (
+  token_code String,
+  token_issuer String,
+  display_name String DEFAULT '',
+  issuer_short String DEFAULT '',
+  first_seen_ledger UInt32 DEFAULT 0,
+  is_valid_utf8 UInt8 DEFAULT 0
+)
+PRIMARY KEY token_code, token_issuer
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT token_code, token_issuer, any(display_name) AS display_name, any(issuer_short) AS issuer_short, min(first_seen_ledger) AS first_seen_ledger, any(is_valid_utf8) AS is_valid_utf8 FROM xrp_watchdog.token_registry GROUP BY token_code, token_issuer'
+  INVALIDATE_QUERY 'SELECT count() FROM xrp_watchdog.token_registry'
+))
+LIFETIME(MIN 60 MAX 300)
+LAYOUT(COMPLEX_KEY_HASHED())
+COMMENT 'token_registry by (token_code, token_issuer)';
+
+-- ============================================
+-- Step 3: Backfill from executed_trades
+-- ============================================
+
+INSERT INTO xrp_watchdog.token_registry
+  (token_code, token_issuer, display_name, issuer_short, first_seen_ledger, is_valid_utf8)
+SELECT
+  exec_iou_code,
+  exec_iou_issuer,
+  CASE
+    WHEN length(exec_iou_code) = 40 THEN
+      CASE
+        WHEN isValidUTF8(unhex(exec_iou_code)) THEN upper(replaceRegexpAll(unhex(exec_iou_code), '\0', ''))
+        ELSE concat('$', substring(exec_iou_code, 1, 4), '...', substring(exec_iou_code, 37, 4))
+      END
+    ELSE upper(exec_iou_code)
+  END,
+  concat(substring(exec_iou_issuer, 1, 10), '...'),
+  min(ledger_index),
+  IF(length(exec_iou_code) = 40, isValidUTF8(unhex(exec_iou_code)), 1)
+FROM xrp_watchdog.executed_trades
+WHERE exec_iou_code != ''
+GROUP BY exec_iou_code, exec_iou_issuer;
+
+SYSTEM RELOAD DICTIONARY xrp_watchdog.token_registry_dict;
+
+-- ============================================
+-- Verification
+-- ============================================
+
+-- SELECT count(), countIf(is_valid_utf8 = 0) FROM xrp_watchdog.token_registry FINAL;
+--
+-- SELECT name, status, element_count, last_successful_update_time
+-- FROM system.dictionaries WHERE name = 'token_registry_dict';
+--
+-- SELECT dictGet('xrp_watchdog.token_registry_dict', 'display_name',
+--                ('524C555344000000000000000000000000000000', 'rMxCKbEDwqr76QuheSUMdEGf4B9xJ8m5De'));
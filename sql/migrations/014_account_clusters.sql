@@ -0,0 +1,75 @@
+-- Migration 014: Account clusters (Sybil-aware entity counts)
+-- Date: 2025-11-17
+-- Description: account_clusters maps accounts to entities merged by
+--              collectors/account_clustering.py (incremental union-find);
+--              account_funding caches each account's activating Payment;
+--              token_stats gains unique_entities
+-- Purpose: unique_takers drives 30 of the 100 risk points and is cheap to inflate
+--          by spreading wash trades over freshly funded accounts. Accounts sharing
+--          a funder, always trading against the same counterparty, or repeating the
+--          same exact trade size are counted as one entity.
+-- Note: Only accounts in multi-account entities have rows; any other account is its
+--       own entity (dictGetOrDefault(..., taker)). Rebuild the mapping with
+--       python collectors/account_clustering.py --rebuild
+
+-- ============================================
+-- Step 1: Account -> entity mapping
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.account_clusters (
+  account String COMMENT 'XRPL account',
+  entity_id String COMMENT 'Representative account of the entity (union-find root)',
+  signal LowCardinality(String) COMMENT 'Merge that last moved the account: funding, counterparty, trade_size',
+  updated_at DateTime64(3) COMMENT 'When the mapping was written (latest row wins)'
+) ENGINE = ReplacingMergeTree(updated_at)
+ORDER BY account
+COMMENT 'Account clustering (union-find entities), see collectors/account_clustering.py';
+
+-- ============================================
+-- Step 2: Funding source cache
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.account_funding (
+  account String COMMENT 'XRPL account',
+  funder String COMMENT 'Sender of the Payment that created the account (empty if not in node history)',
+  funded_ledger UInt32 COMMENT 'Ledger of the activating Payment (0 if unknown)',
+  looked_up_at DateTime DEFAULT now() COMMENT 'When account_tx was queried'
+) ENGINE = ReplacingMergeTree(looked_up_at)
+ORDER BY account
+COMMENT 'Activating Payment per account (looked up once via account_tx)';
+
+-- ============================================
+-- Step 3: Dictionary
+-- ============================================
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.account_clusters_dict (
+  account String,
+  entity_id String DEFAULT ''
+)
+PRIMARY KEY account
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT account, argMax(entity_id, updated_at) AS entity_id FROM xrp_watchdog.account_clusters GROUP BY account'
+  INVALIDATE_QUERY 'SELECT max(updated_at) FROM xrp_watchdog.account_clusters'
+))
+LIFETIME(MIN 60 MAX 300)
+LAYOUT(COMPLEX_KEY_HASHED())
+COMMENT 'account_clusters by account';
+
+-- ============================================
+-- Step 4: token_stats column
+-- ============================================
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS unique_entities UInt32 DEFAULT unique_takers COMMENT 'Distinct taker entities (account_clusters), drives the token focus score';
+
+-- ============================================
+-- Verification
+-- ============================================
+
+-- SELECT entity_id, count() as accounts, groupUniqArray(signal) as signals
+-- FROM xrp_watchdog.account_clusters FINAL
+-- GROUP BY entity_id ORDER BY accounts DESC LIMIT 20;
+--
+-- SELECT token_code, unique_takers, unique_entities, risk_score
+-- FROM xrp_watchdog.token_stats
+-- WHERE unique_entities < unique_takers ORDER BY risk_score DESC LIMIT 20;
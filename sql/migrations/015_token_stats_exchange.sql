@@ -0,0 +1,57 @@
+-- Migration 015: Atomic token_stats publication
+-- Date: 2025-11-18
+-- Description: Rebuild token_stats ordered by (token_code, token_issuer) and add
+--              token_stats_staging, which the analyzer fills and swaps in with
+--              EXCHANGE TABLES
+-- Purpose: The analyzer used to TRUNCATE token_stats and then insert, so panels saw
+--          an empty or partial table for the length of the insert, and a crash in
+--          between left it empty until the next run. The sort key still led with
+--          risk_score (risk_score_v2 in migration 001), which changes every run and
+--          made the ReplacingMergeTree key useless for per-token lookups.
+-- Note: EXCHANGE TABLES needs an Atomic database (the default engine since 20.10).
+--       The previous layout is kept as token_stats_v2 until you have verified the copy.
+
+-- ============================================
+-- Step 1: Create table with the new sort key
+-- ============================================
+-- Same columns (and comments) as the current token_stats
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_stats_v3 AS xrp_watchdog.token_stats
+ENGINE = ReplacingMergeTree(last_updated)
+ORDER BY (token_code, token_issuer)
+COMMENT 'Aggregated token statistics (published by the analyzer with EXCHANGE TABLES)';
+
+-- ============================================
+-- Step 2: Copy the current scores
+-- ============================================
+
+INSERT INTO xrp_watchdog.token_stats_v3
+SELECT * FROM xrp_watchdog.token_stats;
+
+-- ============================================
+-- Step 3: Swap tables (previous layout kept as token_stats_v2)
+-- ============================================
+
+RENAME TABLE
+  xrp_watchdog.token_stats TO xrp_watchdog.token_stats_v2,
+  xrp_watchdog.token_stats_v3 TO xrp_watchdog.token_stats;
+
+-- ============================================
+-- Step 4: Staging table
+-- ============================================
+-- Rebuilt from token_stats at the start of every analyzer run (so it follows later
+-- ALTERs); after the swap it holds the previous snapshot until the next run
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_stats_staging AS xrp_watchdog.token_stats;
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+
+-- SELECT name, engine, sorting_key, total_rows FROM system.tables
+-- WHERE database = 'xrp_watchdog' AND name LIKE 'token_stats%';
+--
+-- SELECT count(), max(last_updated) FROM xrp_watchdog.token_stats;
+--
+-- After verifying:
+-- DROP TABLE xrp_watchdog.token_stats_v2;
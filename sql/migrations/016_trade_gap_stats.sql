@@ -0,0 +1,108 @@
+-- Migration 016: Inter-trade gap quantiles and peak trade rate
+-- Date: 2025-11-19
+-- Description: token_trade_seconds holds trades per token per second (maintained at
+--              ingest by a materialized view); token_stats gains exact gap quantiles
+--              and the peak trades in any sliding 60-second window
+-- Purpose: avg_time_gap_seconds and trade_density average over the whole active
+--          span, so 500 trades in 5 minutes followed by a quiet week look calm.
+--          Ledger close times have 1-second resolution, so per-second counts give
+--          the exact gap distribution (trades sharing a second are 0s apart) while
+--          holding at most one row per token per ledger. The analyzer reads them in
+--          key order with window functions; cost follows active seconds, not trades.
+-- Note: Step 3 backfills one executed_trades partition at a time (run_migration.py)
+--       while collection continues. Its cutoff is on insertion time (inserted_at,
+--       Step 1), taken on a second boundary right before the materialized view is
+--       created: rows inserted before it are backfilled, rows inserted after it are
+--       counted by the view only, whatever their ledger close time.
+
+-- ============================================
+-- Step 1: executed_trades insertion time
+-- ============================================
+-- Existing rows are stamped 1970-01-01: a missing column is computed from the
+-- current default on read, so the constant is written into existing parts before
+-- the default changes to now(). The MATERIALIZE waits for the mutation.
+
+ALTER TABLE xrp_watchdog.executed_trades
+ADD COLUMN IF NOT EXISTS inserted_at DateTime DEFAULT toDateTime(0)
+  CODEC(Delta, ZSTD(1)) COMMENT 'When the row was written (backfill cutoff, incremental reader watermark)';
+
+ALTER TABLE xrp_watchdog.executed_trades MATERIALIZE COLUMN inserted_at
+SETTINGS mutations_sync = 2;
+
+ALTER TABLE xrp_watchdog.executed_trades
+MODIFY COLUMN inserted_at DEFAULT now();
+
+-- ============================================
+-- Step 2: Create per-second table and materialized view
+-- ============================================
+-- Same row set as the analyzer's exact base statistics
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.token_trade_seconds (
+  token_code LowCardinality(String) COMMENT 'IOU currency code',
+  token_issuer LowCardinality(String) COMMENT 'IOU issuer',
+  second DateTime COMMENT 'Ledger close time (second resolution)',
+  trades UInt64 COMMENT 'Trades in this second'
+) ENGINE = SummingMergeTree(trades)
+PARTITION BY toYYYYMM(second)
+ORDER BY (token_code, token_issuer, second)
+TTL second + INTERVAL 90 DAY
+COMMENT 'Trades per token per second (gap quantiles and peak rate)';
+
+-- migrate:cutoff
+CREATE MATERIALIZED VIEW IF NOT EXISTS xrp_watchdog.token_trade_seconds_mv
+TO xrp_watchdog.token_trade_seconds AS
+SELECT
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  toDateTime(time) AS second,
+  count() AS trades
+FROM xrp_watchdog.executed_trades
+WHERE exec_iou_code != ''
+  AND exec_xrp != 0
+GROUP BY token_code, token_issuer, second;
+
+-- ============================================
+-- Step 3: Backfill
+-- ============================================
+-- Rows inserted before the view existed
+
+-- migrate:backfill executed_trades
+INSERT INTO xrp_watchdog.token_trade_seconds
+SELECT
+  exec_iou_code AS token_code,
+  exec_iou_issuer AS token_issuer,
+  toDateTime(time) AS second,
+  count() AS trades
+FROM xrp_watchdog.executed_trades
+WHERE _partition_id = {partition_id:String}
+  AND inserted_at < {cutoff:DateTime64(3)}
+  AND exec_iou_code != ''
+  AND exec_xrp != 0
+GROUP BY token_code, token_issuer, second;
+
+-- ============================================
+-- Step 4: token_stats columns
+-- ============================================
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS gap_p10_seconds Float64 DEFAULT 0 COMMENT '10th percentile of seconds between consecutive trades';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS gap_p50_seconds Float64 DEFAULT 0 COMMENT 'Median seconds between consecutive trades';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS gap_p90_seconds Float64 DEFAULT 0 COMMENT '90th percentile of seconds between consecutive trades';
+
+ALTER TABLE xrp_watchdog.token_stats
+ADD COLUMN IF NOT EXISTS peak_trades_per_minute UInt32 DEFAULT 0 COMMENT 'Most trades in any sliding 60-second window (drives burst_score)';
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+
+-- SELECT count(), sum(trades) FROM xrp_watchdog.token_trade_seconds;
+-- SELECT count() FROM xrp_watchdog.executed_trades WHERE exec_iou_code != '' AND exec_xrp != 0;
+--
+-- SELECT token_code, total_trades, trade_density, peak_trades_per_minute,
+--        gap_p10_seconds, gap_p50_seconds, gap_p90_seconds, burst_score
+-- FROM xrp_watchdog.token_stats ORDER BY peak_trades_per_minute DESC LIMIT 20;
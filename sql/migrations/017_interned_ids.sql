@@ -0,0 +1,120 @@
+-- Migration 017: Interned account and token IDs
+-- Date: 2025-11-20
+-- Description: executed_trades stores taker_id, counterparty_ids and token_id
+--              (cityHash64 of the account / (code, issuer) strings) next to the
+--              strings; account_ids and token_registry.token_id map them back
+-- Purpose: The pair and self-trader queries group on taker, arrayJoin(counterparties)
+--          and join the result to itself on ~34-char base58 strings. Hashing and
+--          comparing 8-byte integers is several times cheaper in joins and GROUP BY.
+--          This is not a storage saving: random 64-bit hashes barely compress, and
+--          the ID columns are stored next to the strings. Names are decoded with
+--          account_names_dict / token_ids_dict after aggregation.
+-- Note: IDs are a pure function of the strings (MATERIALIZED columns), so every
+--       writer computes the same ID without coordination; registry rows are only
+--       needed to decode and are written at ingest by collectors/account_registry.py
+--       and collectors/token_registry.py. Re-running any step is safe.
+
+-- ============================================
+-- Step 1: Account registry (ID -> address)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS xrp_watchdog.account_ids (
+  account String COMMENT 'XRPL account',
+  account_id UInt64 DEFAULT cityHash64(account) COMMENT 'cityHash64(account), as in executed_trades.taker_id',
+  registered_at DateTime DEFAULT now() COMMENT 'When the row was written'
+) ENGINE = ReplacingMergeTree(registered_at)
+ORDER BY account
+COMMENT 'Interned account IDs (see account_names_dict)';
+
+INSERT INTO xrp_watchdog.account_ids (account)
+SELECT DISTINCT arrayJoin(arrayPushFront(CAST(counterparties AS Array(String)), CAST(taker AS String))) AS account
+FROM xrp_watchdog.executed_trades
+WHERE account != '';
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.account_names_dict (
+  account_id UInt64,
+  account String DEFAULT ''
+)
+PRIMARY KEY account_id
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT account_id, any(account) AS account FROM xrp_watchdog.account_ids GROUP BY account_id'
+  INVALIDATE_QUERY 'SELECT count() FROM xrp_watchdog.account_ids'
+))
+LIFETIME(MIN 60 MAX 300)
+LAYOUT(HASHED())
+COMMENT 'account_ids by account_id (decode IDs for display)';
+
+-- ============================================
+-- Step 2: Token IDs
+-- ============================================
+
+ALTER TABLE xrp_watchdog.token_registry
+ADD COLUMN IF NOT EXISTS token_id UInt64 MATERIALIZED cityHash64(token_code, token_issuer)
+  COMMENT 'cityHash64(token_code, token_issuer), as in executed_trades.token_id';
+
+ALTER TABLE xrp_watchdog.token_registry MATERIALIZE COLUMN token_id;
+
+CREATE DICTIONARY IF NOT EXISTS xrp_watchdog.token_ids_dict (
+  token_id UInt64,
+  token_code String DEFAULT '',
+  token_issuer String DEFAULT '',
+  display_name String DEFAULT ''
+)
+PRIMARY KEY token_id
+SOURCE(CLICKHOUSE(
+  QUERY 'SELECT token_id, any(token_code) AS token_code, any(token_issuer) AS token_issuer, any(display_name) AS display_name FROM xrp_watchdog.token_registry GROUP BY token_id'
+  INVALIDATE_QUERY 'SELECT count() FROM xrp_watchdog.token_registry'
+))
+LIFETIME(MIN 60 MAX 300)
+LAYOUT(HASHED())
+COMMENT 'token_registry by token_id (decode IDs for display)';
+
+-- ============================================
+-- Step 3: executed_trades ID columns
+-- ============================================
+-- MATERIALIZED: computed by the server on insert, writers cannot send other values
+
+ALTER TABLE xrp_watchdog.executed_trades
+ADD COLUMN IF NOT EXISTS taker_id UInt64 MATERIALIZED cityHash64(CAST(taker AS String))
+  CODEC(ZSTD(1)) COMMENT 'Interned taker (account_names_dict)'
+AFTER counterparty_count;
+
+ALTER TABLE xrp_watchdog.executed_trades
+ADD COLUMN IF NOT EXISTS counterparty_ids Array(UInt64)
+  MATERIALIZED arrayMap(a -> cityHash64(a), CAST(counterparties AS Array(String)))
+  CODEC(ZSTD(1)) COMMENT 'Interned counterparties, same order as counterparties'
+AFTER taker_id;
+
+ALTER TABLE xrp_watchdog.executed_trades
+ADD COLUMN IF NOT EXISTS token_id UInt64
+  MATERIALIZED if(exec_iou_code = '', 0, cityHash64(CAST(exec_iou_code AS String), CAST(exec_iou_issuer AS String)))
+  CODEC(ZSTD(1)) COMMENT 'Interned (exec_iou_code, exec_iou_issuer), 0 for XRP-only trades (token_ids_dict)'
+AFTER exec_iou_issuer;
+
+-- Existing parts compute the IDs on read until these (background) mutations finish
+ALTER TABLE xrp_watchdog.executed_trades MATERIALIZE COLUMN taker_id;
+ALTER TABLE xrp_watchdog.executed_trades MATERIALIZE COLUMN counterparty_ids;
+ALTER TABLE xrp_watchdog.executed_trades MATERIALIZE COLUMN token_id;
+
+SYSTEM RELOAD DICTIONARY xrp_watchdog.account_names_dict;
+SYSTEM RELOAD DICTIONARY xrp_watchdog.token_ids_dict;
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+
+-- Hash collisions (expected 0):
+-- SELECT count() - uniqExact(account_id) FROM (SELECT DISTINCT account, account_id FROM xrp_watchdog.account_ids);
+--
+-- Mutations still running:
+-- SELECT command, parts_to_do, is_done FROM system.mutations
+-- WHERE database = 'xrp_watchdog' AND table = 'executed_trades' AND NOT is_done;
+--
+-- Trades whose taker cannot be decoded (not registered yet):
+-- SELECT count() FROM xrp_watchdog.executed_trades
+-- WHERE dictGet('xrp_watchdog.account_names_dict', 'account', taker_id) = '';
+--
+-- Extra storage of the ID columns (they add to the strings, not replace them):
+-- SELECT name, type, compressed_bytes, uncompressed_bytes FROM system.columns
+-- WHERE database = 'xrp_watchdog' AND table = 'executed_trades'
+--   AND name IN ('taker', 'taker_id', 'counterparties', 'counterparty_ids');
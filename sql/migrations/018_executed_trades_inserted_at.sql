@@ -0,0 +1,17 @@
+-- Migration 018: executed_trades insertion time
+-- Date: 2025-11-21
+-- Description: Superseded; executed_trades.inserted_at is added by migration 016
+-- Purpose: 016 needs the column first: its backfill cuts off on insertion time so
+--          rows collected while it runs are not counted by both the backfill and
+--          the materialized view. Incremental readers
+--          (collectors/account_clustering.py) use the same column as their watermark.
+-- Note: No statements. Rerunning the old steps would be harmful: MATERIALIZE COLUMN
+--       recomputes rows whose value came from the default, which is now(), and so
+--       would restamp every row. Kept so the version stays recorded.
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+
+-- SELECT countIf(inserted_at = 0), countIf(inserted_at > 0), max(inserted_at)
+-- FROM xrp_watchdog.executed_trades;
@@ -0,0 +1,45 @@
+-- Migration 019: Account columns back to String
+-- Date: 2025-11-22
+-- Description: executed_trades.taker / counterparties and account_trades.account / peers
+--              change from LowCardinality(String) to String with ZSTD
+-- Purpose: Migration 005 made the account columns LowCardinality. Accounts have far
+--          more distinct values per part than low_cardinality_max_dictionary_size, so
+--          the dictionaries overflow and the columns pay dictionary upkeep on every
+--          merge and GROUP BY without the benefit. Token and issuer columns keep it.
+-- Note: Databases that ran 005 after it was corrected already have String columns;
+--       the MODIFY is then metadata only. Otherwise each statement is a background
+--       mutation rewriting one column (account is a sort key column: LowCardinality
+--       to String keeps the key representation, so ClickHouse allows it).
+
+-- ============================================
+-- Step 1: executed_trades
+-- ============================================
+
+ALTER TABLE xrp_watchdog.executed_trades
+MODIFY COLUMN taker String CODEC(ZSTD(1));
+
+ALTER TABLE xrp_watchdog.executed_trades
+MODIFY COLUMN counterparties Array(String) CODEC(ZSTD(1));
+
+-- ============================================
+-- Step 2: account_trades
+-- ============================================
+
+ALTER TABLE xrp_watchdog.account_trades
+MODIFY COLUMN account String CODEC(ZSTD(1));
+
+ALTER TABLE xrp_watchdog.account_trades
+MODIFY COLUMN peers Array(String) CODEC(ZSTD(1));
+
+-- ============================================
+-- Verification Queries
+-- ============================================
+
+-- SELECT table, name, type FROM system.columns
+-- WHERE database = 'xrp_watchdog'
+--   AND (table, name) IN (('executed_trades', 'taker'), ('executed_trades', 'counterparties'),
+--                         ('account_trades', 'account'), ('account_trades', 'peers'));
+--
+-- Mutations still running:
+-- SELECT table, command, parts_to_do, is_done FROM system.mutations
+-- WHERE database = 'xrp_watchdog' AND NOT is_done;
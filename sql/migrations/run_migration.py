@@ -1,27 +1,68 @@
 #!/usr/bin/env python3
 """
-Run SQL migration scripts
+XRP Watchdog - Migration Runner
+Applies sql/migrations/NNN_*.sql in order and records each applied migration
+with its SHA-256 checksum in schema_migrations. Statements preceded by a
+"-- migrate:backfill <table>" line are data migrations: they run once per
+partition of <table>, with progress in schema_migration_progress, so a copy
+over 90 days of executed_trades runs online in small inserts and resumes
+where it stopped.
+
+Backfill statements bind {partition_id:String} (filter on _partition_id) and
+may bind {cutoff:DateTime64(3)}. The cutoff is the migration start, or, when a
+statement is preceded by "-- migrate:cutoff", the second boundary taken right
+before that statement first runs. Marking the CREATE MATERIALIZED VIEW and
+filtering on insertion time leaves exactly the rows inserted after the view
+exists to the view:
+
+    -- migrate:cutoff
+    CREATE MATERIALIZED VIEW xrp_watchdog.some_table_mv TO xrp_watchdog.some_table AS ...;
+
+    -- migrate:backfill executed_trades
+    INSERT INTO xrp_watchdog.some_table
+    SELECT ... FROM xrp_watchdog.executed_trades
+    WHERE _partition_id = {partition_id:String}
+      AND inserted_at < {cutoff:DateTime64(3)};
 """
+
+import os
+import re
 import sys
+import glob
+import time
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional
 import clickhouse_connect
 
 CLICKHOUSE_HOST = "localhost"
 CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DB = "xrp_watchdog"
 
-def run_migration(migration_file: str):
-    """Run a SQL migration file"""
-    print(f"Running migration: {migration_file}")
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_PATTERN = re.compile(r"^(\d{3})_\w+\.sql$")
+BACKFILL_DIRECTIVE = re.compile(r"^--\s*migrate:backfill\s+(\w+)\s*$")
+CUTOFF_DIRECTIVE = re.compile(r"^--\s*migrate:cutoff\s*$")
+STATEMENT_END = re.compile(r";\s*(--[^']*)?$")  # ';' optionally followed by a trailing comment
+DEFAULT_BACKFILL_THREADS = 2      # max_threads per partition insert (leave CPU to ingestion)
 
-    # Read migration file
-    with open(migration_file, 'r') as f:
-        sql_content = f.read()
 
-    # Remove comments and split into statements
-    # ClickHouse doesn't support multi-statement execution well,
-    # so we need to execute each CREATE TABLE separately
+def parse_statements(sql_content: str) -> List[Dict]:
+    """
+    Split a migration file into statements
+
+    Comment lines and /* */ blocks are skipped; a statement ends with a line
+    ending in ';' (or '; -- comment'). A "-- migrate:backfill <table>" line
+    marks the next statement as a per-partition backfill over <table>, a
+    "-- migrate:cutoff" line takes the backfill cutoff right before it.
+
+    Returns:
+        List of {"sql": str, "backfill": table name or None, "cutoff": bool}
+    """
     statements = []
     current_statement = []
+    backfill = None
+    cutoff = False
     in_comment_block = False
 
     for line in sql_content.split('\n'):
@@ -34,7 +75,14 @@ def run_migration(migration_file: str):
         if in_comment_block:
             continue
 
-        # Skip single-line comments
+        # Directives, then single-line comments
+        directive = BACKFILL_DIRECTIVE.match(line.strip())
+        if directive:
+            backfill = directive.group(1)
+            continue
+        if CUTOFF_DIRECTIVE.match(line.strip()):
+            cutoff = True
+            continue
         if line.strip().startswith('--'):
             continue
 
@@ -43,48 +91,376 @@ def run_migration(migration_file: str):
             current_statement.append(line)
 
         # Check if statement is complete (ends with semicolon)
-        if line.strip().endswith(';'):
-            stmt = '\n'.join(current_statement)
-            if stmt.strip():
-                statements.append(stmt)
+        end = STATEMENT_END.search(line.strip())
+        if end:
+            if end.group(1):
+                current_statement[-1] = line[:line.rindex(end.group(1))]
+            stmt = '\n'.join(current_statement).strip().rstrip(';')
+            if stmt:
+                if backfill and '{partition_id:String}' not in stmt:
+                    raise ValueError(f"Backfill over {backfill} does not bind {{partition_id:String}}:\n{stmt}")
+                statements.append({"sql": stmt, "backfill": backfill, "cutoff": cutoff})
             current_statement = []
+            backfill = None
+            cutoff = False
+
+    return statements
+
+
+def checksum(path: str) -> str:
+    """SHA-256 of a migration file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def find_migrations(directory: str = MIGRATIONS_DIR) -> List[Dict]:
+    """Migration files (NNN_name.sql) in version order"""
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.sql"))):
+        match = MIGRATION_PATTERN.match(os.path.basename(path))
+        if match:
+            migrations.append({
+                "version": int(match.group(1)),
+                "name": os.path.basename(path),
+                "path": path,
+                "checksum": checksum(path)
+            })
+    return migrations
+
+
+class MigrationRunner:
+    def __init__(self, client=None, backfill_threads: int = DEFAULT_BACKFILL_THREADS,
+                 pause: float = 0.0):
+        """
+        Initialize runner (creates the tracking tables if needed)
+
+        Args:
+            client: ClickHouse client to use (default: new client)
+            backfill_threads: max_threads for each partition insert
+            pause: Seconds to sleep between backfill partitions
+        """
+        self.client = client or clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            database=CLICKHOUSE_DB
+        )
+        self.backfill_threads = backfill_threads
+        self.pause = pause
+        self.create_tracking_tables()
+
+    def create_tracking_tables(self):
+        """Create schema_migrations and schema_migration_progress"""
+        self.client.command("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version UInt32 COMMENT 'Migration number (NNN_ prefix)',
+              name String COMMENT 'Migration file name',
+              checksum String COMMENT 'SHA-256 of the file when applied',
+              mode Enum8('applied' = 1, 'baseline' = 2) COMMENT 'Run by the runner, or recorded as already applied',
+              statements UInt32 COMMENT 'Statements executed',
+              duration_seconds Float64 COMMENT 'Wall time of the run that completed it',
+              applied_at DateTime64(3) COMMENT 'When it was recorded'
+            ) ENGINE = ReplacingMergeTree(applied_at)
+            ORDER BY version
+            COMMENT 'Applied migrations (sql/migrations/run_migration.py)'
+        """)
+        self.client.command("""
+            CREATE TABLE IF NOT EXISTS schema_migration_progress (
+              version UInt32 COMMENT 'Migration number',
+              statement UInt32 COMMENT 'Statement number in the file (0 = migration start)',
+              partition_id String COMMENT 'Backfilled partition (empty = whole statement done)',
+              rows UInt64 COMMENT 'Rows written',
+              cutoff DateTime64(3) COMMENT 'Migration start (bound as the cutoff parameter)',
+              completed_at DateTime64(3) COMMENT 'When the step finished'
+            ) ENGINE = ReplacingMergeTree(completed_at)
+            ORDER BY (version, statement, partition_id)
+            COMMENT 'Completed statements and backfill partitions of unfinished migrations'
+        """)
+
+    def applied(self) -> Dict[int, Dict]:
+        """Applied migrations keyed by version"""
+        result = self.client.query("""
+            SELECT version, name, checksum, mode, applied_at
+            FROM schema_migrations FINAL
+            ORDER BY version
+        """)
+        return {row[0]: {"name": row[1], "checksum": row[2], "mode": row[3], "applied_at": row[4]}
+                for row in result.result_rows}
+
+    def progress(self, version: int) -> Dict:
+        """
+        Completed steps of a partially applied migration
+
+        Returns:
+            {"cutoff": datetime or None, "done": set of (statement, partition_id)}
+        """
+        result = self.client.query("""
+            SELECT statement, partition_id, cutoff
+            FROM schema_migration_progress FINAL
+            WHERE version = {version:UInt32}
+        """, parameters={"version": version})
+        cutoff = None
+        done = set()
+        for statement, partition_id, row_cutoff in result.result_rows:
+            if statement == 0:
+                cutoff = row_cutoff
+            else:
+                done.add((statement, partition_id))
+        return {"cutoff": cutoff, "done": done}
+
+    def record_progress(self, version: int, statement: int, partition_id: str, rows: int,
+                        cutoff: datetime):
+        """Mark a statement (or one partition of a backfill) as done"""
+        self.client.insert(
+            "schema_migration_progress",
+            [(version, statement, partition_id, rows, cutoff, datetime.now())],
+            column_names=["version", "statement", "partition_id", "rows", "cutoff", "completed_at"]
+        )
+
+    def next_second(self) -> datetime:
+        """Wait for the next whole second and return it (cutoff for a migrate:cutoff statement)"""
+        time.sleep(1 - time.time() % 1)
+        return datetime.now().replace(microsecond=0)
+
+    def record_applied(self, migration: Dict, mode: str, statements: int = 0, duration: float = 0.0):
+        """Record a migration in schema_migrations"""
+        self.client.insert(
+            "schema_migrations",
+            [(migration["version"], migration["name"], migration["checksum"], mode,
+              statements, round(duration, 3), datetime.now())],
+            column_names=["version", "name", "checksum", "mode", "statements",
+                          "duration_seconds", "applied_at"]
+        )
+
+    def partitions(self, table: str) -> List[tuple]:
+        """Active partitions of a table, oldest first: (partition_id, rows)"""
+        result = self.client.query("""
+            SELECT partition_id, sum(rows)
+            FROM system.parts
+            WHERE database = {database:String} AND table = {table:String} AND active
+            GROUP BY partition_id
+            ORDER BY partition_id
+        """, parameters={"database": CLICKHOUSE_DB, "table": table})
+        return result.result_rows
+
+    def backfill(self, migration: Dict, index: int, statement: Dict, cutoff: datetime,
+                 done: set) -> int:
+        """
+        Run a backfill statement partition by partition
+
+        Returns:
+            Rows written by this run
+        """
+        partitions = self.partitions(statement["backfill"])
+        pending = [(pid, rows) for pid, rows in partitions if (index, pid) not in done]
+        total_rows = sum(rows for _, rows in pending)
+        print(f"      Backfill over {statement['backfill']}: {len(pending)}/{len(partitions)} "
+              f"partitions pending ({total_rows:,} source rows)")
 
-    # Connect to ClickHouse
-    client = clickhouse_connect.get_client(
-        host=CLICKHOUSE_HOST,
-        port=CLICKHOUSE_PORT,
-        database=CLICKHOUSE_DB
-    )
-
-    # Execute each statement
-    for i, stmt in enumerate(statements, 1):
-        try:
-            # Extract statement type for logging
-            stmt_type = stmt.strip().split()[0:3]
-            stmt_desc = ' '.join(stmt_type)
+        written = read = 0
+        start = time.time()
+        for i, (partition_id, source_rows) in enumerate(pending, 1):
+            step_start = time.time()
+            summary = self.client.command(
+                statement["sql"],
+                parameters={"partition_id": partition_id, "cutoff": cutoff},
+                settings={"max_threads": self.backfill_threads}
+            )
+            rows = int(getattr(summary, "written_rows", 0) or 0)
+            self.record_progress(migration["version"], index, partition_id, rows, cutoff)
+            written += rows
+            read += source_rows
+
+            elapsed = time.time() - start
+            eta = elapsed / read * (total_rows - read) if read else 0
+            print(f"      [{i}/{len(pending)}] {partition_id}: {rows:,} rows "
+                  f"({time.time() - step_start:.1f}s, ETA {eta:.0f}s)")
+            if self.pause and i < len(pending):
+                time.sleep(self.pause)
+
+        return written
+
+    def apply(self, migration: Dict, dry_run: bool = False) -> bool:
+        """
+        Apply one migration, resuming after its last completed step
+
+        Returns:
+            True if the migration completed
+        """
+        with open(migration["path"]) as f:
+            statements = parse_statements(f.read())
+
+        print(f"→ {migration['name']} ({len(statements)} statements)")
+        if dry_run:
+            for i, stmt in enumerate(statements, 1):
+                kind = f"backfill over {stmt['backfill']}" if stmt["backfill"] else "statement"
+                print(f"  [{i}/{len(statements)}] {kind}: {' '.join(stmt['sql'].split()[:6])}...")
+            return True
+
+        state = self.progress(migration["version"])
+        cutoff = state["cutoff"]
+        if cutoff is None:
+            cutoff = datetime.now()
+            self.record_progress(migration["version"], 0, "", 0, cutoff)
+        elif state["done"]:
+            print(f"  Resuming (started {cutoff:%Y-%m-%d %H:%M:%S}, "
+                  f"{len(state['done'])} steps already done)")
+
+        start = time.time()
+        for i, stmt in enumerate(statements, 1):
+            if (i, "") in state["done"]:
+                continue
+            stmt_desc = ' '.join(stmt["sql"].split()[0:3])
             print(f"  [{i}/{len(statements)}] Executing: {stmt_desc}...")
+            if stmt["cutoff"] and (i, "cutoff") not in state["done"]:
+                # Taken once: a rerun keeps it, the statement may already have run
+                cutoff = self.next_second()
+                self.record_progress(migration["version"], 0, "", 0, cutoff)
+                self.record_progress(migration["version"], i, "cutoff", 0, cutoff)
+                print(f"      Backfill cutoff: {cutoff:%Y-%m-%d %H:%M:%S}")
+            try:
+                if stmt["backfill"]:
+                    rows = self.backfill(migration, i, stmt, cutoff, state["done"])
+                else:
+                    self.client.command(stmt["sql"])
+                    rows = 0
+            except Exception as e:
+                print(f"  ✗ Error: {e}")
+                print(f"  Migration not recorded; rerun to resume at statement {i}")
+                return False
+            self.record_progress(migration["version"], i, "", rows, cutoff)
+            print(f"  ✓ Success" + (f" ({rows:,} rows)" if stmt["backfill"] else ""))
 
-            client.command(stmt)
-            print(f"  ✓ Success")
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-            # Continue on error (some statements may already exist)
-            continue
+        self.record_applied(migration, "applied", len(statements), time.time() - start)
+        print(f"✓ {migration['name']} applied in {time.time() - start:.1f}s\n")
+        return True
 
-    print(f"\n✓ Migration complete!")
+    def check_checksums(self, migrations: List[Dict], applied: Dict[int, Dict]) -> List[Dict]:
+        """Applied migrations whose file changed since"""
+        return [m for m in migrations
+                if m["version"] in applied and applied[m["version"]]["checksum"] != m["checksum"]]
 
-    # Verify table was created
-    result = client.query("SELECT name, engine FROM system.tables WHERE database = 'xrp_watchdog' AND name = 'token_stats'")
-    if result.result_rows:
-        name, engine = result.result_rows[0]
-        print(f"✓ Table 'token_stats' created with engine: {engine}")
-    else:
-        print("⚠ Warning: token_stats table not found")
+    def up(self, target: Optional[int] = None, dry_run: bool = False,
+           allow_changed: bool = False) -> bool:
+        """
+        Apply pending migrations in order
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        migration_file = sys.argv[1]
-    else:
-        migration_file = "/home/grapedrop/monitoring/xrp-watchdog/sql/migrations/001_add_token_stats_v2.sql"
+        Args:
+            target: Stop after this version (default: all)
+            dry_run: Only list the statements that would run
+            allow_changed: Continue although applied migration files were edited
+
+        Returns:
+            True if every pending migration completed
+        """
+        migrations = find_migrations()
+        applied = self.applied()
+
+        changed = self.check_checksums(migrations, applied)
+        for m in changed:
+            print(f"⚠️  {m['name']} changed since it was applied (checksum mismatch)")
+        if changed and not allow_changed:
+            print("✗ Refusing to continue; restore the files or pass --allow-changed")
+            return False
+
+        pending = [m for m in migrations
+                   if m["version"] not in applied and (target is None or m["version"] <= target)]
+        if not pending:
+            print("✓ No pending migrations")
+            return True
+
+        print(f"{len(pending)} pending migration(s)\n")
+        for migration in pending:
+            if not self.apply(migration, dry_run):
+                return False
+        return True
 
-    run_migration(migration_file)
+    def baseline(self, through: int):
+        """Record migrations up to a version as applied without running them"""
+        applied = self.applied()
+        for migration in find_migrations():
+            if migration["version"] <= through and migration["version"] not in applied:
+                self.record_applied(migration, "baseline")
+                print(f"✓ Recorded {migration['name']} as applied (baseline)")
+
+    def print_status(self):
+        """List migrations with applied / pending / changed state"""
+        migrations = find_migrations()
+        applied = self.applied()
+        pending_progress = {}
+        result = self.client.query("""
+            SELECT version, countIf(statement > 0 AND partition_id = '') as statements,
+                   countIf(partition_id NOT IN ('', 'cutoff')) as partitions
+            FROM schema_migration_progress FINAL
+            GROUP BY version
+        """)
+        for version, statements, partitions in result.result_rows:
+            pending_progress[version] = (statements, partitions)
+
+        print(f"{'Migration':<40} {'State':<10} {'Applied at':<20} {'Checksum':<12}")
+        print("-" * 84)
+        for m in migrations:
+            record = applied.get(m["version"])
+            if record is None:
+                state, when = "pending", ""
+                if m["version"] in pending_progress:
+                    statements, partitions = pending_progress[m["version"]]
+                    state, when = "partial", f"{statements} stmts, {partitions} parts"
+            else:
+                state = "changed" if record["checksum"] != m["checksum"] else record["mode"]
+                when = record["applied_at"].strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{m['name'][:40]:<40} {state:<10} {when:<20} {m['checksum'][:12]:<12}")
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="XRP Watchdog Migration Runner")
+    parser.add_argument("files", nargs="*",
+                        help="Apply these migration files (default: all pending in sql/migrations/)")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    parser.add_argument("--target", type=int, default=None, help="Apply pending migrations up to this version")
+    parser.add_argument("--baseline", type=int, metavar="VERSION", default=None,
+                        help="Record migrations up to VERSION as applied without running them "
+                             "(databases migrated by hand)")
+    parser.add_argument("--dry-run", action="store_true", help="Show statements without running them")
+    parser.add_argument("--allow-changed", action="store_true",
+                        help="Apply pending migrations even if applied files were edited")
+    parser.add_argument("--backfill-threads", type=int, default=DEFAULT_BACKFILL_THREADS,
+                        help=f"max_threads per backfill partition (default: {DEFAULT_BACKFILL_THREADS})")
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="Seconds between backfill partitions (default: 0)")
+
+    args = parser.parse_args()
+
+    runner = MigrationRunner(backfill_threads=args.backfill_threads, pause=args.pause)
+
+    if args.status:
+        runner.print_status()
+        return
+    if args.baseline is not None:
+        runner.baseline(args.baseline)
+        return
+
+    if args.files:
+        applied = runner.applied()
+        for path in args.files:
+            match = MIGRATION_PATTERN.match(os.path.basename(path))
+            if not match:
+                print(f"✗ {path}: not a migration file (expected NNN_name.sql)")
+                sys.exit(1)
+            migration = {"version": int(match.group(1)), "name": os.path.basename(path),
+                         "path": path, "checksum": checksum(path)}
+            if migration["version"] in applied:
+                print(f"✓ {migration['name']} already applied")
+                continue
+            if not runner.apply(migration, args.dry_run):
+                sys.exit(1)
+        return
+
+    if not runner.up(args.target, args.dry_run, args.allow_changed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()